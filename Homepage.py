@@ -56,6 +56,12 @@ with col2:
         "🎵"
     )
 
+show_feature_card(
+    "Combined Workflows",
+    "Chain converters into one job: hear a spoken summary of a PDF, or turn a recording into a summary document. Each stage starts while the previous one is still running.",
+    "🔗"
+)
+
 # Navigation help
 st.markdown("""
 <div class="main-container" >
@@ -81,6 +87,7 @@ Select a conversion tool from the pages above to get started!
 - 📝 **Text to Audio**: Convert text to speech
 - 📋 **PDF Summarizer**: Summarize long documents  
 - 🎵 **Audio to PDF**: Transcribe audio to text
+- 🔗 **Combined Workflows**: Spoken summaries and summary documents in one step
 
 ### Need Help?
 Each page includes:
@@ -0,0 +1,155 @@
+"""Artifact store: re-request latency, deduplication, quota and expiry.
+
+Converts a synthetic PDF to an audiobook once (stub speech engine, cold
+caches), then has several owners ask for the same output the way the pages
+do: look the key up, convert only on a miss. Runs against the local backend
+and against the S3 backend with a directory-backed stand-in for the S3
+client, so the bucket code path is exercised without a server. Run from the
+repository root:
+
+    python -m benchmarks.artifacts
+    python -m benchmarks.artifacts --pages 40 --owners 20
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpora import make_pdf
+from benchmarks.run import install_stubs, fresh_caches
+from utils.artifacts import ArtifactStore, LocalBackend, S3Backend
+from utils.converters import PDFToAudioConverter
+
+
+class _Body:
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+class DirectoryS3Client:
+    """The part of the boto3 S3 client the store uses, over a local directory"""
+
+    def __init__(self, root):
+        self.root = root
+        self.calls = 0
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, key)
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.calls += 1
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(Body, f)
+
+    def head_object(self, Bucket, Key):
+        self.calls += 1
+        if not os.path.exists(self._path(Bucket, Key)):
+            raise FileNotFoundError(Key)
+        return {"ContentLength": os.path.getsize(self._path(Bucket, Key))}
+
+    def get_object(self, Bucket, Key):
+        self.calls += 1
+        return {"Body": _Body(self._path(Bucket, Key))}
+
+    def delete_object(self, Bucket, Key):
+        self.calls += 1
+        try:
+            os.remove(self._path(Bucket, Key))
+        except FileNotFoundError:
+            pass
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"http://s3.local/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+
+def run(label, store, pdf, work, owners):
+    key = "audiobook:bench"
+    converted = 0
+    started = time.perf_counter()
+    output = os.path.join(work, "audiobook.mp3")
+    text = PDFToAudioConverter.extract_text_from_pdf(pdf)
+    PDFToAudioConverter.text_to_audio(text, output)
+    store.put(key, output, "owner-0", "book_audiobook.mp3", "audio/mpeg")
+    convert_s = time.perf_counter() - started
+    converted += 1
+
+    lookups = []
+    for owner in range(1, owners):
+        started = time.perf_counter()
+        artifact = store.get(key, f"owner-{owner}")
+        if artifact is None:
+            PDFToAudioConverter.text_to_audio(text, output)
+            store.put(key, output, f"owner-{owner}", "book_audiobook.mp3", "audio/mpeg")
+            converted += 1
+        lookups.append(time.perf_counter() - started)
+    lookups.sort()
+
+    stats = store.stats()
+    print(f"{label:<6} {convert_s * 1000:>10.0f} {lookups[len(lookups) // 2] * 1000:>9.2f} "
+          f"{lookups[-1] * 1000:>9.2f} {converted:>9} {stats['references']:>5} "
+          f"{stats['referenced_bytes'] / 1024:>9.0f} {stats['stored_bytes'] / 1024:>9.0f}")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--owners", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.002, help="stub engine delay per sentence (s)")
+    args = parser.parse_args(argv)
+
+    install_stubs(args.latency)
+    root = tempfile.mkdtemp(prefix="artifact-bench-")
+    try:
+        pdf = os.path.join(root, "book.pdf")
+        make_pdf(pdf, args.pages)
+
+        print(f"{args.pages}-page PDF, {args.owners} owners asking for the same audiobook")
+        print(f"{'store':<6} {'convert ms':>10} {'p50 hit':>9} {'max hit':>9} {'converted':>9} "
+              f"{'refs':>5} {'logical KB':>9} {'stored KB':>9}")
+
+        fresh_caches(os.path.join(root, "cache-local"))
+        local = ArtifactStore(LocalBackend(os.path.join(root, "static")), os.path.join(root, "local.db"))
+        run("local", local, pdf, root, args.owners)
+
+        fresh_caches(os.path.join(root, "cache-s3"))
+        client = DirectoryS3Client(os.path.join(root, "bucket"))
+        remote = ArtifactStore(S3Backend(client, "outputs"), os.path.join(root, "s3.db"))
+        run("s3", remote, pdf, root, args.owners)
+        print(f"\nS3 calls: {client.calls}")
+
+        # Quota: an owner storing more than the quota keeps only the newest files
+        small = ArtifactStore(LocalBackend(os.path.join(root, "quota")), os.path.join(root, "quota.db"),
+                              quota_bytes=250 * 1024)
+        for i in range(5):
+            path = os.path.join(root, f"out{i}.bin")
+            with open(path, "wb") as f:
+                f.write(os.urandom(100 * 1024))
+            small.put(f"out{i}", path, "owner", f"out{i}.bin", "application/octet-stream")
+        print("quota 250 KB, five 100 KB files kept:", [a.key for a in small.owned("owner")])
+
+        # Expiry: unused references lapse after the TTL and the next sweep deletes their objects
+        brief = ArtifactStore(LocalBackend(os.path.join(root, "ttl")), os.path.join(root, "ttl.db"), ttl_seconds=0.05)
+        brief.put("out", path, "owner", "out.bin", "application/octet-stream")
+        print("before expiry:", brief.stats())
+        time.sleep(0.1)
+        brief.sweep()
+        print("after expiry: ", brief.stats(), "files left:", len(os.listdir(os.path.join(root, "ttl"))))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
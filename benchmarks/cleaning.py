@@ -0,0 +1,63 @@
+"""How much speech the text cleaning stage saves.
+
+Extracts each PDF with and without cleaning and compares the amount of text
+that would be synthesized. Audio length is estimated at gTTS's ~15 spoken
+characters per second. Run from the repository root:
+
+    python -m benchmarks.cleaning                 # synthetic 50-page report
+    python -m benchmarks.cleaning book.pdf ...    # your own documents
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpora import make_pdf
+from utils.converters import PDFToAudioConverter, PageTextCache
+import utils.converters as converters
+
+# Characters of text per second of gTTS speech, as in the benchmark stub engine
+CHARS_PER_SECOND = 15
+
+
+def measure(pdf_path):
+    raw = PDFToAudioConverter.extract_text_from_pdf(pdf_path, clean=False) or ""
+    stats = {}
+    cleaned = PDFToAudioConverter.extract_text_from_pdf(pdf_path, stats=stats) or ""
+    # Whitespace is not spoken, so compare non-space characters
+    raw_chars = len("".join(raw.split()))
+    clean_chars = len("".join(cleaned.split()))
+    return {
+        "pages": stats["cleaning"]["pages"],
+        "lines_removed": stats["cleaning"]["lines_removed"],
+        "hyphens_joined": stats["cleaning"]["hyphens_joined"],
+        "raw_minutes": raw_chars / CHARS_PER_SECOND / 60,
+        "clean_minutes": clean_chars / CHARS_PER_SECOND / 60,
+        "saved_pct": 100 * (raw_chars - clean_chars) / raw_chars if raw_chars else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="*", help="PDF files to measure (default: synthetic report)")
+    parser.add_argument("--pages", type=int, default=50, help="pages in the synthetic report")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as root:
+        # Keep the measurement from touching the app's page cache
+        converters.page_cache = PageTextCache(os.path.join(root, "pages"))
+        pdfs = args.pdfs or [make_pdf(os.path.join(root, "report.pdf"), args.pages)]
+
+        print(f"{'document':<30} {'pages':>5} {'lines cut':>9} {'hyphens':>7} {'raw min':>8} {'clean min':>9} {'saved':>6}")
+        for path in pdfs:
+            r = measure(path)
+            print(f"{os.path.basename(path)[:30]:<30} {r['pages']:>5} {r['lines_removed']:>9} {r['hyphens_joined']:>7} "
+                  f"{r['raw_minutes']:>8.1f} {r['clean_minutes']:>9.1f} {r['saved_pct']:>5.1f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
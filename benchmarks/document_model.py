@@ -0,0 +1,67 @@
+"""Memory and split time of the Document model against passing strings around.
+
+Builds synthetic page texts (cleaned, as the extractors yield them) and holds
+them the way each approach does. With strings, every consumer gets the joined
+text and re-splits it into a list of sentence strings. The Document keeps one
+buffer plus offset arrays and splits sentences once. Run from the repository
+root:
+
+    python -m benchmarks.document_model              # 1,000 pages
+    python -m benchmarks.document_model --pages 200
+"""
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nltk.tokenize import sent_tokenize
+
+from benchmarks.corpora import make_text
+from utils.document import Document
+
+
+def measure(build):
+    """(retained bytes, peak bytes, seconds) of the object build() returns"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    held = build()
+    seconds = time.perf_counter() - started
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return retained, peak, seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--words-per-page", type=int, default=350)
+    args = parser.parse_args(argv)
+
+    chunks = [make_text(args.words_per_page, seed=page) + "\n\n" for page in range(args.pages)]
+
+    def strings():
+        text = "".join(chunks).strip()
+        return text, sent_tokenize(text)
+
+    def document():
+        return Document.build(chunks, range(args.pages))
+
+    sentences = len(sent_tokenize("".join(chunks)))
+    scale = 1000 / args.pages
+    print(f"{args.pages} pages, {sentences} sentences; memory per 1,000 pages")
+    print(f"{'model':<10} {'retained MB':>12} {'peak MB':>9} {'splits':>7} {'split s':>8}")
+    for name, build, splits in (("strings", strings, 3), ("document", document, 1)):
+        retained, peak, seconds = measure(build)
+        # The summarizer, the sentence index and speech synthesis each split the string again
+        print(f"{name:<10} {retained * scale / 2 ** 20:>12.1f} {peak * scale / 2 ** 20:>9.1f} "
+              f"{splits:>7} {seconds * splits * scale:>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""Network engine client: throughput, tail latency, retries and failover.
+
+Starts a local HTTP/1.1 server that answers like the gTTS and Google speech
+endpoints after a fixed delay, then drives the real engines at it from a pool
+of threads, the way the converters do. Compares the pooled keep-alive client
+with a fresh connection per request (what gTTS and speech_recognition do on
+their own), then injects failures. Run from the repository root:
+
+    python -m benchmarks.engines
+    python -m benchmarks.engines --requests 400 --latency 0.05 --threads 32
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import random
+import socket
+import argparse
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+import speech_recognition as sr
+
+import utils.converters as converters
+import utils.engines as engines
+from utils.converters import GTTSEngine, GoogleSpeechEngine, SynthesisWorkers, TTS_ENGINES
+from utils.engines import EngineClient
+
+SENTENCE = "The committee reviewed the annual report and approved it."
+# About a second of gTTS-sized MP3
+AUDIO = b"\xff\xf3" * 2000
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; don't let Nagle hold the body back
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.server.latency)
+        if random.random() < self.server.failure_rate:
+            body, status = b"overloaded", 503
+        elif "batchexecute" in self.path:
+            encoded = base64.b64encode(AUDIO).decode("ascii")
+            body, status = f')]}}\'\n\n[["wrb.fr","jQ1olc","[\\"{encoded}\\"]",null,null,null,"generic"]]\n'.encode(), 200
+        else:
+            result = {"result": [{"alternative": [{"transcript": SENTENCE, "confidence": 0.9}], "final": True}]}
+            body, status = ('{"result":[]}\n' + json.dumps(result) + "\n").encode(), 200
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connects from a burst of threads
+    request_queue_size = 256
+
+
+def start_server(latency):
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.latency = latency
+    server.failure_rate = 0.0
+    server.connections = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class LocalEngine:
+    """Stands in for espeak as the fallback engine"""
+
+    name = "local"
+
+    def __init__(self, lang, voice):
+        pass
+
+    def synthesize(self, text):
+        return AUDIO
+
+
+def drive(call, count, threads):
+    """Run call count times from a thread pool; returns latencies, failures and wall time"""
+    latencies, failures = [], []
+
+    def one(_):
+        started = time.perf_counter()
+        try:
+            call()
+        except Exception as e:
+            failures.append(e)
+            return
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(count)))
+    return latencies, failures, time.perf_counter() - started
+
+
+def report(label, server, latencies, failures, wall, extra=""):
+    latencies = sorted(latencies) or [0.0]
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"{label:<22} {len(latencies) / wall:>7.1f} {statistics.median(latencies) * 1000:>7.1f} "
+          f"{p(0.95):>7.1f} {p(0.99):>7.1f} {server.connections:>6} {len(failures):>6}  {extra}")
+    server.connections = 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="server delay per request (s)")
+    parser.add_argument("--threads", type=int, default=16, help="client threads, like SynthesisWorkers")
+    parser.add_argument("--failure-rate", type=float, default=0.2, help="503s injected in the flaky run")
+    args = parser.parse_args(argv)
+
+    server = start_server(args.latency)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    GTTSEngine.URL = base + "/_/TranslateWebserverUi/data/batchexecute"
+    GoogleSpeechEngine.URL = base + "/speech-api/v2/recognize"
+    tts = GTTSEngine("en", "com")
+    stt = GoogleSpeechEngine()
+    audio = sr.AudioData(b"\x00\x01" * 16000, 16000, 2)
+
+    def unpooled():
+        # One session, so one connection, per request
+        for body in converters.gTTS(text=SENTENCE, lang="en", lang_check=False).get_bodies():
+            with requests.Session() as session:
+                response = session.post(GTTSEngine.URL, data=body, headers=converters.gTTS.GOOGLE_TTS_HEADERS, timeout=15)
+                response.raise_for_status()
+                GTTSEngine.parse_audio(response.content)
+
+    print(f"{args.requests} requests, {args.threads} threads, {args.latency * 1000:.0f} ms server latency")
+    print(f"{'run':<22} {'req/s':>7} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'conns':>6} {'failed':>6}")
+
+    report("tts unpooled", server, *drive(unpooled, args.requests, args.threads))
+
+    engines.engine_client = converters.engine_client = client = EngineClient(max_connections=args.threads, backoff=0.01)
+    report("tts pooled", server, *drive(lambda: tts.synthesize(SENTENCE), args.requests, args.threads))
+    report("stt pooled", server, *drive(lambda: stt.recognize(audio), args.requests, args.threads))
+
+    server.failure_rate = args.failure_rate
+    report(f"tts {args.failure_rate:.0%} failing", server, *drive(lambda: tts.synthesize(SENTENCE), args.requests, args.threads),
+           extra=f"retries={client.stats()['gtts']['retries']}")
+
+    # Outage: the breaker opens and sentences go to the local engine without waiting on the network
+    server.failure_rate = 1.0
+    TTS_ENGINES["local"] = LocalEngine
+    converters.TTS_FALLBACK_ENGINE = "local"
+    workers = SynthesisWorkers(workers_per_language=args.threads)
+    fallbacks = client.stats()["gtts"]["fallbacks"]
+    report("tts outage+fallback", server,
+           *drive(lambda: workers.submit("gtts", "en", "com", SENTENCE).result(), args.requests, args.threads),
+           extra=f"fallbacks={client.stats()['gtts']['fallbacks'] - fallbacks} circuit={client.stats()['gtts']['circuit']}")
+
+    print("\nclient stats (last minute):")
+    for backend, summary in client.stats().items():
+        print(f"  {backend}: " + ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+                                           for k, v in summary.items()))
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Scrape /metrics after real conversions and check what the exporter reports.
+
+Starts the HTTP exporter on a free local port, runs text to audio, a summary
+and a topic query against stub engines, then reads /metrics over HTTP and
+checks the counters moved by exactly what was run. Run from the repository
+root:
+
+    python -m benchmarks.metrics_scrape
+
+Exits with status 1 when a check fails.
+"""
+
+import os
+import re
+import sys
+import argparse
+import tempfile
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpora import build_corpus
+from benchmarks.run import install_stubs, fresh_caches
+from utils.converters import TextToAudioConverter, PDFSummarizer
+from utils.metrics import start_http_exporter
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (\S+)$')
+
+
+def scrape(url):
+    """Fetch the exposition and return {'name{labels}': value} for every sample"""
+    with urllib.request.urlopen(url, timeout=10) as response:
+        content_type = response.headers.get("Content-Type", "")
+        text = response.read().decode("utf-8")
+    if not content_type.startswith("text/plain"):
+        raise AssertionError(f"unexpected Content-Type {content_type!r}")
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = SAMPLE.match(line)
+        if not match:
+            raise AssertionError(f"malformed sample line {line!r}")
+        samples[match.group(1) + (match.group(2) or "")] = float(match.group(3))
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=0.05, help="corpus size multiplier")
+    args = parser.parse_args(argv)
+
+    install_stubs(0.0)
+    server = start_http_exporter(0, host="127.0.0.1")
+    url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+    print(f"scraping {url}")
+
+    with tempfile.TemporaryDirectory() as root:
+        corpus = build_corpus(os.path.join(root, "corpus"), scale=args.scale)
+        fresh_caches(os.path.join(root, "cache"))
+        before = scrape(url)
+
+        audio = TextToAudioConverter.convert_text_to_audio(corpus["text"], os.path.join(root, "text.mp3"))
+        text = PDFSummarizer.extract_text_with_pdfplumber(corpus["pdf"])
+        summary = PDFSummarizer.summarize_text(text, num_sentences=3)
+        index = PDFSummarizer.get_document_index(corpus["pdf"])
+        answers = [PDFSummarizer.query_summary(index, query, num_sentences=3)
+                   for query in ("customer retention", "operating costs")]
+        if audio is None or summary is None or None in answers:
+            print("FAIL: a conversion returned None")
+            return 1
+
+        after = scrape(url)
+
+    def delta(sample):
+        return after.get(sample, 0) - before.get(sample, 0)
+
+    checks = [
+        ('converter_conversions_total{converter="text_to_audio",status="ok"}', 1),
+        ('converter_conversions_total{converter="pdf_summarizer",status="ok"}', 1),
+        ('converter_conversions_total{converter="pdf_summary_query",status="ok"}', 2),
+        ('converter_conversion_seconds_count{converter="text_to_audio"}', 1),
+        ('converter_conversion_seconds_count{converter="pdf_summary_query"}', 2),
+        ('converter_conversion_seconds_bucket{converter="pdf_summary_query",le="+Inf"}', 2),
+        ('converter_jobs_in_progress{converter="text_to_audio"}', 0),
+    ]
+    failures = []
+    for sample, expected in checks:
+        got = delta(sample)
+        print(f"{sample:<90} {got:>6g}")
+        if got != expected:
+            failures.append(f"{sample} changed by {got:g}, expected {expected}")
+    for sample in ('converter_bytes_total{converter="text_to_audio",direction="in"}',
+                   'converter_bytes_total{converter="text_to_audio",direction="out"}',
+                   'cache_requests_total{cache="tts",result="miss"}'):
+        got = delta(sample)
+        print(f"{sample:<90} {got:>6g}")
+        if got <= 0:
+            failures.append(f"{sample} did not increase")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("all checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
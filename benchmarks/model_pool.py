@@ -0,0 +1,156 @@
+"""Model pool: cold in-process loads versus warm worker processes.
+
+A synthetic model stands in for a transformer: a weight matrix saved as .npy
+(read into private memory like torch.load, or memory-mapped with --mmap),
+plus --startup seconds for framework imports and graph setup, and batched
+matrix-vector products as inference. Measured:
+
+  cold     load the model in the calling process for every request, which is
+           what a Streamlit script pays after each cache invalidation
+  warm     single requests to the pool, one caller at a time
+  batched  --callers threads sending single requests at once; the pool
+           coalesces them into batches
+  memory   resident versus proportional/private memory of each worker, i.e.
+           how much of the weights the forked workers actually share
+
+Workers are recycled every --max-requests batches during the run. If
+pocketsphinx is installed the bundled Sphinx model is timed the same way on a
+generated tone. Run from the repository root:
+
+    python -m benchmarks.model_pool
+    python -m benchmarks.model_pool --mb 512 --workers 4 --mmap
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from utils.models import ModelPool, register_model, load_weights, process_memory
+
+WIDTH = 4096
+
+
+def load_synthetic(path, startup, mmap):
+    """Loader for the pool: predict maps a batch of WIDTH-vectors through the weights"""
+    time.sleep(startup)
+    weights = load_weights(path) if mmap else np.load(path)
+
+    def predict(batch):
+        return list(np.stack(batch) @ weights.T)
+
+    return predict
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.95)] * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=int, default=256, help="size of the weights")
+    parser.add_argument("--startup", type=float, default=1.0, help="simulated framework startup (s)")
+    parser.add_argument("--mmap", action="store_true", help="memory-map the weights instead of reading them")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-requests", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--callers", type=int, default=16)
+    parser.add_argument("--cold", type=int, default=3, help="cold requests to time")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="model-pool-bench-")
+    pool = None
+    try:
+        path = os.path.join(root, "weights.npy")
+        rows = args.mb * 2 ** 20 // (WIDTH * 4)
+        np.save(path, np.random.default_rng(0).standard_normal((rows, WIDTH), dtype=np.float32))
+        register_model("synthetic", "benchmarks.model_pool:load_synthetic")
+        rng = np.random.default_rng(1)
+        inputs = [rng.standard_normal(WIDTH, dtype=np.float32) for _ in range(args.requests)]
+
+        print(f"{args.mb} MB weights ({'mmap' if args.mmap else 'read'}), {args.startup:.1f}s startup, "
+              f"{args.workers} workers recycled every {args.max_requests} batches")
+        print(f"{'mode':<8} {'requests':>8} {'p50 ms':>9} {'p95 ms':>9} {'req/s':>8}")
+
+        cold = []
+        for item in inputs[:args.cold]:
+            started = time.perf_counter()
+            load_synthetic(path, args.startup, args.mmap)([item])
+            cold.append(time.perf_counter() - started)
+        p50, p95 = percentiles(cold)
+        print(f"{'cold':<8} {len(cold):>8} {p50:>9.1f} {p95:>9.1f} {len(cold) / sum(cold):>8.1f}")
+
+        pool = ModelPool("synthetic", (path, args.startup, args.mmap), workers=args.workers,
+                         max_requests=args.max_requests)
+        started = time.perf_counter()
+        pool.start()
+        print(f"{'start':<8} {1:>8} {(time.perf_counter() - started) * 1000:>9.1f} {'':>9} {'':>8}"
+              f"  (model loaded in {pool.load_seconds:.2f}s, once)")
+
+        warm = []
+        began = time.perf_counter()
+        for item in inputs:
+            started = time.perf_counter()
+            pool.infer(item)
+            warm.append(time.perf_counter() - started)
+        elapsed = time.perf_counter() - began
+        p50, p95 = percentiles(warm)
+        print(f"{'warm':<8} {len(warm):>8} {p50:>9.1f} {p95:>9.1f} {len(warm) / elapsed:>8.1f}")
+
+        def timed(item):
+            started = time.perf_counter()
+            pool.infer(item)
+            return time.perf_counter() - started
+
+        began = time.perf_counter()
+        with ThreadPoolExecutor(args.callers) as callers:
+            batched = list(callers.map(timed, inputs))
+        elapsed = time.perf_counter() - began
+        p50, p95 = percentiles(batched)
+        print(f"{'batched':<8} {len(batched):>8} {p50:>9.1f} {p95:>9.1f} {len(batched) / elapsed:>8.1f}"
+              f"  ({args.callers} callers)")
+
+        health = pool.health()
+        print(f"\nhealth: alive={health['alive']} workers={health['workers']} recycled={health['recycled']} "
+              f"crashed={health['crashed']} ping={health['ping_ms']:.1f} ms")
+        print(f"{'process':<10} {'pid':>7} {'rss MB':>8} {'pss MB':>8} {'private MB':>10}")
+        for label, pid in [("zygote", pool._zygote.pid)] + [("worker", pid) for pid in health["pids"]]:
+            memory = process_memory(pid)
+            if memory:
+                print(f"{label:<10} {pid:>7} {memory['rss_mb']:>8.0f} {memory['pss_mb']:>8.0f} "
+                      f"{memory['private_mb']:>10.0f}")
+        pool.close()
+        pool = None
+
+        sphinx = ModelPool("sphinx", workers=1)
+        try:
+            tone = (np.sin(np.arange(16000 * 3) * 2 * np.pi * 220 / 16000) * 8000).astype("<i2").tobytes()
+            started = time.perf_counter()
+            sphinx.start()
+            sphinx.infer(tone)
+            first = time.perf_counter() - started
+            started = time.perf_counter()
+            sphinx.infer(tone)
+            print(f"\nsphinx: first request {first * 1000:.0f} ms (load {sphinx.load_seconds * 1000:.0f} ms), "
+                  f"warm {(time.perf_counter() - started) * 1000:.0f} ms")
+        except Exception as e:
+            print(f"\nsphinx: skipped ({e})")
+        finally:
+            sphinx.close()
+    finally:
+        if pool is not None:
+            pool.close()
+        shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
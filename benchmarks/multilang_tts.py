@@ -0,0 +1,86 @@
+"""Mixed-language synthesis: per-language worker pools vs. sequential processing.
+
+Uses a stub engine with fixed per-language latencies so the numbers are
+reproducible offline. Run from the repository root:
+
+    python -m benchmarks.multilang_tts
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.converters import (SpeechSynthesizer, SynthesisCache, SynthesisWorkers,
+                              TTS_ENGINES)
+
+# Simulated network latency per sentence; German stands in for a slow engine
+LATENCY = {'en': 0.02, 'es': 0.02, 'fr': 0.03, 'de': 0.12}
+
+PARAGRAPHS = {
+    'en': "The committee reviewed the annual report. It was approved by all of the members present.",
+    'es': "El comité revisó el informe anual. Fue aprobado por todos los miembros que estaban presentes.",
+    'fr': "Le comité a examiné le rapport annuel. Il a été approuvé par tous les membres qui étaient présents.",
+    'de': "Der Ausschuss hat den Jahresbericht geprüft. Er wurde von allen anwesenden Mitgliedern genehmigt.",
+}
+
+
+class StubEngine:
+    """Engine that sleeps for the language's latency and returns fake audio"""
+
+    name = "stub"
+
+    def __init__(self, lang, voice):
+        self.lang = lang
+
+    def synthesize(self, text):
+        time.sleep(LATENCY.get(self.lang, 0.02))
+        return text.encode("utf-8")
+
+
+def build_document(repeats=10):
+    """Interleave paragraphs in every language"""
+    paragraphs = []
+    for i in range(repeats):
+        for lang, paragraph in PARAGRAPHS.items():
+            paragraphs.append(f"{paragraph} (Part {i}.)")
+    return "\n\n".join(paragraphs)
+
+
+def run_sequential(text):
+    engines = {}
+    start = time.perf_counter()
+    for lang, sentence in SpeechSynthesizer.plan(text, 'auto'):
+        if lang not in engines:
+            engines[lang] = StubEngine(lang, 'com')
+        engines[lang].synthesize(sentence)
+    return time.perf_counter() - start
+
+
+def run_pooled(text, output_path):
+    stats = {}
+    start = time.perf_counter()
+    SpeechSynthesizer.synthesize(text, output_path, lang='auto', stats=stats)
+    return time.perf_counter() - start, stats
+
+
+def main():
+    TTS_ENGINES["stub"] = StubEngine
+    SpeechSynthesizer.ENGINE = "stub"
+    SpeechSynthesizer.workers = SynthesisWorkers(workers_per_language=4)
+
+    text = build_document()
+    with tempfile.TemporaryDirectory() as tmp:
+        SpeechSynthesizer.cache = SynthesisCache(os.path.join(tmp, "cache"))
+        sequential = run_sequential(text)
+        pooled, stats = run_pooled(text, os.path.join(tmp, "out.mp3"))
+
+    print(f"sentences:  {stats['sentences']} {dict(stats['languages'])}")
+    print(f"sequential: {sequential:.2f}s")
+    print(f"pooled:     {pooled:.2f}s ({sequential / pooled:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
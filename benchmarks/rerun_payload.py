@@ -0,0 +1,69 @@
+"""Bytes the theme adds to every script rerun.
+
+Runs a one-line app that sets the background image through Streamlit's app
+test harness and measures the markdown each rerun sends, with the stylesheet
+inlined (static serving off) and published as a hashed static file. Run from
+the repository root:
+
+    python -m benchmarks.rerun_payload                  # screenshot from images/
+    python -m benchmarks.rerun_payload --image bg.png   # your own background
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit.testing.v1 import AppTest
+
+import utils.styling as styling
+from utils.assets import AssetPipeline
+
+
+def app(image_path, static):
+    from utils.styling import theme_markup
+    import streamlit as st
+    st.markdown(theme_markup(image_path, static=static), unsafe_allow_html=True)
+
+
+def measure(image_path, static, reruns):
+    at = AppTest.from_function(app, args=(image_path, static))
+    started = time.perf_counter()
+    at.run()
+    first = time.perf_counter() - started
+    sizes = []
+    started = time.perf_counter()
+    for _ in range(reruns):
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        sizes.append(sum(len(m.value.encode("utf-8")) for m in at.markdown))
+    return {
+        "first_ms": first * 1000,
+        "rerun_ms": (time.perf_counter() - started) * 1000 / reruns,
+        "bytes_per_rerun": sum(sizes) / len(sizes),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", default="images/h1.png", help="background image")
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as root:
+        # Keep the measurement out of the app's static folder
+        styling.assets = AssetPipeline(os.path.join(root, "build"))
+        print(f"image: {args.image} ({os.path.getsize(args.image) / 1024:.0f} KB)")
+        print(f"{'mode':<8} {'bytes/rerun':>12} {'first ms':>9} {'rerun ms':>9}")
+        for mode, static in (("inline", False), ("static", True)):
+            r = measure(args.image, static, args.reruns)
+            print(f"{mode:<8} {r['bytes_per_rerun']:>12.0f} {r['first_ms']:>9.1f} {r['rerun_ms']:>9.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
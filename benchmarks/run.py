@@ -0,0 +1,232 @@
+"""Benchmark every converter on synthetic corpora and compare against a baseline.
+
+Network engines are replaced by local stubs, so runs are offline and
+repeatable. Run from the repository root:
+
+    python -m benchmarks.run                    # compare with benchmarks/baseline.json
+    python -m benchmarks.run --update-baseline  # record a new baseline
+    python -m benchmarks.run --scale 0.2        # smaller corpora for a quick check
+
+Exits with status 1 when a case is slower or uses more memory than the
+baseline by more than --tolerance.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpora import build_corpus
+import utils.converters as converters
+from utils.converters import (PDFToAudioConverter, TextToAudioConverter, PDFSummarizer,
+                              AudioToPDFConverter, SpeechSynthesizer, SynthesisCache,
+                              PageTextCache, TTS_ENGINES, STT_ENGINES)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(HERE, "baseline.json")
+RESULTS_PATH = os.path.join(HERE, "results.json")
+
+
+class StubTTSEngine:
+    """Offline stand-in for gTTS: returns MP3-sized filler after an optional delay"""
+
+    name = "stub"
+    latency = 0.0
+
+    def __init__(self, lang, voice):
+        pass
+
+    def synthesize(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        # gTTS produces roughly 32 kbit/s at ~15 characters per second of speech
+        return b"\xff" * (len(text) * 4000 // 15)
+
+
+class StubSpeechEngine:
+    """Offline stand-in for Google speech recognition: ~2.5 words per second of audio"""
+
+    name = "stub"
+
+    def __init__(self, language="en-US"):
+        pass
+
+    def recognize(self, audio_data):
+        if StubTTSEngine.latency:
+            time.sleep(StubTTSEngine.latency)
+        seconds = len(audio_data.frame_data) / (audio_data.sample_rate * audio_data.sample_width)
+        return " ".join(["word"] * max(1, int(seconds * 2.5)))
+
+
+def install_stubs(latency):
+    StubTTSEngine.latency = latency
+    TTS_ENGINES["stub"] = StubTTSEngine
+    SpeechSynthesizer.ENGINE = "stub"
+    STT_ENGINES["stub"] = StubSpeechEngine
+    AudioToPDFConverter.STT_ENGINE = "stub"
+
+
+def fresh_caches(directory):
+    """Point every persistent cache at an empty directory so each run is cold"""
+    SpeechSynthesizer.cache = SynthesisCache(os.path.join(directory, "tts"))
+    converters.page_cache = PageTextCache(os.path.join(directory, "pages"))
+    PDFSummarizer.INDEX_DIR = os.path.join(directory, "index")
+    PDFSummarizer._indexes.clear()
+
+
+def case_pdf_to_audio(corpus, work):
+    text = PDFToAudioConverter.extract_text_from_pdf(corpus["pdf"])
+    PDFToAudioConverter.text_to_audio(text, os.path.join(work, "audiobook.mp3"))
+
+
+def case_pdf_summarizer(corpus, work):
+    text = PDFSummarizer.extract_text_with_pdfplumber(corpus["pdf"])
+    PDFSummarizer.summarize_text(text, num_sentences=6)
+
+
+def case_summary_query_warm(corpus, work):
+    # Index is built during setup; this measures repeat queries only
+    index = PDFSummarizer.get_document_index(corpus["pdf"])
+    for query in ("customer retention", "logistics investment", "operating costs"):
+        PDFSummarizer.query_summary(index, query, num_sentences=6)
+
+
+def case_text_to_audio(corpus, work):
+    TextToAudioConverter.convert_text_to_audio(corpus["text"], os.path.join(work, "text.mp3"))
+
+
+def case_audio_to_pdf(corpus, work):
+    text = AudioToPDFConverter.audio_to_text(corpus["wav"])
+    AudioToPDFConverter.text_to_file(text, os.path.join(work, "transcript.pdf"))
+
+
+# name -> (function, work units, unit label, setup run before timing)
+CASES = {
+    "pdf_to_audio": (case_pdf_to_audio, lambda c: c["pdf_pages"], "pages", None),
+    "pdf_summarizer": (case_pdf_summarizer, lambda c: c["pdf_pages"], "pages", None),
+    "summary_query_warm": (case_summary_query_warm, lambda c: 3, "queries",
+                           lambda c: PDFSummarizer.get_document_index(c["pdf"])),
+    "text_to_audio": (case_text_to_audio, lambda c: len(c["text"].split()), "words", None),
+    "audio_to_pdf": (case_audio_to_pdf, lambda c: c["wav_minutes"] * 60, "audio-seconds", None),
+}
+
+
+def run_case(name, corpus, root, repeats):
+    func, units, unit_label, setup = CASES[name]
+    timings = []
+
+    for i in range(repeats + 1):
+        work = os.path.join(root, f"{name}-{i}")
+        os.makedirs(work, exist_ok=True)
+        fresh_caches(os.path.join(work, "cache"))
+        if setup:
+            setup(corpus)
+
+        if i == repeats:
+            # Separate run for memory, since tracemalloc slows everything down
+            tracemalloc.start()
+            func(corpus, work)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            started = time.perf_counter()
+            func(corpus, work)
+            timings.append(time.perf_counter() - started)
+
+    median = statistics.median(timings)
+    return {
+        "latency_median_s": round(median, 4),
+        "latency_min_s": round(min(timings), 4),
+        "throughput": round(units(corpus) / median, 2) if median else None,
+        "unit": f"{unit_label}/s",
+        "peak_mb": round(peak / 1024 / 1024, 2),
+    }
+
+
+# Differences below these are timer/allocator noise, whatever the relative change
+NOISE_FLOOR = {"latency_median_s": 0.005, "peak_mb": 0.5}
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of human-readable regressions against the baseline"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("cases", {}).get(name)
+        if not base:
+            continue
+        for metric, floor in NOISE_FLOOR.items():
+            limit = base[metric] + max(base[metric] * tolerance, floor)
+            if result[metric] > limit:
+                regressions.append(
+                    f"{name}: {metric} {result[metric]} > baseline {base[metric]} (+{tolerance:.0%} allowed)"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="corpus size multiplier (1.0 = 50 pages, 5000 words, 5 min audio)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per engine request")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--cases", nargs="*", choices=sorted(CASES), default=sorted(CASES))
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    install_stubs(args.latency)
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        corpus = build_corpus(os.path.join(root, "corpus"), scale=args.scale, seed=args.seed)
+        for name in args.cases:
+            results[name] = run_case(name, corpus, root, args.repeats)
+            r = results[name]
+            print(f"{name:<20} {r['latency_median_s']:>9.3f}s  {r['throughput']:>10} {r['unit']:<16} {r['peak_mb']:>8.1f} MB")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "settings": {"scale": args.scale, "repeats": args.repeats, "seed": args.seed, "latency": args.latency},
+        "cases": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --update-baseline to record one.")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != report["settings"]:
+        print("Warning: baseline was recorded with different settings:", baseline.get("settings"))
+
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print("REGRESSION", line)
+    if not regressions:
+        print("No regressions against baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
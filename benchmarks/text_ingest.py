@@ -0,0 +1,71 @@
+"""Text file ingestion: peak memory and time of the streaming reader.
+
+Builds a synthetic text file and reads it the way the Text to Audio page did
+(read everything, decode as UTF-8, split three times for the stats) and the
+way it does now (utils.textfile: one streaming pass for the stats, then the
+paragraph chunks that feed synthesis). A cp1252 copy shows that the old path
+fails on non-UTF-8 input. Run from the repository root:
+
+    python -m benchmarks.text_ingest             # 8 MB
+    python -m benchmarks.text_ingest --mb 32
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpora import make_text
+from utils.textfile import read_text_file, scan_text_file
+
+
+def measure(read):
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = read()
+    except Exception as e:
+        result = f"failed: {type(e).__name__}"
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak, seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=8)
+    args = parser.parse_args(argv)
+
+    paragraph = make_text(120, seed=1).replace(" the ", " the café ") + "\n\n"
+    text = paragraph * max(1, int(args.mb * 2 ** 20 / len(paragraph)))
+    files = {"utf-8": text.encode("utf-8"), "cp1252": text.encode("cp1252")}
+
+    def old(data):
+        upload = io.BytesIO(data)
+        content = str(upload.read(), "utf-8")
+        return len(content.split()), len(content), len(content.split()) // 150, len(content.split())
+
+    def new(data):
+        upload = io.BytesIO(data)
+        upload.name = "book.txt"
+        stats = scan_text_file(upload)
+        # The synthesis pass, minus the synthesis
+        chunks = sum(1 for _ in read_text_file(upload))
+        return stats["words"], stats["chars"], stats["encoding"], chunks
+
+    print(f"{len(files['utf-8']) / 2 ** 20:.1f} MB text file; peak is memory beyond the upload buffer")
+    print(f"{'reader':<8} {'encoding':<8} {'peak MB':>8} {'seconds':>8}  result")
+    for encoding, data in files.items():
+        for name, read in (("old", old), ("stream", new)):
+            result, peak, seconds = measure(lambda: read(data))
+            print(f"{name:<8} {encoding:<8} {peak / 2 ** 20:>8.1f} {seconds:>8.2f}  {result}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
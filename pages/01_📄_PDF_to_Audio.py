@@ -3,8 +3,13 @@ import streamlit as st
 import os
 import tempfile
 
-from utils.styling import set_background_image
-from utils.converters import PDFToAudioConverter, save_uploaded_file, clean_temp_files
+from utils.resources import memory_budget, estimate_job_mb
+from utils.scheduler import scheduler, session_id, estimate_cost
+from utils.probe import probe_pdf, probe_audio, plan_pdf, estimate_speech
+from utils.results import results
+from utils.artifacts import artifacts, artifact_owner
+from utils.styling import set_background_image, show_trace, progress_bar, select_pages, show_artifact, show_saved_files
+from utils.converters import PDFToAudioConverter, TextStream, Tracer, Progress, save_uploaded_file, make_job_dir, clean_temp_files, TTS_LANGUAGES, TTS_VOICES, AUDIO_FORMATS
 
 # Configure page
 st.set_page_config(page_title="PDF to Audio Converter", page_icon="📄", layout="wide")
@@ -55,63 +60,220 @@ with col1:
         # Display file info
         st.info(f"📊 File size: {uploaded_file.size / 1024:.1f} KB")
 
+        pdf_info = probe_pdf(uploaded_file)
+        if pdf_info:
+            st.info(f"📄 {pdf_info['pages']} pages, text layer: {'yes' if pdf_info['text_layer'] else 'no'}")
+            if pdf_info["encrypted"]:
+                st.warning("🔒 This PDF is encrypted, so its text cannot be extracted.")
+            elif plan_pdf(pdf_info)["needs_ocr"]:
+                st.warning("🖼️ No text layer found; this looks like a scanned PDF. OCR is not available, so the audio may be empty.")
+
+        selected_pages = select_pages(uploaded_file, pdf_info, "pdf_to_audio")
+        pdf_route = plan_pdf(pdf_info, selected_pages)
+
+with col2:
+    st.subheader("⚙️ Audio Settings")
+    language_options = {"Auto-detect (per paragraph)": 'auto'}
+    language_options.update({name: code for code, (name, _) in TTS_LANGUAGES.items()})
+    language_label = st.selectbox(
+        "Language",
+        list(language_options),
+        index=1,
+        help="Auto-detect picks the language of each paragraph, for mixed-language documents"
+    )
+    tts_lang = language_options[language_label]
+
+    voice_label = st.selectbox(
+        "Voice",
+        list(TTS_VOICES),
+        help="Regional Google TTS voices; accents are most noticeable in English"
+    )
+    tts_voice = TTS_VOICES[voice_label]
+
+    audio_format = st.selectbox(
+        "Output Format",
+        list(AUDIO_FORMATS),
+        help="Low-bitrate mono Opus/AAC audiobooks are much smaller and still clear for speech"
+    )
+    audio_encoding = AUDIO_FORMATS[audio_format]
+    file_ext = audio_encoding["ext"] if audio_encoding else "mp3"
+    mime_type = audio_encoding["mime"] if audio_encoding else "audio/mpeg"
+
+    speech_rate = st.slider(
+        "🗣️ Speech Rate (WPM)",
+        min_value=100,
+        max_value=250,
+        value=150,
+        step=10,
+        help="Changes speed without changing pitch. 150 WPM is the natural voice speed."
+    )
+    trim_pauses = st.checkbox(
+        "✂️ Shorten long pauses",
+        value=True,
+        help="Cuts silences longer than 0.35 s, e.g. gaps between PDF lines"
+    )
+    max_silence_ms = 350 if trim_pauses else None
     
+# Diagnostics
+trace_enabled = st.sidebar.checkbox(
+    "🔬 Show performance trace",
+    value=False,
+    help="Time each conversion stage; traces are also appended to logs/trace.jsonl"
+)
+
 # Conversion section
 if uploaded_file is not None:
     st.markdown("---")
     st.subheader("🔄 Convert to Audio")
 
+    if pdf_info and pdf_info["words_per_page"]:
+        page_total = len(selected_pages) if selected_pages is not None else pdf_info["pages"]
+        estimate = estimate_speech(page_total * pdf_info["words_per_page"], speech_rate, audio_encoding)
+        st.caption(f"📏 Estimated audiobook: ~{estimate['minutes']:.0f} min of audio, ~{estimate['size_mb']:.1f} MB as {audio_format}")
+
+    audiobook_key = results.key("audiobook", uploaded_file, pages=selected_pages, lang=tts_lang, voice=tts_voice,
+                                rate=speech_rate, format=audio_format, trim=trim_pauses)
+    audiobook_name = uploaded_file.name.replace('.pdf', '_audiobook.' + file_ext)
+    stored = artifacts.get(audiobook_key, artifact_owner())
+
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
-        if st.button("🎵 Convert PDF to Audio", use_container_width=True):
+        if stored:
+            st.success("♻️ Already converted with these settings; here is the saved audiobook.")
+            st.subheader("🎵 Your Audiobook")
+            show_artifact(stored, "📥 Download Audiobook", player=not memory_budget.low_memory(uploaded_file.size))
+        elif st.button("🎵 Convert PDF to Audio", use_container_width=True):
+            # Very long documents always stream page by page
+            low_memory = memory_budget.low_memory(uploaded_file.size) or pdf_route["stream_pages"]
+            wait_notice = st.empty()
             with st.spinner("Converting PDF to audio... This may take a few minutes."):
+                tracer = Tracer("pdf_to_audio").start() if trace_enabled else None
+                job_ticket = memory_ticket = progress = job_dir = None
                 try:
+                    # Waiting can be interrupted by a rerun; the finally releases whatever was granted
+                    job_ticket = scheduler.acquire(
+                        "pdf_to_audio", session_id(), estimate_cost("pdf_to_audio", uploaded_file, info=pdf_info, pages=selected_pages),
+                        on_wait=lambda position, waited: wait_notice.info(f"⏳ Queued: position {position}, waiting {waited:.0f}s")
+                    )
+                    memory_ticket = memory_budget.acquire(
+                        estimate_job_mb("pdf_to_audio", uploaded_file.size, low_memory),
+                        on_wait=lambda waited: wait_notice.info(f"⏳ Server is busy, waiting for memory... {waited:.0f}s")
+                    )
+                    wait_notice.empty()
+                    progress = Progress(progress_bar(), {"extract": 1, "synthesize": 8, "write": 1}).start()
                     # Save uploaded file
-                    temp_pdf_path = save_uploaded_file(uploaded_file, "temp")
+                    job_dir = make_job_dir()
+                    temp_pdf_path = save_uploaded_file(uploaded_file, job_dir)
 
                     if temp_pdf_path:
                         # Extract text from PDF
-                        st.info("📝 Extracting text from PDF...")
-                        text = PDFToAudioConverter.extract_text_from_pdf(temp_pdf_path)
+                        cleaning_stats = {}
+                        if low_memory:
+                            # Pages are extracted while they are spoken, never all at once
+                            st.info("🧮 Large file: processing page by page to stay within the memory budget")
+                            text = TextStream(PDFToAudioConverter.iter_pdf_text(temp_pdf_path, selected_pages, stats=cleaning_stats), head_chars=500)
+                        else:
+                            st.info("📝 Extracting text from PDF...")
+                            # Split into pages, paragraphs and sentences once; synthesis speaks the sentences as split
+                            text = PDFToAudioConverter.extract_document(temp_pdf_path, selected_pages, lang=tts_lang, stats=cleaning_stats)
 
                         if text:
-                            # Show preview of extracted text
-                            with st.expander("📖 Preview extracted text"):
-                                st.text_area("Extracted text preview:", text[:500] + "..." if len(text) > 500 else text, height=150)
+                            if not low_memory:
+                                # Show preview of extracted text
+                                with st.expander("📖 Preview extracted text"):
+                                    st.text_area("Extracted text preview:", text.text[:500] + "..." if len(text) > 500 else text.text, height=150)
 
                             st.info("🔊 Converting text to audio...")
 
                             # Convert to audio
-                            output_path = "temp/audiobook.mp3"
-                            audio_file = PDFToAudioConverter.text_to_audio(text, output_path)
+                            output_path = os.path.join(job_dir, f"audiobook.{file_ext}")
+                            synthesis_stats = {}
+                            audio_file = PDFToAudioConverter.text_to_audio(
+                                text, output_path, rate=speech_rate, lang=tts_lang, voice=tts_voice,
+                                encoding=audio_encoding, max_silence_ms=max_silence_ms, stats=synthesis_stats
+                            )
+                            text_length = text.chars if low_memory else len(text)
 
-
-                            if audio_file and os.path.exists(audio_file):
+                            if low_memory and text_length == 0:
+                                st.error("❌ Could not extract text from PDF. Please check if the PDF contains readable text.")
+                            elif audio_file and os.path.exists(audio_file):
                                 st.success("✅ Conversion completed successfully!")
 
+                                if low_memory:
+                                    with st.expander("📖 Preview extracted text"):
+                                        st.text_area("Extracted text preview:", text.head + "...", height=150)
+
                                 # Display audio player
                                 st.subheader("🎵 Your Audiobook")
-                                audio_file_data = open(audio_file, 'rb').read()
-                                st.audio(audio_file_data, format='audio/mp3')
-
-                                # Download button
-                                st.download_button(
-                                    label="📥 Download Audiobook",
-                                    data=audio_file_data,
-                                    file_name=f"{uploaded_file.name.replace('.pdf', '_audiobook.mp3')}",
-                                    mime="audio/mp3",
-                                    use_container_width=True
-                                )
+                                if low_memory:
+                                    # The player would keep a second copy of the audio in memory
+                                    st.caption("Inline player disabled for large files; download the audiobook to listen.")
+                                stored = artifacts.put(audiobook_key, audio_file, artifact_owner(), audiobook_name, mime_type)
+                                if stored:
+                                    show_artifact(stored, "📥 Download Audiobook", player=not low_memory)
+                                else:
+                                    # Larger than the storage quota; offer it from memory this once
+                                    with open(audio_file, 'rb') as f:
+                                        audio_file_data = f.read()
+                                    if not low_memory:
+                                        st.audio(audio_file_data, format=mime_type)
+
+                                    # Download button
+                                    st.download_button(
+                                        label="📥 Download Audiobook",
+                                        data=audio_file_data,
+                                        file_name=audiobook_name,
+                                        mime=mime_type,
+                                        use_container_width=True
+                                    )
 
                                 # Statistics
+                                encode_stats = synthesis_stats.get("encoding")
+                                if encode_stats:
+                                    audio_seconds = encode_stats["audio_seconds"]
+                                else:
+                                    # The engine's MP3 was kept as is; read its length from the headers
+                                    with open(audio_file, "rb") as f:
+                                        audio_info = probe_audio(f, audio_file)
+                                    audio_seconds = audio_info["duration"] if audio_info else None
                                 st.markdown("### 📊 Conversion Statistics")
-                                col1, col2, col3 = st.columns(3)
+                                col1, col2, col3, col4 = st.columns(4)
                                 with col1:
-                                    st.metric("📄 Text Length", f"{len(text)} characters")
+                                    st.metric("📄 Text Length", f"{text_length} characters")
                                 with col2:
-                                    st.metric("⏱️ Estimated Duration", f"~{len(text) // 800} minutes")
+                                    st.metric("⏱️ Audio Length", f"{audio_seconds / 60:.1f} min" if audio_seconds else "unknown")
                                 with col3:
                                     st.metric("📁 File Size", f"{os.path.getsize(audio_file) / 1024:.1f} KB")
+                                with col4:
+                                    st.metric(
+                                        "♻️ Cached Sentences",
+                                        f"{synthesis_stats.get('hit_ratio', 0):.0%}",
+                                        help=f"{synthesis_stats.get('bytes_saved', 0) / 1024:.1f} KB of audio reused instead of re-synthesized"
+                                    )
+
+                                if encode_stats:
+                                    col1, col2 = st.columns(2)
+                                    with col1:
+                                        st.metric("🗜️ Compression", f"{encode_stats['compression_ratio']:.1f}x smaller")
+                                    with col2:
+                                        st.metric("⚡ Encode Speed", f"{encode_stats['realtime_factor']:.0f}x real time")
+
+                                clean_stats = cleaning_stats.get("cleaning")
+                                if clean_stats and clean_stats["lines_removed"]:
+                                    st.caption(
+                                        f"🧹 Skipped {clean_stats['lines_removed']} repeated header/footer lines "
+                                        f"(~{clean_stats['chars_removed'] / 15 / 60:.1f} min of speech) and rejoined "
+                                        f"{clean_stats['hyphens_joined']} hyphenated words"
+                                    )
+
+                                dsp_stats = synthesis_stats.get("postprocess")
+                                if dsp_stats:
+                                    saved = dsp_stats['input_seconds'] - dsp_stats['output_seconds']
+                                    col1, col2 = st.columns(2)
+                                    with col1:
+                                        st.metric("✂️ Time Saved", f"{saved / 60:.1f} min", help="From speech rate and shortened pauses")
+                                    with col2:
+                                        st.metric("🎛️ Processing Speed", f"{dsp_stats['realtime_factor']:.0f}x real time")
 
                             else:
                                 st.error("❌ Failed to create audio file. Please try again.")
@@ -125,7 +287,19 @@ if uploaded_file is not None:
 
                 finally:
                     # Clean up temporary files
-                    clean_temp_files("temp")
+                    if job_dir:
+                        clean_temp_files(job_dir)
+                    if progress is not None:
+                        progress.finish()
+                    if memory_ticket is not None:
+                        memory_budget.release(memory_ticket)
+                    if job_ticket is not None:
+                        scheduler.release(job_ticket)
+                    if tracer:
+                        tracer.finish()
+
+            if tracer:
+                show_trace(tracer)
 
 # Tips and help section
 st.markdown("---")
@@ -143,11 +317,14 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Sidebar help
+owner = artifact_owner(create=False)
+if owner:
+    show_saved_files(artifacts, owner)
 st.sidebar.title("📄 PDF to Audio Help")
 st.sidebar.markdown("""
 ### How to Use:
 1. **Upload** your PDF file
-2. **Adjust** audio settings as needed
+2. **Adjust** language, voice, speed and format
 3. **Click** Convert PDF to Audio
 4. **Listen** to preview
 5. **Download** your audiobook
@@ -161,5 +338,5 @@ st.sidebar.markdown("""
 - **Format:** PDF only
 - **Size:** Up to 200MB
 - **Type:** Text-based PDFs work best
-- **Language:** English supported
+- **Language:** English, Spanish, French, German and more
 """)
@@ -2,8 +2,13 @@
 import streamlit as st
 import os
 import tempfile
-from utils.styling import set_background_image
-from utils.converters import TextToAudioConverter, clean_temp_files
+from utils.resources import memory_budget, estimate_job_mb
+from utils.scheduler import scheduler, session_id, estimate_cost
+from utils.results import results
+from utils.textfile import read_text_file, scan_text_file, text_stats
+from utils.artifacts import artifacts, artifact_owner
+from utils.styling import set_background_image, show_trace, progress_bar, show_artifact, show_saved_files
+from utils.converters import TextToAudioConverter, Tracer, Progress, make_job_dir, clean_temp_files, TTS_LANGUAGES, TTS_VOICES, AUDIO_FORMATS
 
 # Configure page
 st.set_page_config(page_title="Text to Audio Converter", page_icon="📝", layout="wide")
@@ -44,6 +49,9 @@ st.subheader("📝 Input Your Text")
 tab1, tab2 = st.tabs(["✍️ Type Text", "📁 Upload Text File"])
 
 text_content = ""
+# Scan of an uploaded file (stats, preview, encoding); its text is streamed again for synthesis
+text_file = None
+typed_stats = None
 
 with tab1:
     st.markdown("### Type or Paste Your Text")
@@ -55,78 +63,163 @@ with tab1:
     )
 
     if text_content:
-        word_count = len(text_content.split())
-        char_count = len(text_content)
-        st.info(f"📊 Text Stats: {word_count} words, {char_count} characters (~{word_count//150} minutes estimated audio)")
+        typed_stats = text_stats([text_content])
+        st.info(f"📊 Text Stats: {typed_stats['words']} words, {typed_stats['chars']} characters (~{typed_stats['minutes']:.0f} minutes estimated audio)")
 
 with tab2:
     st.markdown("### Upload a Text File")
     uploaded_file = st.file_uploader(
         "Choose a text file",
         type=['txt', 'md', 'csv'],
-        help="Upload a .txt, .md, or .csv file containing your text"
+        help="Upload a .txt, .md, or .csv file containing your text. Any common encoding works; "
+             "Markdown formatting and code blocks are not read aloud, CSV rows are read as sentences."
     )
 
     if uploaded_file is not None:
         try:
-            text_content = str(uploaded_file.read(), "utf-8")
+            # Decoded and counted in one streaming pass, once per upload
+            scan_key = results.key("text_scan", uploaded_file)
+            text_file = results.get(scan_key) or results.put(scan_key, scan_text_file(uploaded_file))
             st.success(f"✅ File uploaded: {uploaded_file.name}")
+            if text_file["encoding"] not in ("utf-8", "ascii"):
+                st.caption(f"🔤 Read as {text_file['encoding']}")
 
             # Show preview
             with st.expander("📖 Preview uploaded text"):
-                st.text_area("File content:", text_content[:500] + "..." if len(text_content) > 500 else text_content, height=150)
+                st.text_area("File content:", text_file["head"] + "..." if text_file["chars"] > len(text_file["head"]) else text_file["head"], height=150)
 
-            word_count = len(text_content.split())
-            char_count = len(text_content)
-            st.info(f"📊 File Stats: {word_count} words, {char_count} characters")
+            st.info(f"📊 File Stats: {text_file['words']} words, {text_file['chars']} characters (~{text_file['minutes']:.0f} minutes estimated audio)")
+            if not text_file["words"]:
+                st.warning("⚠️ No readable text found in this file.")
+                text_file = None
 
         except Exception as e:
             st.error(f"❌ Error reading file: {e}")
+            text_file = None
+
+# The upload, when there is one, takes precedence over typed text
+text_info = text_file or (typed_stats if text_content.strip() else None)
 
 # Audio settings
-if text_content:
+if text_info:
     st.markdown("---")
     st.subheader("🎵 Audio Configuration")
 
     col1, col2 = st.columns(2)
 
     with col1:
-        st.markdown("#### ⚙️ Audio Format")
-        st.markdown("Using default voice (Google TTS)")
+        st.markdown("#### 🌐 Language & Voice")
+        language_options = {"Auto-detect (per paragraph)": 'auto'}
+        language_options.update({name: code for code, (name, _) in TTS_LANGUAGES.items()})
+        language_label = st.selectbox(
+            "Language",
+            list(language_options),
+            index=1,
+            help="Auto-detect picks the language of each paragraph, for mixed-language text"
+        )
+        tts_lang = language_options[language_label]
+
+        voice_label = st.selectbox(
+            "Voice",
+            list(TTS_VOICES),
+            help="Regional Google TTS voices; accents are most noticeable in English"
+        )
+        tts_voice = TTS_VOICES[voice_label]
 
     with col2:
-        audio_format = "MP3"  # gTTS supports only MP3
+        st.markdown("#### ⚙️ Audio Format")
+        audio_format = st.selectbox(
+            "Output Format",
+            list(AUDIO_FORMATS),
+            help="Low-bitrate mono Opus/AAC files are much smaller and still clear for speech"
+        )
+        audio_encoding = AUDIO_FORMATS[audio_format]
+        file_ext = audio_encoding["ext"] if audio_encoding else "mp3"
+        mime_type = audio_encoding["mime"] if audio_encoding else "audio/mpeg"
+
+        speech_rate = st.slider(
+            "🗣️ Speech Rate (WPM)",
+            min_value=100,
+            max_value=250,
+            value=150,
+            step=10,
+            help="Changes speed without changing pitch. 150 WPM is the natural voice speed."
+        )
+        trim_pauses = st.checkbox(
+            "✂️ Shorten long pauses",
+            value=True,
+            help="Cuts silences longer than 0.35 s"
+        )
+        max_silence_ms = 350 if trim_pauses else None
 
 
     # Preview section
     st.markdown("#### 🔍 Text Preview")
-    preview_text = text_content[:200] + "..." if len(text_content) > 200 else text_content
+    preview_text = text_info["head"][:200] + "..." if text_info["chars"] > 200 else text_info["head"]
     st.text(preview_text)
 
+# Diagnostics
+trace_enabled = st.sidebar.checkbox(
+    "🔬 Show performance trace",
+    value=False,
+    help="Time each conversion stage; traces are also appended to logs/trace.jsonl"
+)
+
 # Conversion section
-if text_content.strip():
+if text_info:
     st.markdown("---")
     st.subheader("🔄 Convert to Audio")
 
+    audio_key = results.key("text_audio", uploaded_file if text_file else text_content, lang=tts_lang, voice=tts_voice, rate=speech_rate,
+                            format=audio_format, trim=trim_pauses)
+    stored = artifacts.get(audio_key, artifact_owner()) if text_info["chars"] >= 10 else None
+
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
-        if st.button("🎵 Convert Text to Audio", use_container_width=True):
-            if len(text_content.strip()) < 10:
+        if stored:
+            st.success("♻️ Already converted with these settings; here is the saved audio.")
+            st.subheader("🎵 Your Audio")
+            show_artifact(stored, "📥 Download Audio File", player=True)
+        elif st.button("🎵 Convert Text to Audio", use_container_width=True):
+            if text_info["chars"] < 10:
                 st.warning("⚠️ Please enter at least 10 characters of text.")
             else:
+                input_bytes = uploaded_file.size if text_file else len(text_content.encode('utf-8'))
+                low_memory = memory_budget.low_memory(input_bytes)
+                wait_notice = st.empty()
                 with st.spinner("Converting text to audio... Please wait."):
+                    tracer = Tracer("text_to_audio").start() if trace_enabled else None
+                    job_ticket = memory_ticket = progress = job_dir = None
                     try:
-                        # Create temp directory
-                        os.makedirs("temp", exist_ok=True)
+                        # Waiting can be interrupted by a rerun; the finally releases whatever was granted
+                        job_ticket = scheduler.acquire(
+                            "text_to_audio", session_id(), estimate_cost("text_to_audio", info=text_info),
+                            on_wait=lambda position, waited: wait_notice.info(f"⏳ Queued: position {position}, waiting {waited:.0f}s")
+                        )
+                        memory_ticket = memory_budget.acquire(
+                            estimate_job_mb("text_to_audio", input_bytes, low_memory),
+                            on_wait=lambda waited: wait_notice.info(f"⏳ Server is busy, waiting for memory... {waited:.0f}s")
+                        )
+                        wait_notice.empty()
+                        progress = Progress(progress_bar(), {"synthesize": 9, "write": 1}).start()
+                        # Private temp directory for this job
+                        job_dir = make_job_dir()
 
                         # Set output filename
-                        output_filename = f"text_audio.{audio_format.lower()}"
-                        output_path = f"temp/{output_filename}"
+                        output_filename = f"text_audio.{file_ext}"
+                        output_path = os.path.join(job_dir, output_filename)
 
-                        # Convert text to audio
+                        # Convert text to audio; an uploaded file is streamed paragraph by paragraph
+                        synthesis_stats = {}
                         audio_file = TextToAudioConverter.convert_text_to_audio(
-                            text_content,
-                            output_path
+                            read_text_file(uploaded_file) if text_file else text_content,
+                            output_path,
+                            lang=tts_lang,
+                            voice=tts_voice,
+                            encoding=audio_encoding,
+                            rate=speech_rate,
+                            max_silence_ms=max_silence_ms,
+                            stats=synthesis_stats
                         )
 
                         if audio_file and os.path.exists(audio_file):
@@ -134,30 +227,61 @@ if text_content.strip():
 
                             # Display audio player
                             st.subheader("🎵 Your Audio")
-                            audio_file_data = open(audio_file, 'rb').read()
-                            st.audio(audio_file_data, format=f'audio/{audio_format.lower()}')
-
-                            # Download button
-                            st.download_button(
-                                label="📥 Download Audio File",
-                                data=audio_file_data,
-                                file_name=f"converted_text.{audio_format.lower()}",
-                                mime=f"audio/{audio_format.lower()}",
-                                use_container_width=True
-                            )
+                            stored = artifacts.put(audio_key, audio_file, artifact_owner(), f"converted_text.{file_ext}", mime_type)
+                            if stored:
+                                show_artifact(stored, "📥 Download Audio File", player=True)
+                            else:
+                                # Larger than the storage quota; offer it from memory this once
+                                with open(audio_file, 'rb') as f:
+                                    audio_file_data = f.read()
+                                st.audio(audio_file_data, format=mime_type)
+
+                                # Download button
+                                st.download_button(
+                                    label="📥 Download Audio File",
+                                    data=audio_file_data,
+                                    file_name=f"converted_text.{file_ext}",
+                                    mime=mime_type,
+                                    use_container_width=True
+                                )
 
                             # Statistics
                             st.markdown("### 📊 Conversion Statistics")
-                            col1, col2, col3, col4 = st.columns(4)
+                            col1, col2, col3, col4, col5 = st.columns(5)
 
                             with col1:
-                                st.metric("📝 Words", len(text_content.split()))
+                                st.metric("📝 Words", text_info["words"])
                             with col2:
-                                st.metric("📄 Characters", len(text_content))
+                                st.metric("📄 Characters", text_info["chars"])
                             with col3:
-                                st.metric("⏱️ Est. Duration", f"~{len(text_content.split())//150} min")
+                                st.metric("⏱️ Est. Duration", f"~{text_info['minutes']:.0f} min")
                             with col4:
                                 st.metric("📁 File Size", f"{os.path.getsize(audio_file) / 1024:.1f} KB")
+                            with col5:
+                                st.metric(
+                                    "♻️ Cached Sentences",
+                                    f"{synthesis_stats.get('hit_ratio', 0):.0%}",
+                                    help=f"{synthesis_stats.get('bytes_saved', 0) / 1024:.1f} KB of audio reused instead of re-synthesized"
+                                )
+
+                            encode_stats = synthesis_stats.get("encoding")
+                            if encode_stats:
+                                col1, col2, col3 = st.columns(3)
+                                with col1:
+                                    st.metric("🗜️ Compression", f"{encode_stats['compression_ratio']:.1f}x smaller")
+                                with col2:
+                                    st.metric("⚡ Encode Speed", f"{encode_stats['realtime_factor']:.0f}x real time")
+                                with col3:
+                                    st.metric("⏱️ Audio Length", f"{encode_stats['audio_seconds'] / 60:.1f} min")
+
+                            dsp_stats = synthesis_stats.get("postprocess")
+                            if dsp_stats:
+                                saved = dsp_stats['input_seconds'] - dsp_stats['output_seconds']
+                                col1, col2 = st.columns(2)
+                                with col1:
+                                    st.metric("✂️ Time Saved", f"{saved / 60:.1f} min", help="From speech rate and shortened pauses")
+                                with col2:
+                                    st.metric("🎛️ Processing Speed", f"{dsp_stats['realtime_factor']:.0f}x real time")
 
                         else:
                             st.error("❌ Failed to create audio file. Please try again.")
@@ -168,7 +292,19 @@ if text_content.strip():
 
                     finally:
                         # Clean up
-                        clean_temp_files("temp")
+                        if job_dir:
+                            clean_temp_files(job_dir)
+                        if progress is not None:
+                            progress.finish()
+                        if memory_ticket is not None:
+                            memory_budget.release(memory_ticket)
+                        if job_ticket is not None:
+                            scheduler.release(job_ticket)
+                        if tracer:
+                            tracer.finish()
+
+                if tracer:
+                    show_trace(tracer)
 
 else:
     st.info("👆 Please enter some text above to convert to audio.")
@@ -183,12 +319,15 @@ st.markdown("""
         <li><strong>📏 Length:</strong> Break very long texts into smaller chunks for better processing</li>
         <li><strong>🗣️ Speech Rate:</strong> 150-200 WPM is ideal for most content</li>
         <li><strong>📖 Formatting:</strong> Remove special characters that might affect pronunciation</li>
-        <li><strong>🎵 Audio Quality:</strong> WAV format provides higher quality than MP3</li>
+        <li><strong>🎵 Audio Size:</strong> Opus at 16-24 kbps keeps speech clear at a fraction of the MP3 size</li>
     </ul>
 </div>
 """, unsafe_allow_html=True)
 
 # Sidebar help
+owner = artifact_owner(create=False)
+if owner:
+    show_saved_files(artifacts, owner)
 st.sidebar.title("📝 Text to Audio Help")
 st.sidebar.markdown("""
 ### How to Use:
@@ -1,9 +1,15 @@
 
 import streamlit as st
+import html
 import os
 import tempfile
-from utils.styling import set_background_image
-from utils.converters import PDFSummarizer, save_uploaded_file, clean_temp_files
+from utils.resources import memory_budget, estimate_job_mb
+from utils.scheduler import scheduler, session_id, estimate_cost
+from utils.probe import probe_pdf, plan_pdf
+from utils.results import results
+from utils.artifacts import artifacts, artifact_owner
+from utils.styling import set_background_image, show_trace, progress_bar, select_pages, show_artifact, show_saved_files
+from utils.converters import PDFSummarizer, Tracer, Progress, save_uploaded_file, make_job_dir, clean_temp_files
 
 # Configure page
 st.set_page_config(page_title="PDF Summarizer", page_icon="📋", layout="wide")
@@ -58,6 +64,16 @@ if uploaded_file is not None:
     with col3:
         st.metric("📁 File Type", "PDF Document")
 
+    pdf_info = probe_pdf(uploaded_file)
+    if pdf_info:
+        st.caption(f"📄 {pdf_info['pages']} pages, ~{pdf_info['pages'] * pdf_info['words_per_page']:,.0f} words")
+        if pdf_info["encrypted"]:
+            st.warning("🔒 This PDF is encrypted, so its text cannot be extracted.")
+        elif plan_pdf(pdf_info)["needs_ocr"]:
+            st.warning("🖼️ No text layer found; this looks like a scanned PDF. OCR is not available, so the summary may be empty.")
+
+    selected_pages = select_pages(uploaded_file, pdf_info, "pdf_summarizer")
+
 # Summarization settings
 if uploaded_file is not None:
     st.markdown("---")
@@ -101,99 +117,81 @@ if uploaded_file is not None:
             help="Display a preview of the extracted text from PDF"
         )
 
+    focus_query = st.text_input(
+        "🔍 Focus Topic (optional)",
+        placeholder="e.g. budget risks, methodology, conclusions",
+        help="Summarize only the sentences most relevant to this topic. Repeat queries on the same document are near-instant."
+    )
+
+# Diagnostics
+trace_enabled = st.sidebar.checkbox(
+    "🔬 Show performance trace",
+    value=False,
+    help="Time each conversion stage; traces are also appended to logs/trace.jsonl"
+)
+
 # Processing section
 if uploaded_file is not None:
     st.markdown("---")
     st.subheader("🔄 Generate Summary")
 
+    # Summaries are kept per session, so changing the output format or preview re-renders without re-summarizing
+    summary_key = results.key("summary", uploaded_file, pages=selected_pages, sentences=custom_sentences, query=focus_query.strip())
+
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
         if st.button("📋 Generate Summary", use_container_width=True):
+            low_memory = memory_budget.low_memory(uploaded_file.size)
+            wait_notice = st.empty()
             with st.spinner("Analyzing document and generating summary... This may take a moment."):
+                tracer = Tracer("pdf_summarizer").start() if trace_enabled else None
+                job_ticket = memory_ticket = progress = job_dir = None
                 try:
+                    # Waiting can be interrupted by a rerun; the finally releases whatever was granted
+                    job_ticket = scheduler.acquire(
+                        "pdf_summarizer", session_id(), estimate_cost("pdf_summarizer", uploaded_file, info=pdf_info, pages=selected_pages),
+                        on_wait=lambda position, waited: wait_notice.info(f"⏳ Queued: position {position}, waiting {waited:.0f}s")
+                    )
+                    memory_ticket = memory_budget.acquire(
+                        estimate_job_mb("pdf_summarizer", uploaded_file.size, low_memory),
+                        on_wait=lambda waited: wait_notice.info(f"⏳ Server is busy, waiting for memory... {waited:.0f}s")
+                    )
+                    wait_notice.empty()
+                    progress = Progress(progress_bar(), {"extract": 3, "summarize": 1}).start()
                     # Save uploaded file
-                    temp_pdf_path = save_uploaded_file(uploaded_file, "temp")
+                    job_dir = make_job_dir()
+                    temp_pdf_path = save_uploaded_file(uploaded_file, job_dir)
 
                     if temp_pdf_path:
-                        # Extract text from PDF
-                        st.info("📝 Extracting text from PDF...")
-                        text = PDFSummarizer.extract_text_with_pdfplumber(temp_pdf_path)
+                        if focus_query.strip():
+                            # Query mode reuses the cached sentence index for this document
+                            st.info("🔍 Loading document index...")
+                            index = PDFSummarizer.get_document_index(temp_pdf_path, selected_pages)
+                            text = ' '.join(index.sentences) if index else None
+                        else:
+                            # Extract text from PDF
+                            st.info("📝 Extracting text from PDF...")
+                            document = PDFSummarizer.extract_document(temp_pdf_path, selected_pages)
+                            text = document.text.strip() if document is not None else None
 
                         if text and len(text.strip()) > 100:
-                            # Show original text if requested
-                            if show_original:
-                                st.subheader("📖 Original Text Preview")
-                                with st.expander("View extracted text (first 1000 characters)"):
-                                    st.text_area(
-                                        "Extracted text:",
-                                        text[:1000] + "..." if len(text) > 1000 else text,
-                                        height=200
-                                    )
-
                             # Generate summary
                             st.info("🤖 Generating intelligent summary...")
-                            summary = PDFSummarizer.summarize_text(text, num_sentences=custom_sentences)
+                            if focus_query.strip():
+                                summary = PDFSummarizer.query_summary(index, focus_query, num_sentences=custom_sentences)
+                            else:
+                                summary = PDFSummarizer.summarize_text(document, num_sentences=custom_sentences)
 
                             if summary:
                                 st.success("✅ Summary generated successfully!")
-
-                                # Display summary
-                                st.subheader("📋 Document Summary")
-                                st.markdown(f"""
-                                <div class="main-container">
-                                    <p style="font-size: 1.1em; line-height: 1.6; text-align: justify;">
-                                        {summary}
-                                    </p>
-                                </div>
-                                """, unsafe_allow_html=True)
-
-                                # Summary statistics
-                                st.subheader("📊 Summary Statistics")
-                                original_words = len(text.split())
-                                summary_words = len(summary.split())
-                                reduction_ratio = (1 - summary_words / original_words) * 100
-
-                                col1, col2, col3, col4 = st.columns(4)
-                                with col1:
-                                    st.metric("📄 Original Words", f"{original_words:,}")
-                                with col2:
-                                    st.metric("📝 Summary Words", f"{summary_words:,}")
-                                with col3:
-                                    st.metric("📊 Reduction", f"{reduction_ratio:.1f}%")
-                                with col4:
-                                    st.metric("⏱️ Reading Time", f"~{summary_words // 200} min")
-
-                                # Download options
-                                if output_format == "Downloadable Text File":
-                                    st.markdown("---")
-                                    st.subheader("📥 Download Summary")
-
-                                    # Create downloadable file
-                                    summary_file_path = PDFSummarizer.create_summary_pdf(summary, "temp/summary.txt")
-
-                                    if summary_file_path and os.path.exists(summary_file_path):
-                                        with open(summary_file_path, 'rb') as f:
-                                            summary_data = f.read()
-
-                                        st.download_button(
-                                            label="📄 Download Summary as Text File",
-                                            data=summary_data,
-                                            file_name=f"{uploaded_file.name.replace('.pdf', '_summary.txt')}",
-                                            mime="text/plain",
-                                            use_container_width=True
-                                        )
-
-                                # Action buttons
-                                st.markdown("---")
-                                col1, col2 = st.columns(2)
-                                with col1:
-                                    if st.button("🔄 Generate New Summary", use_container_width=True):
-                                        st.experimental_rerun()
-                                with col2:
-                                    if st.button("📋 Copy Summary to Clipboard", use_container_width=True):
-                                        # Note: Clipboard functionality requires JavaScript
-                                        st.info("💡 Use Ctrl+A, Ctrl+C to copy the summary text above")
-
+                                results.put(summary_key, {
+                                    "summary": summary,
+                                    "preview": text[:1000] + "..." if len(text) > 1000 else text,
+                                    "original_words": len(text.split()),
+                                })
+
+                            elif focus_query.strip() and summary is not None:
+                                st.warning("⚠️ No sentences in the document match this topic. Try different keywords.")
                             else:
                                 st.error("❌ Failed to generate summary. The document might be too short or contain insufficient text.")
 
@@ -211,7 +209,99 @@ if uploaded_file is not None:
 
                 finally:
                     # Clean up temporary files
-                    clean_temp_files("temp")
+                    if job_dir:
+                        clean_temp_files(job_dir)
+                    if progress is not None:
+                        progress.finish()
+                    if memory_ticket is not None:
+                        memory_budget.release(memory_ticket)
+                    if job_ticket is not None:
+                        scheduler.release(job_ticket)
+                    if tracer:
+                        tracer.finish()
+
+            if tracer:
+                show_trace(tracer)
+
+    result = results.get(summary_key)
+    if result:
+        summary = result["summary"]
+
+        # Show original text if requested
+        if show_original:
+            st.subheader("📖 Original Text Preview")
+            with st.expander("View extracted text (first 1000 characters)"):
+                st.text_area("Extracted text:", result["preview"], height=200)
+
+        # Display summary
+        st.subheader("📋 Document Summary")
+        st.markdown(f"""
+        <div class="main-container">
+            <p style="font-size: 1.1em; line-height: 1.6; text-align: justify;">
+                {html.escape(summary)}
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+
+        # Summary statistics
+        st.subheader("📊 Summary Statistics")
+        original_words = result["original_words"]
+        summary_words = len(summary.split())
+        reduction_ratio = (1 - summary_words / original_words) * 100
+
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("📄 Original Words", f"{original_words:,}")
+        with col2:
+            st.metric("📝 Summary Words", f"{summary_words:,}")
+        with col3:
+            st.metric("📊 Reduction", f"{reduction_ratio:.1f}%")
+        with col4:
+            st.metric("⏱️ Reading Time", f"~{summary_words // 200} min")
+
+        # Download options
+        if output_format == "Downloadable Text File":
+            st.markdown("---")
+            st.subheader("📥 Download Summary")
+
+            # Create downloadable file, once per summary
+            summary_name = uploaded_file.name.replace('.pdf', '_summary.txt')
+            saved = artifacts.get(summary_key, artifact_owner())
+            if saved is None:
+                summary_dir = make_job_dir()
+                try:
+                    summary_file_path = PDFSummarizer.create_summary_pdf(summary, os.path.join(summary_dir, "summary.txt"))
+
+                    if summary_file_path and os.path.exists(summary_file_path):
+                        saved = artifacts.put(summary_key, summary_file_path, artifact_owner(), summary_name, "text/plain")
+                        with open(summary_file_path, 'rb') as f:
+                            summary_data = f.read()
+
+                        if saved is None:
+                            st.download_button(
+                                label="📄 Download Summary as Text File",
+                                data=summary_data,
+                                file_name=summary_name,
+                                mime="text/plain",
+                                use_container_width=True
+                            )
+                finally:
+                    clean_temp_files(summary_dir)
+
+            if saved:
+                show_artifact(saved, "📄 Download Summary as Text File")
+
+        # Action buttons
+        st.markdown("---")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("🔄 Generate New Summary", use_container_width=True):
+                results.discard(summary_key)
+                st.rerun()
+        with col2:
+            if st.button("📋 Copy Summary to Clipboard", use_container_width=True):
+                # Note: Clipboard functionality requires JavaScript
+                st.info("💡 Use Ctrl+A, Ctrl+C to copy the summary text above")
 
 else:
     st.info("👆 Please upload a PDF document to start the summarization process.")
@@ -233,6 +323,9 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Sidebar help
+owner = artifact_owner(create=False)
+if owner:
+    show_saved_files(artifacts, owner)
 st.sidebar.title("📋 PDF Summarizer Help")
 st.sidebar.markdown("""
 ### How to Use:
@@ -254,6 +347,7 @@ st.sidebar.markdown("""
 - **Medium:** Balanced summary (5-8 sentences)  
 - **Long:** Detailed summary (8-12 sentences)
 - **Custom:** Specify exact length
+- **Focus Topic:** Summarize around keywords
 
 ### Output Options:
 - **Text:** View summary on screen
@@ -1,9 +1,16 @@
 
 import streamlit as st
+import html
 import os
+import math
 import tempfile
-from utils.styling import set_background_image
-from utils.converters import AudioToPDFConverter, save_uploaded_file, clean_temp_files
+from utils.resources import memory_budget, estimate_job_mb
+from utils.scheduler import scheduler, session_id, estimate_cost
+from utils.probe import probe_audio, plan_audio
+from utils.results import results
+from utils.artifacts import artifacts, artifact_owner
+from utils.styling import set_background_image, show_trace, progress_bar, show_artifact, show_saved_files
+from utils.converters import AudioToPDFConverter, TranscriptWriter, Tracer, Progress, save_uploaded_file, make_job_dir, clean_temp_files
 
 # Configure page
 st.set_page_config(page_title="Audio to PDF Converter", page_icon="🎵", layout="wide")
@@ -59,6 +66,20 @@ if uploaded_audio is not None:
         file_extension = uploaded_audio.name.split('.')[-1].upper()
         st.metric("📁 Format", file_extension)
 
+    audio_info = probe_audio(uploaded_audio)
+    audio_route = plan_audio(audio_info)
+    if audio_info:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("⏱️ Duration", f"{audio_info['duration'] / 60:.1f} min")
+        with col2:
+            st.metric("🎚️ Sample Rate", f"{(audio_info.get('sample_rate') or 0) / 1000:g} kHz")
+        with col3:
+            st.metric("🔈 Channels", "Mono" if audio_info.get("channels") == 1 else audio_info.get("channels") or "?")
+        if audio_route["chunked"]:
+            chunks = math.ceil(audio_info["duration"] / AudioToPDFConverter.CHUNK_SECONDS)
+            st.caption(f"📏 Long recording: it will be transcribed in {chunks} parts of {AudioToPDFConverter.CHUNK_SECONDS} s")
+
     # Audio player
     st.subheader("🔊 Audio Preview")
     st.audio(uploaded_audio, format=f'audio/{uploaded_audio.name.split(".")[-1]}')
@@ -107,6 +128,13 @@ if uploaded_audio is not None:
             help="Attempt to identify different speakers (experimental)"
         )
 
+# Diagnostics
+trace_enabled = st.sidebar.checkbox(
+    "🔬 Show performance trace",
+    value=False,
+    help="Time each conversion stage; traces are also appended to logs/trace.jsonl"
+)
+
 # Processing section
 if uploaded_audio is not None:
     st.markdown("---")
@@ -121,114 +149,86 @@ if uploaded_audio is not None:
     - Background noise may affect accuracy
     """)
 
+    # Text saved from a run that was stopped or failed part way through; it expires like any saved output
+    partial_key = f"partial_transcript:{session_id()}"
+    partial = artifacts.get(partial_key, artifact_owner()) if st.session_state.get("partial_transcript") else None
+    if partial:
+        st.warning("⏹️ The last transcription did not finish. The text recognized so far is still available.")
+        show_artifact(partial, "📥 Download partial transcript")
+
+    # Transcripts are kept per session, so changing the output format or timestamps re-renders without re-transcribing
+    transcript_key = results.key("transcript", uploaded_audio, speakers=speaker_detection)
+
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
         if st.button("🎵 Convert Audio to PDF", use_container_width=True):
+            wait_notice = st.empty()
             with st.spinner("Converting audio to text... This may take several minutes depending on audio length."):
+                tracer = Tracer("audio_to_pdf").start() if trace_enabled else None
+                job_ticket = memory_ticket = progress = job_dir = None
                 try:
+                    # Waiting can be interrupted by a rerun; the finally releases whatever was granted
+                    job_ticket = scheduler.acquire(
+                        "audio_to_pdf", session_id(), estimate_cost("audio_to_pdf", uploaded_audio, info=audio_info),
+                        on_wait=lambda position, waited: wait_notice.info(f"⏳ Queued: position {position}, waiting {waited:.0f}s")
+                    )
+                    memory_ticket = memory_budget.acquire(
+                        # Transcription always streams the audio in chunks
+                        estimate_job_mb("audio_to_pdf", uploaded_audio.size, low_memory=True),
+                        on_wait=lambda waited: wait_notice.info(f"⏳ Server is busy, waiting for memory... {waited:.0f}s")
+                    )
+                    wait_notice.empty()
+                    progress = Progress(progress_bar(), {"transcribe": 1}).start()
                     # Save uploaded audio file
-                    temp_audio_path = save_uploaded_file(uploaded_audio, "temp")
+                    job_dir = make_job_dir()
+                    temp_audio_path = save_uploaded_file(uploaded_audio, job_dir)
 
                     if temp_audio_path:
                         st.info("🎧 Processing audio file...")
 
-                        # Check if file is WAV format (required for speech_recognition)
-                        if not uploaded_audio.name.lower().endswith('.wav'):
+                        # Speech recognition reads PCM WAV; anything else is converted first
+                        if audio_route["needs_conversion"]:
                             st.info("🔄 Converting audio to WAV format...")
-                            # Note: In a real implementation, you'd use pydub or similar for conversion
-                            st.warning("⚠️ For best results, please upload WAV format audio files.")
-
-                        # Convert audio to text
-                        st.info("🤖 Transcribing speech to text...")
-                        transcribed_text = AudioToPDFConverter.audio_to_text(temp_audio_path)
 
-                        if transcribed_text:
+                        # Transcribe chunk by chunk, showing text as it arrives
+                        st.info("🤖 Transcribing speech to text... Text appears below as it is recognized; if you stop, what is done so far can still be downloaded.")
+                        transcript_path = os.path.join(job_dir, "transcript.txt")
+                        writer = TranscriptWriter(transcript_path, timestamps=include_timestamps)
+                        segments = []
+                        transcript_stats = {}
+                        live_view = st.empty()
+                        finished = False
+                        try:
+                            for segment in AudioToPDFConverter.iter_transcript(temp_audio_path, stats=transcript_stats, speakers=speaker_detection):
+                                writer.add(segment)
+                                if segment["text"]:
+                                    segments.append(segment)
+                                    live_view.text_area("📝 Live transcript", writer.tail(), height=200)
+                            finished = True
+                        finally:
+                            writer.close()
+                            if not finished and writer.segments:
+                                # Stopped or failed: keep the text so far before the job directory is removed
+                                partial_name = f"{uploaded_audio.name.rsplit('.', 1)[0]}_partial_transcript.txt"
+                                st.session_state.partial_transcript = artifacts.put(
+                                    partial_key, transcript_path, artifact_owner(), partial_name, "text/plain") is not None
+                        live_view.empty()
+
+                        # Finished, so there is no partial transcript to offer any more
+                        if st.session_state.get("partial_transcript"):
+                            st.session_state.partial_transcript = False
+                            artifacts.remove(partial_key, artifact_owner())
+
+                        vad = transcript_stats.get("vad")
+                        if vad and vad["audio_seconds"]:
+                            silence = vad["audio_seconds"] - vad["speech_seconds"]
+                            st.caption(f"🔇 Skipped {silence / 60:.1f} min of silence: {vad['speech_seconds'] / 60:.1f} of {vad['audio_seconds'] / 60:.1f} min sent for recognition")
+                        if "speakers" in transcript_stats:
+                            st.caption(f"🗣️ {transcript_stats['speakers']} speaker(s) detected")
+
+                        if segments:
                             st.success("✅ Transcription completed successfully!")
-
-                            # Display transcribed text
-                            st.subheader("📝 Transcribed Text")
-
-                            # Add timestamps if requested
-                            if include_timestamps:
-                                # This is a simplified timestamp - in real implementation, 
-                                # you'd need more advanced audio processing
-                                display_text = f"[00:00] {transcribed_text}"
-                            else:
-                                display_text = transcribed_text
-
-                            # Add speaker detection if requested
-                            if speaker_detection:
-                                display_text = f"Speaker 1: {display_text}"
-
-                            st.markdown(f"""
-                            <div class="main-container">
-                                <p style="font-size: 1.1em; line-height: 1.6; text-align: justify; white-space: pre-wrap;">
-                                    {display_text}
-                                </p>
-                            </div>
-                            """, unsafe_allow_html=True)
-
-                            # Create downloadable file
-                            st.subheader("📥 Download Transcription")
-
-                            # Determine file extension
-                            # Determine file extension
-                            if output_format == "Text File (.txt)":
-                                file_ext = "txt"
-                                mime_type = "text/plain"
-                            elif output_format == "Rich Text (.rtf)":
-                                file_ext = "rtf"
-                                mime_type = "application/rtf"
-                            elif output_format == "Markdown (.md)":
-                                file_ext = "md"
-                                mime_type = "text/markdown"
-                                display_text = f"# Audio Transcription\n\n{display_text}"
-                            elif output_format == "PDF Document (.pdf)":
-                                file_ext = "pdf"
-                                mime_type = "application/pdf"
-
-                            # Save to file
-                            output_filename = f"temp/transcription.{file_ext}"
-                            text_file_path = AudioToPDFConverter.text_to_file(display_text, output_filename)
-
-                            if text_file_path and os.path.exists(text_file_path):
-                                with open(text_file_path, 'rb') as f:
-                                    file_data = f.read()
-
-                                st.download_button(
-                                    label=f"📄 Download as {output_format}",
-                                    data=file_data,
-                                    file_name=f"{uploaded_audio.name.rsplit('.', 1)[0]}_transcript.{file_ext}",
-                                    mime=mime_type,
-                                    use_container_width=True
-                                )
-
-                            # Statistics
-                            st.subheader("📊 Transcription Statistics")
-                            word_count = len(transcribed_text.split())
-                            char_count = len(transcribed_text)
-                            estimated_duration = uploaded_audio.size / 1024 / 16  # Rough estimate
-
-                            col1, col2, col3, col4 = st.columns(4)
-                            with col1:
-                                st.metric("📝 Words", word_count)
-                            with col2:
-                                st.metric("📄 Characters", char_count)
-                            with col3:
-                                st.metric("⏱️ Est. Audio Length", f"~{estimated_duration:.1f} min")
-                            with col4:
-                                accuracy = "Good" if word_count > 10 else "Check Audio Quality"
-                                st.metric("🎯 Quality", accuracy)
-
-                            # Additional actions
-                            st.markdown("---")
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                if st.button("🔄 Process New Audio", use_container_width=True):
-                                    st.experimental_rerun()
-                            with col2:
-                                if st.button("📋 Copy Text", use_container_width=True):
-                                    st.info("💡 Use Ctrl+A, Ctrl+C to copy the transcribed text above")
+                            results.put(transcript_key, {"segments": segments})
 
                         else:
                             st.error("""
@@ -260,7 +260,117 @@ if uploaded_audio is not None:
 
                 finally:
                     # Clean up temporary files
-                    clean_temp_files("temp")
+                    if job_dir:
+                        clean_temp_files(job_dir)
+                    if progress is not None:
+                        progress.finish()
+                    if memory_ticket is not None:
+                        memory_budget.release(memory_ticket)
+                    if job_ticket is not None:
+                        scheduler.release(job_ticket)
+                    if tracer:
+                        tracer.finish()
+
+            if tracer:
+                show_trace(tracer)
+
+    result = results.get(transcript_key)
+    if result:
+        transcribed_text = TranscriptWriter.format_segments(result["segments"])
+
+        # Display transcribed text
+        st.subheader("📝 Transcribed Text")
+
+        # Timestamps, if requested, are added per segment; speaker labels where the speaker changes
+        display_text = TranscriptWriter.format_segments(result["segments"], timestamps=include_timestamps)
+
+        st.markdown(f"""
+        <div class="main-container">
+            <p style="font-size: 1.1em; line-height: 1.6; text-align: justify; white-space: pre-wrap;">
+                {html.escape(display_text)}
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+
+        # Create downloadable file
+        st.subheader("📥 Download Transcription")
+
+        # Determine file extension
+        if output_format == "Text File (.txt)":
+            file_ext = "txt"
+            mime_type = "text/plain"
+        elif output_format == "Rich Text (.rtf)":
+            file_ext = "rtf"
+            mime_type = "application/rtf"
+        elif output_format == "Markdown (.md)":
+            file_ext = "md"
+            mime_type = "text/markdown"
+            display_text = f"# Audio Transcription\n\n{display_text}"
+        elif output_format == "PDF Document (.pdf)":
+            file_ext = "pdf"
+            mime_type = "application/pdf"
+
+        # Save to file, once per transcript and format
+        transcript_name = f"{uploaded_audio.name.rsplit('.', 1)[0]}_transcript.{file_ext}"
+        file_key = results.key("transcript_file", uploaded_audio, transcript=transcript_key,
+                               format=file_ext, timestamps=include_timestamps)
+        saved = artifacts.get(file_key, artifact_owner())
+        if saved is None:
+            file_dir = make_job_dir()
+            try:
+                output_filename = os.path.join(file_dir, f"transcription.{file_ext}")
+                text_file_path = AudioToPDFConverter.text_to_file(
+                    display_text, output_filename, segments=result["segments"], timestamps=include_timestamps)
+
+                if text_file_path and os.path.exists(text_file_path):
+                    saved = artifacts.put(file_key, text_file_path, artifact_owner(), transcript_name, mime_type)
+                    with open(text_file_path, 'rb') as f:
+                        file_data = f.read()
+
+                    if saved is None:
+                        st.download_button(
+                            label=f"📄 Download as {output_format}",
+                            data=file_data,
+                            file_name=transcript_name,
+                            mime=mime_type,
+                            use_container_width=True
+                        )
+            finally:
+                clean_temp_files(file_dir)
+
+        if saved:
+            show_artifact(saved, f"📄 Download as {output_format}")
+
+        # Statistics
+        st.subheader("📊 Transcription Statistics")
+        word_count = len(transcribed_text.split())
+        char_count = len(transcribed_text)
+        if audio_info:
+            estimated_duration = audio_info["duration"] / 60
+        else:
+            estimated_duration = uploaded_audio.size / 1024 / 16  # Rough estimate
+
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("📝 Words", word_count)
+        with col2:
+            st.metric("📄 Characters", char_count)
+        with col3:
+            st.metric("⏱️ Est. Audio Length", f"~{estimated_duration:.1f} min")
+        with col4:
+            accuracy = "Good" if word_count > 10 else "Check Audio Quality"
+            st.metric("🎯 Quality", accuracy)
+
+        # Additional actions
+        st.markdown("---")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("🔄 Process New Audio", use_container_width=True):
+                results.discard(transcript_key)
+                st.rerun()
+        with col2:
+            if st.button("📋 Copy Text", use_container_width=True):
+                st.info("💡 Use Ctrl+A, Ctrl+C to copy the transcribed text above")
 
 else:
     st.info("👆 Please upload an audio file to start the transcription process.")
@@ -268,6 +378,9 @@ else:
 
 
 # Sidebar help
+owner = artifact_owner(create=False)
+if owner:
+    show_saved_files(artifacts, owner)
 st.sidebar.title("🎵 Audio to PDF Help")
 st.sidebar.markdown("""
 ### How to Use:
@@ -0,0 +1,273 @@
+import streamlit as st
+import html
+import os
+from utils.resources import memory_budget, estimate_job_mb
+from utils.scheduler import scheduler, session_id, estimate_cost
+from utils.probe import probe_pdf, probe_audio, plan_pdf
+from utils.results import results
+from utils.artifacts import artifacts, artifact_owner
+from utils.styling import set_background_image, show_trace, progress_bar, select_pages, show_artifact, show_saved_files
+from utils.converters import ConverterPipelines, Tracer, Progress, save_uploaded_file, make_job_dir, clean_temp_files, TTS_LANGUAGES, TTS_VOICES
+
+# Configure page
+st.set_page_config(page_title="Combined Workflows", page_icon="🔗", layout="wide")
+
+# Set background image
+try:
+    if os.path.exists("assets/tech_bg.png"):
+        set_background_image("assets/tech_bg.png")
+except:
+    pass
+
+# Header
+st.markdown("""
+<div class="header-style">
+    🔗 Combined Workflows
+</div>
+""", unsafe_allow_html=True)
+
+# Description
+st.markdown("""
+<div class="main-container">
+    <h2>Several Converters, One Job</h2>
+    <p>Chain converters without downloading and re-uploading in between. The stages run side by side:</p>
+    <ul>
+        <li>🔊 <strong>PDF → Summary → Audio:</strong> listen to the key points of a report</li>
+        <li>📄 <strong>Audio → Summary → PDF:</strong> get the gist of a meeting or lecture as a document</li>
+        <li>⚡ Speech for the first section is synthesized while later pages are still being read</li>
+    </ul>
+</div>
+""", unsafe_allow_html=True)
+
+WORKFLOWS = {
+    "📄 PDF → 📋 Summary → 🔊 Audio": "pdf_summary_audio",
+    "🎵 Audio → 📋 Summary → 📄 PDF": "audio_summary_file",
+}
+workflow = WORKFLOWS[st.radio("🔗 Workflow", list(WORKFLOWS), horizontal=True)]
+
+# File upload section
+if workflow == "pdf_summary_audio":
+    st.subheader("📁 Upload Your PDF Document")
+    uploaded_file = st.file_uploader("Choose a PDF file", type="pdf", help="Upload a PDF document to summarize and read aloud")
+else:
+    st.subheader("🎵 Upload Your Audio File")
+    uploaded_file = st.file_uploader(
+        "Choose an audio file",
+        type=['wav', 'mp3', 'flac', 'm4a', 'ogg'],
+        help="Upload audio file in supported format (WAV, MP3, FLAC, M4A, OGG)"
+    )
+
+file_info = None
+selected_pages = None
+if uploaded_file is not None:
+    st.success(f"✅ File uploaded: {uploaded_file.name}")
+    if workflow == "pdf_summary_audio":
+        file_info = probe_pdf(uploaded_file)
+        if file_info:
+            st.caption(f"📄 {file_info['pages']} pages, ~{file_info['pages'] * file_info['words_per_page']:,.0f} words")
+            if file_info["encrypted"]:
+                st.warning("🔒 This PDF is encrypted, so its text cannot be extracted.")
+            elif plan_pdf(file_info)["needs_ocr"]:
+                st.warning("🖼️ No text layer found; this looks like a scanned PDF. OCR is not available, so the summary may be empty.")
+        selected_pages = select_pages(uploaded_file, file_info, "workflow")
+    else:
+        file_info = probe_audio(uploaded_file)
+        if file_info:
+            st.caption(f"⏱️ {file_info['duration'] / 60:.1f} min of audio")
+
+# Workflow settings
+if uploaded_file is not None:
+    st.markdown("---")
+    st.subheader("⚙️ Workflow Settings")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        num_sentences = st.number_input(
+            "📏 Summary sentences",
+            min_value=2,
+            max_value=40,
+            value=8,
+            help="Spread evenly over the document, so every section is represented"
+        )
+        if workflow == "pdf_summary_audio":
+            section_size = st.slider(
+                "📑 Pages per section",
+                min_value=2,
+                max_value=50,
+                value=10,
+                help="The summary is built one section at a time; smaller sections start speaking sooner"
+            )
+        else:
+            section_size = st.slider(
+                "📑 Minutes per section",
+                min_value=1,
+                max_value=30,
+                value=5,
+                help="The summary is built one section at a time as the recording is transcribed"
+            )
+
+    with col2:
+        if workflow == "pdf_summary_audio":
+            language_label = st.selectbox("Language", [name for name, _ in TTS_LANGUAGES.values()])
+            tts_lang = next(code for code, (name, _) in TTS_LANGUAGES.items() if name == language_label)
+            voice_label = st.selectbox(
+                "Voice",
+                list(TTS_VOICES),
+                help="Regional Google TTS voices; accents are most noticeable in English"
+            )
+            speech_rate = st.slider("🗣️ Speech Rate (WPM)", min_value=100, max_value=250, value=150, step=10)
+        else:
+            output_format = st.selectbox(
+                "Output Format",
+                ["PDF Document (.pdf)", "Text File (.txt)", "Markdown (.md)"],
+                help="Choose the format for the summary document"
+            )
+
+# Diagnostics
+trace_enabled = st.sidebar.checkbox(
+    "🔬 Show performance trace",
+    value=False,
+    help="Time each conversion stage; traces are also appended to logs/trace.jsonl"
+)
+
+# Processing section
+if uploaded_file is not None:
+    st.markdown("---")
+    st.subheader("🔄 Run Workflow")
+
+    if workflow == "pdf_summary_audio":
+        settings = dict(pages=selected_pages, sentences=num_sentences, section=section_size,
+                        lang=tts_lang, voice=voice_label, rate=speech_rate)
+    else:
+        settings = dict(sentences=num_sentences, section=section_size, format=output_format)
+    result_key = results.key(workflow, uploaded_file, **settings)
+    # "Run Again" skips the stored result, which other sessions may also hold
+    rerun_requested = st.session_state.get("workflow_rerun") == result_key
+    saved = None if rerun_requested else artifacts.get(result_key, artifact_owner())
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        if saved and not results.get(result_key):
+            st.success("♻️ Already run with these settings; here is the saved result.")
+        elif not saved and st.button("🚀 Run Workflow", use_container_width=True):
+            low_memory = memory_budget.low_memory(uploaded_file.size)
+            wait_notice = st.empty()
+            with st.spinner("Running the workflow... Each stage starts as soon as the previous one has output."):
+                tracer = Tracer(workflow).start() if trace_enabled else None
+                job_ticket = memory_ticket = progress = job_dir = None
+                try:
+                    # Waiting can be interrupted by a rerun; the finally releases whatever was granted
+                    job_ticket = scheduler.acquire(
+                        "workflow", session_id(), estimate_cost("workflow", uploaded_file, info=file_info, pages=selected_pages),
+                        on_wait=lambda position, waited: wait_notice.info(f"⏳ Queued: position {position}, waiting {waited:.0f}s")
+                    )
+                    memory_ticket = memory_budget.acquire(
+                        estimate_job_mb("workflow", uploaded_file.size, low_memory),
+                        on_wait=lambda waited: wait_notice.info(f"⏳ Server is busy, waiting for memory... {waited:.0f}s")
+                    )
+                    wait_notice.empty()
+                    if workflow == "pdf_summary_audio":
+                        stages = {"extract": 2, "summarize": 1, "synthesize": 4, "write": 1}
+                    else:
+                        stages = {"transcribe": 6, "summarize": 1, "write": 1}
+                    progress = Progress(progress_bar(), stages).start()
+                    job_dir = make_job_dir()
+                    temp_path = save_uploaded_file(uploaded_file, job_dir)
+                    stats = {}
+                    if temp_path and workflow == "pdf_summary_audio":
+                        output_path = ConverterPipelines.pdf_to_spoken_summary(
+                            temp_path, os.path.join(job_dir, "summary_audio.mp3"), pages=selected_pages, num_sentences=num_sentences,
+                            section_pages=section_size, lang=tts_lang, voice=TTS_VOICES[voice_label],
+                            rate=speech_rate, stats=stats
+                        )
+                        name, mime = uploaded_file.name.rsplit('.', 1)[0] + "_summary.mp3", "audio/mpeg"
+                    elif temp_path:
+                        ext = output_format.split("(")[1].rstrip(")")
+                        output_path = ConverterPipelines.audio_to_summary_file(
+                            temp_path, os.path.join(job_dir, f"audio_summary{ext}"), num_sentences=num_sentences,
+                            section_seconds=section_size * 60, stats=stats
+                        )
+                        name = uploaded_file.name.rsplit('.', 1)[0] + "_summary" + ext
+                        mime = {".pdf": "application/pdf", ".md": "text/markdown"}.get(ext, "text/plain")
+                    else:
+                        output_path = None
+                        st.error("❌ Failed to process the uploaded file.")
+
+                    if output_path and os.path.exists(output_path):
+                        st.success("✅ Workflow completed successfully!")
+                        saved = artifacts.put(result_key, output_path, artifact_owner(), name, mime)
+                        st.session_state.pop("workflow_rerun", None)
+                        if saved is None:
+                            st.warning("⚠️ The result is larger than your storage quota and could not be kept.")
+                        results.put(result_key, {
+                            "summary": stats.get("summary", []),
+                            "stages": [{"stage": stage, **row} for stage, row in stats.get("pipeline", {}).items()],
+                        })
+                    elif temp_path:
+                        st.error("❌ No summary could be produced. The file might not contain readable text or intelligible speech.")
+
+                except Exception as e:
+                    st.error(f"❌ Error during the workflow: {str(e)}")
+
+                finally:
+                    # Clean up temporary files
+                    if job_dir:
+                        clean_temp_files(job_dir)
+                    if progress is not None:
+                        progress.finish()
+                    if memory_ticket is not None:
+                        memory_budget.release(memory_ticket)
+                    if job_ticket is not None:
+                        scheduler.release(job_ticket)
+                    if tracer:
+                        tracer.finish()
+
+            if tracer:
+                show_trace(tracer)
+
+    result = results.get(result_key)
+    if result:
+        st.subheader("📋 Summary")
+        st.markdown(f"""
+        <div class="main-container">
+            <p style="font-size: 1.1em; line-height: 1.6; text-align: justify;">
+                {html.escape(" ".join(result["summary"]))}
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    if saved:
+        show_artifact(saved, "📥 Download Result", player=True)
+
+    if result:
+        with st.expander("⏱️ Stage timings"):
+            st.dataframe(result["stages"], use_container_width=True, hide_index=True)
+            st.caption("first_item_s: when the stage produced its first output, in seconds from the start. "
+                       "Stages overlap when a later stage starts before an earlier one has finished.")
+
+    if saved:
+        if st.button("🔄 Run Again", use_container_width=True):
+            st.session_state.workflow_rerun = result_key
+            results.discard(result_key)
+            st.rerun()
+
+else:
+    st.info("👆 Please upload a file to start the workflow.")
+
+# Sidebar help
+owner = artifact_owner(create=False)
+if owner:
+    show_saved_files(artifacts, owner)
+st.sidebar.title("🔗 Workflow Help")
+st.sidebar.markdown("""
+### How It Works:
+1. **Choose** a workflow
+2. **Upload** your PDF or audio file
+3. **Set** the summary length and section size
+4. **Run** and download the result
+
+### Tips:
+- Smaller sections give the first output sooner
+- The summary takes sentences from every section, in document order
+- Use the single converters for a full audiobook or transcript
+""")
@@ -0,0 +1,322 @@
+
+import os
+import re
+import time
+import uuid
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+import streamlit as st
+
+from utils.assets import STATIC_DIR
+from utils.metrics import REGISTRY, Gauge, CACHE_REQUESTS
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+# Persistent store for generated outputs (audiobooks, summaries, transcripts).
+# Files are stored once under their content hash, so identical outputs share
+# one copy and keep the same URL for as long as they exist. A small SQLite
+# index maps what produced a file (the upload's hash plus the settings) to the
+# stored object: asking again for the same output is a lookup, not another
+# conversion, even after a page refresh or from another session. References
+# expire ARTIFACT_TTL_HOURS after their last use, and each owner holds at most
+# ARTIFACT_QUOTA_MB; their least recently used files go first. Expired
+# references are swept on use, at most every SWEEP_SECONDS. Objects live in
+# Streamlit's static folder by default, or in an S3-compatible bucket.
+
+ARTIFACT_DIR = os.path.join(STATIC_DIR, "artifacts")
+# Relative to the page, like the theme assets (utils/assets.py)
+ARTIFACT_URL = "app/static/artifacts"
+INDEX_PATH = os.path.join("cache", "artifacts.db")
+OWNER_COOKIE = "converter_files"
+
+STORE_BYTES = REGISTRY.register(Gauge(
+    "artifact_store_bytes", "Bytes of stored artifacts, after deduplication", ()))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (name TEXT PRIMARY KEY, size INTEGER, created REAL);
+CREATE TABLE IF NOT EXISTS refs (
+    owner TEXT, key TEXT, name TEXT, filename TEXT, mime TEXT, size INTEGER, used REAL, expires REAL,
+    PRIMARY KEY (owner, key)
+);
+CREATE INDEX IF NOT EXISTS refs_key ON refs (key, expires);
+CREATE INDEX IF NOT EXISTS refs_name ON refs (name);
+"""
+
+
+class Artifact:
+    """A stored output as seen by one owner"""
+
+    def __init__(self, key, name, filename, mime, size, expires, url, path=None):
+        self.key = key
+        self.name = name
+        self.filename = filename
+        self.mime = mime
+        self.size = size
+        self.expires = expires
+        self.url = url
+        # Local file for st.audio and download buttons; None for remote backends
+        self.path = path
+
+
+class LocalBackend:
+    """Objects as files in Streamlit's static folder, served at app/static/artifacts/"""
+
+    def __init__(self, directory=ARTIFACT_DIR, url_prefix=ARTIFACT_URL):
+        self.directory = directory
+        self.url_prefix = url_prefix
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def put(self, name, source_path, mime):
+        os.makedirs(self.directory, exist_ok=True)
+        # Copy then rename, so a reader never gets half a file
+        tmp = f"{self.path(name)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(source_path, tmp)
+        os.replace(tmp, self.path(name))
+
+    def read(self, name):
+        with open(self.path(name), "rb") as f:
+            return f.read()
+
+    def delete(self, name):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def url(self, name, filename, expires_in):
+        return f"{self.url_prefix}/{name}"
+
+
+class S3Backend:
+    """Objects in an S3-compatible bucket (AWS S3, MinIO, R2, ...)
+
+    client is a boto3 S3 client or anything with the same put_object,
+    get_object, head_object, delete_object and generate_presigned_url calls.
+    With public_url (a CDN or public bucket address) download URLs are
+    permanent; otherwise they are presigned for the artifact's remaining TTL.
+    """
+
+    def __init__(self, client, bucket, prefix="artifacts/", public_url=None):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.public_url = public_url.rstrip("/") if public_url else None
+
+    @classmethod
+    def from_env(cls):
+        if boto3 is None:
+            raise RuntimeError("ARTIFACT_BACKEND=s3 needs the boto3 package")
+        env = os.environ.get
+        client = boto3.client("s3", endpoint_url=env("ARTIFACT_S3_ENDPOINT") or None)
+        return cls(client, env("ARTIFACT_S3_BUCKET"), env("ARTIFACT_S3_PREFIX", "artifacts/"),
+                   env("ARTIFACT_S3_PUBLIC_URL"))
+
+    def path(self, name):
+        return None
+
+    def exists(self, name):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + name)
+            return True
+        except Exception:
+            return False
+
+    def put(self, name, source_path, mime):
+        with open(source_path, "rb") as f:
+            self.client.put_object(Bucket=self.bucket, Key=self.prefix + name, Body=f, ContentType=mime)
+
+    def read(self, name):
+        return self.client.get_object(Bucket=self.bucket, Key=self.prefix + name)["Body"].read()
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + name)
+
+    def url(self, name, filename, expires_in):
+        if self.public_url:
+            return f"{self.public_url}/{self.prefix}{name}"
+        return self.client.generate_presigned_url("get_object", Params={
+            "Bucket": self.bucket,
+            "Key": self.prefix + name,
+            "ResponseContentDisposition": f'attachment; filename="{filename}"',
+        }, ExpiresIn=max(1, int(expires_in)))
+
+
+def backend_from_env():
+    if os.environ.get("ARTIFACT_BACKEND", "local") == "s3":
+        return S3Backend.from_env()
+    return LocalBackend()
+
+
+def file_digest(path):
+    """SHA-256 of a file, read in 1 MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """Content-addressed output store with per-owner quota and TTL"""
+
+    # Expired references and orphaned objects are swept at most this often
+    SWEEP_SECONDS = 600
+
+    def __init__(self, backend=None, index_path=INDEX_PATH, ttl_seconds=None, quota_bytes=None):
+        env = os.environ.get
+        self.backend = backend
+        self.index_path = index_path
+        self.ttl_seconds = ttl_seconds or float(env("ARTIFACT_TTL_HOURS", 24)) * 3600
+        self.quota_bytes = quota_bytes or int(float(env("ARTIFACT_QUOTA_MB", 200)) * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._db = None
+        self._last_sweep = 0.0
+
+    def _index(self):
+        if self._db is None:
+            if self.backend is None:
+                self.backend = backend_from_env()
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            # One connection per process, used under self._lock; WAL lets processes share the file
+            self._db = sqlite3.connect(self.index_path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def _artifact(self, key, name, filename, mime, size, expires, now):
+        return Artifact(key, name, filename, mime, size, expires,
+                        self.backend.url(name, filename, expires - now), self.backend.path(name))
+
+    def _reference(self, db, owner, key, name, filename, mime, size, now):
+        """Add or refresh owner's reference and drop their oldest ones beyond the quota"""
+        expires = now + self.ttl_seconds
+        db.execute("INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                   (owner, key, name, filename, mime, size, now, expires))
+        rows = db.execute("SELECT key, size FROM refs WHERE owner = ? AND expires > ? ORDER BY used DESC",
+                          (owner, now)).fetchall()
+        total = 0
+        for other_key, other_size in rows:
+            total += other_size
+            if total > self.quota_bytes and other_key != key:
+                db.execute("DELETE FROM refs WHERE owner = ? AND key = ?", (owner, other_key))
+                total -= other_size
+        return expires
+
+    def get(self, key, owner):
+        """The stored output for key, or None; counts as a use by owner"""
+        now = time.time()
+        with self._lock:
+            db = self._index()
+            row = db.execute("SELECT name, filename, mime, size FROM refs WHERE key = ? AND expires > ? "
+                             "ORDER BY expires DESC LIMIT 1", (key, now)).fetchone()
+            if row is None or not self.backend.exists(row[0]):
+                CACHE_REQUESTS.inc(cache="artifacts", result="miss")
+                self._maybe_sweep(db, now)
+                return None
+            name, filename, mime, size = row
+            expires = self._reference(db, owner, key, name, filename, mime, size, now)
+            self._maybe_sweep(db, now)
+        CACHE_REQUESTS.inc(cache="artifacts", result="hit")
+        return self._artifact(key, name, filename, mime, size, expires, now)
+
+    def put(self, key, source_path, owner, filename, mime):
+        """Store the file at source_path as the output for key; None if it alone exceeds the quota"""
+        size = os.path.getsize(source_path)
+        if size > self.quota_bytes:
+            return None
+        name = file_digest(source_path) + os.path.splitext(filename)[1].lower()
+        now = time.time()
+        with self._lock:
+            db = self._index()
+            if db.execute("SELECT 1 FROM objects WHERE name = ?", (name,)).fetchone() is None \
+                    or not self.backend.exists(name):
+                self.backend.put(name, source_path, mime)
+                db.execute("INSERT OR REPLACE INTO objects VALUES (?, ?, ?)", (name, size, now))
+            expires = self._reference(db, owner, key, name, filename, mime, size, now)
+            self._maybe_sweep(db, now)
+        return self._artifact(key, name, filename, mime, size, expires, now)
+
+    def owned(self, owner):
+        """Owner's unexpired artifacts, most recently used first"""
+        now = time.time()
+        with self._lock:
+            rows = self._index().execute(
+                "SELECT key, name, filename, mime, size, expires FROM refs WHERE owner = ? AND expires > ? "
+                "ORDER BY used DESC", (owner, now)).fetchall()
+        return [self._artifact(key, name, filename, mime, size, expires, now)
+                for key, name, filename, mime, size, expires in rows]
+
+    def remove(self, key, owner):
+        """Drop owner's reference; the object goes at the next sweep if nobody else holds it"""
+        with self._lock:
+            self._index().execute("DELETE FROM refs WHERE owner = ? AND key = ?", (owner, key))
+
+    def _sweep(self, db, now):
+        self._last_sweep = now
+        db.execute("DELETE FROM refs WHERE expires <= ?", (now,))
+        orphans = db.execute("SELECT name FROM objects WHERE name NOT IN (SELECT name FROM refs)").fetchall()
+        for (name,) in orphans:
+            self.backend.delete(name)
+            db.execute("DELETE FROM objects WHERE name = ?", (name,))
+        STORE_BYTES.set(db.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0])
+
+    def _maybe_sweep(self, db, now):
+        # Reads sweep too, so a deployment that only serves saved files still frees disk
+        if now - self._last_sweep > self.SWEEP_SECONDS:
+            self._sweep(db, now)
+
+    def sweep(self):
+        """Delete expired references and the objects no reference points to"""
+        with self._lock:
+            self._sweep(self._index(), time.time())
+
+    def stats(self):
+        """Stored versus referenced bytes; the difference is what deduplication saved"""
+        now = time.time()
+        with self._lock:
+            db = self._index()
+            objects, stored = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects").fetchone()
+            refs, referenced = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM refs WHERE expires > ?",
+                                          (now,)).fetchone()
+        return {"objects": objects, "stored_bytes": stored, "references": refs, "referenced_bytes": referenced}
+
+
+def _remember_owner(owner, max_age):
+    # A first-party cookie, so the id survives a refresh without being part of the page URL
+    st.html(f"<script>document.cookie = '{OWNER_COOKIE}={owner}; path=/; max-age={int(max_age)}; "
+            f"SameSite=Strict';</script>", unsafe_allow_javascript=True)
+
+
+def artifact_owner(create=True):
+    """Owner id for quotas and the saved-files list
+
+    Kept in session state and a cookie, never in the URL, so sharing a page
+    link does not share the saved files. With create=False, returns None for
+    a visitor who has not stored anything yet.
+    """
+    if "files" in st.query_params:
+        # Links from before the id moved out of the URL
+        del st.query_params["files"]
+    owner = st.session_state.get("artifact_owner") or st.context.cookies.get(OWNER_COOKIE)
+    if not isinstance(owner, str) or not re.fullmatch(r"[0-9a-f]{32}", owner):
+        if not create:
+            return None
+        owner = uuid.uuid4().hex
+    if st.session_state.get("artifact_owner") != owner:
+        st.session_state.artifact_owner = owner
+        _remember_owner(owner, artifacts.ttl_seconds)
+    return owner
+
+
+artifacts = ArtifactStore()
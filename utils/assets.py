@@ -0,0 +1,86 @@
+
+import os
+import re
+import hashlib
+import threading
+
+import streamlit as st
+
+# Static assets published once per process. Files are copied into Streamlit's
+# app static folder under content-hashed names, so a URL never changes meaning
+# and browsers can keep it for good; a changed source file gets a new name.
+# Served at app/static/... when server.enableStaticServing is on
+# (.streamlit/config.toml).
+
+STATIC_DIR = "static"
+BUILD_DIR = os.path.join(STATIC_DIR, "build")
+# Relative to the page, so it also works under server.baseUrlPath
+STATIC_URL = "app/static/build"
+
+
+def content_hash(data, length=12):
+    return hashlib.sha256(data).hexdigest()[:length]
+
+
+def minify_css(css):
+    """Drop comments and collapse whitespace; the CSS is served as written otherwise"""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};:,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def static_serving_enabled():
+    try:
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:
+        return False
+
+
+class AssetPipeline:
+    """Publishes files and generated text under content-hashed static names"""
+
+    def __init__(self, build_dir=BUILD_DIR, url_prefix=STATIC_URL):
+        self.build_dir = build_dir
+        self.url_prefix = url_prefix
+        self._lock = threading.Lock()
+        # (source path, mtime, size) -> published name, so reruns only stat the source
+        self._published = {}
+
+    def _write(self, name, data):
+        target = os.path.join(self.build_dir, name)
+        if not os.path.exists(target):
+            os.makedirs(self.build_dir, exist_ok=True)
+            # Write then rename, so a concurrent reader never sees half a file
+            tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, target)
+        return name
+
+    def url(self, name):
+        return f"{self.url_prefix}/{name}"
+
+    def publish_file(self, path):
+        """Hashed name of a published copy of path"""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key not in self._published:
+                with open(path, "rb") as f:
+                    data = f.read()
+                stem, ext = os.path.splitext(os.path.basename(path))
+                self._published[key] = self._write(f"{stem}.{content_hash(data)}{ext}", data)
+            return self._published[key]
+
+    def publish_text(self, stem, ext, text):
+        """Hashed name of a published text asset such as a stylesheet"""
+        data = text.encode("utf-8")
+        key = (stem, ext, content_hash(data, 64))
+        with self._lock:
+            if key not in self._published:
+                self._published[key] = self._write(f"{stem}.{content_hash(data)}{ext}", data)
+            return self._published[key]
+
+
+assets = AssetPipeline()
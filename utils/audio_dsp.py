@@ -0,0 +1,505 @@
+
+import time
+import threading
+import subprocess
+
+import numpy as np
+from pydub import AudioSegment
+
+# Streaming signal processing on 16-bit PCM. Each stage takes fixed-size NumPy
+# blocks and keeps only the state it needs between them, so long recordings
+# and books are processed in constant memory. Nothing here touches Streamlit;
+# converters.py wires these stages into synthesis and transcription.
+
+
+class SilenceTrimmer:
+    """Shortens pauses longer than max_silence_ms, one fixed-size PCM block at a time"""
+
+    def __init__(self, sample_rate, max_silence_ms=350, threshold_db=-40, frame_ms=10):
+        self.frame_length = sample_rate * frame_ms // 1000
+        self.max_silent_frames = max_silence_ms // frame_ms
+        self.threshold = 32768 * 10 ** (threshold_db / 20)
+        self._silent_run = 0
+
+    def process(self, block):
+        """Return block with frames beyond the allowed pause length removed"""
+        frames = block.reshape(-1, self.frame_length)
+        rms = np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1))
+        silent = rms < self.threshold
+
+        # Length of the silent run ending at each frame, continuing the previous block's run
+        index = np.arange(len(frames))
+        last_loud = np.maximum.accumulate(np.where(silent, -1 - self._silent_run, index))
+        run_length = np.where(silent, index - last_loud, 0)
+        if len(frames):
+            self._silent_run = int(run_length[-1])
+
+        return frames[run_length <= self.max_silent_frames].reshape(-1)
+
+
+class TimeStretcher:
+    """Streaming WSOLA time-stretch: changes tempo without shifting pitch"""
+
+    def __init__(self, sample_rate, tempo, frame_ms=30):
+        self.frame_length = sample_rate * frame_ms // 1000 // 2 * 2
+        self.synthesis_hop = self.frame_length // 2
+        self.analysis_hop = self.synthesis_hop * tempo
+        self.tolerance = self.synthesis_hop // 2
+        # Periodic Hann at 50% overlap sums to one, so overlap-add keeps the level
+        n = np.arange(self.frame_length)
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * n / self.frame_length)).astype(np.float32)
+
+        self._buffer = np.zeros(self.tolerance, dtype=np.float32)
+        self._position = float(self.tolerance)
+        self._natural = None
+        self._overlap = np.zeros(self.frame_length, dtype=np.float32)
+
+    def _frames(self):
+        n, hop, tol = self.frame_length, self.synthesis_hop, self.tolerance
+        output = []
+
+        while int(round(self._position)) + tol + n + hop <= len(self._buffer):
+            start = int(round(self._position))
+            if self._natural is not None:
+                # Pick the offset whose frame best continues the previous one
+                region = self._buffer[start - tol:start + tol + n]
+                offset = int(np.argmax(np.correlate(region, self._natural, mode='valid'))) - tol
+                start += offset
+
+            self._overlap += self._buffer[start:start + n] * self.window
+            output.append(self._overlap[:hop].copy())
+            self._overlap = np.concatenate([self._overlap[hop:], np.zeros(hop, dtype=np.float32)])
+            self._natural = self._buffer[start + hop:start + hop + n]
+            self._position += self.analysis_hop
+
+        # Drop input that no future frame or search window can reach
+        keep_from = max(0, min(int(self._position) - tol, len(self._buffer)) - 1)
+        self._buffer = self._buffer[keep_from:]
+        self._position -= keep_from
+        if self._natural is not None:
+            self._natural = self._natural.copy()
+        return np.concatenate(output) if output else np.zeros(0, dtype=np.float32)
+
+    def process(self, block):
+        """Stretch one block; output lags input by about one frame"""
+        self._buffer = np.concatenate([self._buffer, block.astype(np.float32)])
+        return self._frames()
+
+    def flush(self):
+        """Emit the remaining audio at the end of the stream"""
+        padding = self.tolerance + self.frame_length + self.synthesis_hop
+        self._buffer = np.concatenate([self._buffer, np.zeros(padding, dtype=np.float32)])
+        tail = self._frames()
+        return np.concatenate([tail, self._overlap[:self.synthesis_hop]])
+
+
+class SpeechPostProcessor:
+    """Tempo change and pause trimming applied to a stream of 16-bit mono PCM blocks"""
+
+    SAMPLE_RATE = 24000
+    # 200 ms blocks: a whole number of 10 ms analysis frames
+    BLOCK_SAMPLES = 4800
+
+    def __init__(self, tempo=1.0, max_silence_ms=None, threshold_db=-40):
+        self.trimmer = None
+        self.stretcher = None
+        if max_silence_ms is not None:
+            self.trimmer = SilenceTrimmer(self.SAMPLE_RATE, max_silence_ms, threshold_db)
+        if abs(tempo - 1.0) > 0.01:
+            self.stretcher = TimeStretcher(self.SAMPLE_RATE, tempo)
+        self.samples_in = 0
+        self.samples_out = 0
+        self.seconds = 0.0
+
+    def _run(self, block):
+        if self.trimmer is not None:
+            block = self.trimmer.process(block)
+        if self.stretcher is not None:
+            block = self.stretcher.process(block)
+        return block
+
+    def _emit(self, block):
+        block = np.clip(block, -32768, 32767).astype(np.int16)
+        self.samples_out += len(block)
+        return block.tobytes()
+
+    def process(self, pcm_chunks):
+        """Yield processed PCM bytes for an iterable of raw s16le byte chunks"""
+        block_bytes = self.BLOCK_SAMPLES * 2
+        pending = b""
+
+        for chunk in pcm_chunks:
+            pending += chunk
+            usable = len(pending) // block_bytes * block_bytes
+            if not usable:
+                continue
+            started = time.perf_counter()
+            blocks = np.frombuffer(pending[:usable], dtype=np.int16)
+            pending = pending[usable:]
+            self.samples_in += len(blocks)
+            output = [self._run(block) for block in blocks.reshape(-1, self.BLOCK_SAMPLES)]
+            data = self._emit(np.concatenate(output))
+            self.seconds += time.perf_counter() - started
+            yield data
+
+        # Pad the final partial block with silence so it splits into whole frames
+        started = time.perf_counter()
+        tail = np.frombuffer(pending[:len(pending) // 2 * 2], dtype=np.int16)
+        self.samples_in += len(tail)
+        output = []
+        if len(tail):
+            frame = self.SAMPLE_RATE // 100
+            padded = np.zeros(-(-len(tail) // frame) * frame, dtype=np.int16)
+            padded[:len(tail)] = tail
+            output.append(self.trimmer.process(padded) if self.trimmer is not None else padded)
+        if self.stretcher is not None:
+            output = [self.stretcher.process(block) for block in output] + [self.stretcher.flush()]
+        self.seconds += time.perf_counter() - started
+        if output:
+            yield self._emit(np.concatenate(output))
+
+    def stats(self):
+        """Durations before/after processing and processing speed"""
+        input_seconds = self.samples_in / self.SAMPLE_RATE
+        return {
+            "input_seconds": input_seconds,
+            "output_seconds": self.samples_out / self.SAMPLE_RATE,
+            "dsp_seconds": self.seconds,
+            "realtime_factor": input_seconds / self.seconds if self.seconds else 0.0,
+        }
+
+
+def decode_to_pcm(chunks, sample_rate, read_size=64 * 1024):
+    """Decode a stream of compressed audio chunks to 16-bit mono PCM with ffmpeg"""
+    process = subprocess.Popen(
+        [AudioSegment.converter, "-hide_banner", "-loglevel", "error",
+         "-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    errors = []
+
+    def feed():
+        # Runs in its own thread so ffmpeg's stdout never backs up while we write
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        for data in iter(lambda: process.stdout.read(read_size), b""):
+            yield data
+    finally:
+        if process.poll() is None and errors:
+            process.kill()
+        feeder.join()
+        process.wait()
+    if errors:
+        raise errors[0]
+    if process.returncode != 0:
+        raise RuntimeError("ffmpeg could not decode the synthesized audio")
+
+
+def pcm_to_mono(data, sample_width, channels):
+    """Decode little-endian PCM bytes (8, 16, 24 or 32 bit) to mono int16 samples"""
+    if sample_width == 1:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128) << 8
+    elif sample_width == 2:
+        samples = np.frombuffer(data, dtype="<i2")
+    elif sample_width == 3:
+        raw = np.frombuffer(data[:len(data) // 3 * 3], dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        # The top byte carries the sign; keep the top 16 bits
+        samples = ((raw[:, 2] << 24 | raw[:, 1] << 16) >> 16).astype(np.int16)
+    elif sample_width == 4:
+        samples = (np.frombuffer(data, dtype="<i4") >> 16).astype(np.int16)
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+    if channels > 1:
+        samples = samples[:len(samples) // channels * channels].reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples
+
+
+class VoiceActivityDetector:
+    """Finds speech regions from per-frame energy and zero-crossing rate
+
+    Feed the whole recording block by block with observe(); regions() then sets
+    the noise floor once for the file (a low percentile of frame energy) and
+    marks frames clearly above it as speech. Quieter frames with a high
+    zero-crossing rate count too, so unvoiced consonants (s, f, t) are kept.
+    Only two small numbers per frame are kept, however long the recording.
+    """
+
+    def __init__(self, sample_rate, frame_ms=30, margin_db=10, noise_percentile=10,
+                 min_speech_ms=120, pad_ms=300, min_gap_ms=600, fricative_zcr=0.25):
+        self.sample_rate = sample_rate
+        self.frame_length = max(1, sample_rate * frame_ms // 1000)
+        self.margin_db = margin_db
+        self.noise_percentile = noise_percentile
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.pad_frames = pad_ms // frame_ms
+        self.min_gap_frames = min_gap_ms // frame_ms
+        self.fricative_zcr = fricative_zcr
+        self.samples = 0
+        self.noise_floor_db = None
+        self._energy = []
+        self._zcr = []
+        self._pending = np.zeros(0, dtype=np.int16)
+
+    def _analyze(self, samples):
+        frames = samples.reshape(-1, self.frame_length).astype(np.float32)
+        self._energy.append(10 * np.log10(np.mean(frames ** 2, axis=1) + 1.0))
+        signs = np.signbit(frames)
+        self._zcr.append(np.mean(signs[:, 1:] != signs[:, :-1], axis=1))
+
+    def observe(self, samples):
+        """Analyze the next block of mono int16 samples"""
+        self.samples += len(samples)
+        samples = np.concatenate([self._pending, samples])
+        usable = len(samples) // self.frame_length * self.frame_length
+        if usable:
+            self._analyze(samples[:usable])
+        self._pending = samples[usable:]
+
+    @staticmethod
+    def _runs(mask):
+        """(start, end) index pairs of the True runs in a boolean array"""
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], mask.astype(np.int8), [0]])))
+        return edges.reshape(-1, 2)
+
+    def speech_mask(self):
+        """Per-frame speech flags for everything observed so far"""
+        if len(self._pending):
+            # Pad the last partial frame with silence
+            tail = np.zeros(self.frame_length, dtype=np.int16)
+            tail[:len(self._pending)] = self._pending
+            self._analyze(tail)
+            self._pending = np.zeros(0, dtype=np.int16)
+        if not self._energy:
+            return np.zeros(0, dtype=bool)
+        energy = np.concatenate(self._energy)
+        zcr = np.concatenate(self._zcr)
+        self._energy, self._zcr = [energy], [zcr]
+
+        self.noise_floor_db = float(np.percentile(energy, self.noise_percentile))
+        if np.percentile(energy, 90) - self.noise_floor_db < self.margin_db:
+            # No quiet stretch to measure noise against: all speech, or all silence
+            loud = energy.max() > self.margin_db
+            return np.full(len(energy), loud)
+
+        speech = (energy > self.noise_floor_db + self.margin_db) | (
+            (energy > self.noise_floor_db + self.margin_db / 2) & (zcr > self.fricative_zcr))
+
+        # Drop clicks too short to be speech, then pad the rest so word edges survive
+        for start, end in self._runs(speech):
+            if end - start < self.min_speech_frames:
+                speech[start:end] = False
+        if self.pad_frames:
+            speech = np.convolve(speech, np.ones(2 * self.pad_frames + 1), mode="same") > 0
+
+        # Short pauses inside speech are kept, so words are not cut apart
+        for start, end in self._runs(~speech):
+            if 0 < start and end < len(speech) and end - start < self.min_gap_frames:
+                speech[start:end] = True
+        return speech
+
+    def regions(self):
+        """Speech regions as (start, end) sample offsets"""
+        return [(int(start) * self.frame_length, min(int(end) * self.frame_length, self.samples))
+                for start, end in self._runs(self.speech_mask())]
+
+
+class SpeakerSegmenter:
+    """Speaker turns from MFCC statistics of one-second windows, clustered bottom-up by BIC
+
+    Windows are analyzed in batches as blocks arrive (framing, FFT, mel
+    filterbank and DCT are each one array operation per batch); only each
+    window's frame count, sum and sum of outer products are kept. Once the whole
+    file is seen, short runs of speech windows start as one cluster each and the
+    pair whose frames are best explained by a single Gaussian is merged, until
+    every remaining merge makes the BIC worse.
+    """
+
+    # Frames within this much log mel energy of a window's loudest frame count as voiced
+    VOICED_RANGE = 3.0
+
+    def __init__(self, sample_rate, window_seconds=1.0, segment_windows=3, max_speakers=4,
+                 penalty=8.0, min_turn_windows=2, n_mels=26, n_mfcc=13):
+        self.sample_rate = sample_rate
+        self.window_length = int(sample_rate * window_seconds)
+        self.frame_length = sample_rate * 25 // 1000
+        self.hop = sample_rate * 10 // 1000
+        self.n_fft = 1 << (self.frame_length - 1).bit_length()
+        self.segment_windows = segment_windows
+        self.max_speakers = max_speakers
+        # Neighbouring 10 ms frames are far from independent, so the textbook BIC
+        # penalty (1.0) splits a single voice; 8 keeps one speaker together
+        self.penalty = penalty
+        self.min_turn_windows = min_turn_windows
+        self.speakers = 0
+        self._window = np.hamming(self.frame_length).astype(np.float32)
+        self._mel = self._mel_filterbank(sample_rate, self.n_fft, n_mels)
+        # DCT-II rows 1..n_mfcc-1; c0 is overall loudness, which says little about who is speaking
+        m = np.arange(n_mels)
+        self._dct = np.cos(np.pi / n_mels * (m + 0.5) * np.arange(1, n_mfcc)[:, None]).astype(np.float32)
+        self._stats = []
+        self._pending = np.zeros(0, dtype=np.int16)
+
+    @staticmethod
+    def _mel_filterbank(sample_rate, n_fft, n_mels, low_hz=60):
+        to_mel = lambda hz: 2595 * np.log10(1 + hz / 700)
+        to_hz = lambda mel: 700 * (10 ** (mel / 2595) - 1)
+        edges = to_hz(np.linspace(to_mel(low_hz), to_mel(sample_rate / 2), n_mels + 2))
+        bins = np.fft.rfftfreq(n_fft, 1 / sample_rate)
+        lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+        rising = (bins - lower) / (center - lower)
+        falling = (upper - bins) / (upper - center)
+        return np.maximum(0, np.minimum(rising, falling)).astype(np.float32)
+
+    def _analyze(self, windows):
+        """Frame count, sum and sum of outer products of the voiced MFCC frames of each window"""
+        frames = np.lib.stride_tricks.sliding_window_view(windows, self.frame_length, axis=1)[:, ::self.hop]
+        power = np.abs(np.fft.rfft(frames.astype(np.float32) * self._window, self.n_fft)) ** 2
+        mel = np.log(power @ self._mel.T + 1.0)
+        # Pauses and quiet tails only carry the room noise, so keep the frames near the window's peak
+        energy = mel.mean(axis=2)
+        voiced = energy >= energy.max(axis=1, keepdims=True) - self.VOICED_RANGE
+        mfcc = (mel @ self._dct.T) * voiced[..., None]
+        return (voiced.sum(axis=1).astype(np.float64), mfcc.sum(axis=1, dtype=np.float64),
+                np.einsum("wfi,wfj->wij", mfcc, mfcc, dtype=np.float64))
+
+    def observe(self, samples):
+        """Analyze the next block of mono int16 samples"""
+        samples = np.concatenate([self._pending, samples])
+        usable = len(samples) // self.window_length * self.window_length
+        if usable:
+            self._stats.append(self._analyze(samples[:usable].reshape(-1, self.window_length)))
+        self._pending = samples[usable:]
+
+    @staticmethod
+    def _logdet(counts, sums, outers):
+        """counts * log|covariance| for a batch of frame statistics"""
+        means = sums / counts[:, None]
+        covariance = outers / counts[:, None, None] - means[:, :, None] * means[:, None, :]
+        covariance = covariance + 1e-3 * np.eye(sums.shape[1])
+        return counts * np.linalg.slogdet(covariance)[1]
+
+    def _merge_costs(self, i, counts, sums, outers, logdets):
+        """BIC change from merging cluster i with each cluster; negative means one voice fits better"""
+        d = sums.shape[1]
+        merged = counts[i] + counts
+        joint = self._logdet(merged, sums[i] + sums, outers[i] + outers)
+        parameters = d + d * (d + 1) / 2
+        return 0.5 * (joint - logdets[i] - logdets) - self.penalty * 0.5 * parameters * np.log(merged)
+
+    def _cluster(self, counts, sums, outers):
+        """Agglomerative clustering of segments; returns a cluster index per segment"""
+        n = len(counts)
+        logdets = self._logdet(counts, sums, outers)
+        costs = np.stack([self._merge_costs(i, counts, sums, outers, logdets) for i in range(n)])
+        np.fill_diagonal(costs, np.inf)
+        owner = np.arange(n)
+        active = np.ones(n, dtype=bool)
+        # Keep merging while it helps, and in any case down to max_speakers
+        while active.sum() > 1:
+            i, j = np.unravel_index(np.argmin(costs), costs.shape)
+            if costs[i, j] >= 0 and active.sum() <= self.max_speakers:
+                break
+            counts[i] += counts[j]
+            sums[i] += sums[j]
+            outers[i] += outers[j]
+            logdets[i] = self._logdet(counts[i:i + 1], sums[i:i + 1], outers[i:i + 1])[0]
+            owner[owner == j] = i
+            active[j] = False
+            row = self._merge_costs(i, counts, sums, outers, logdets)
+            row[~active] = np.inf
+            row[i] = np.inf
+            costs[j, :] = costs[:, j] = np.inf
+            costs[i, :] = costs[:, i] = row
+        return owner
+
+    def _window_labels(self, regions):
+        """Speaker index per window, or -1 for windows that are mostly silence"""
+        if not self._stats:
+            return np.zeros(0, dtype=int)
+        counts, sums, outers = (np.concatenate(part) for part in zip(*self._stats))
+        labels = np.full(len(counts), -1)
+        if not regions:
+            return labels
+
+        starts = np.array([start for start, _ in regions])
+        ends = np.array([end for _, end in regions])
+        centers = np.arange(len(counts)) * self.window_length + self.window_length // 2
+        region = np.searchsorted(starts, centers, side="right") - 1
+        windows = np.flatnonzero((region >= 0) & (centers < ends[np.maximum(region, 0)]))
+        if len(windows) < 2 * self.min_turn_windows:
+            labels[windows] = 0
+            self.speakers = 1 if len(windows) else 0
+            return labels
+
+        # Initial segments: up to segment_windows consecutive speech windows each
+        segment, length, current = np.zeros(len(windows), dtype=int), 0, 0
+        for position in range(1, len(windows)):
+            length += 1
+            if windows[position] != windows[position - 1] + 1 or length == self.segment_windows:
+                current, length = current + 1, 0
+            segment[position] = current
+        n = current + 1
+        owner = self._cluster(np.bincount(segment, counts[windows], n),
+                              np.stack([np.bincount(segment, column, n) for column in sums[windows].T], axis=1),
+                              np.add.reduceat(outers[windows], np.flatnonzero(np.diff(segment, prepend=-1))))
+        best = owner[segment]
+
+        # Turns shorter than min_turn_windows join the turn before them
+        runs = np.flatnonzero(np.diff(best)) + 1
+        bounds = np.concatenate([[0], runs, [len(best)]])
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if start and end - start < self.min_turn_windows:
+                best[start:end] = best[start - 1]
+
+        # Number speakers in order of first appearance
+        order = {}
+        for label in best:
+            order.setdefault(int(label), len(order))
+        labels[windows] = [order[int(label)] for label in best]
+        self.speakers = len(order)
+        return labels
+
+    def turns(self, regions):
+        """Split (start, end) sample regions where the speaker changes; returns (start, end, speaker)"""
+        if len(self._pending):
+            # The last partial window counts if it holds at least half a window
+            if len(self._pending) * 2 >= self.window_length:
+                tail = np.zeros(self.window_length, dtype=np.int16)
+                tail[:len(self._pending)] = self._pending
+                self._stats.append(self._analyze(tail[None]))
+            self._pending = np.zeros(0, dtype=np.int16)
+        labels = self._window_labels(regions)
+        if not len(labels) or labels.max() < 0:
+            return [(start, end, 1) for start, end in regions]
+
+        # Silent windows inside speech regions take the nearest earlier label, or the next one
+        known = np.where(labels >= 0, np.arange(len(labels)), -1)
+        filled = labels[np.maximum.accumulate(known).clip(0)]
+        first = int(np.argmax(labels >= 0))
+        filled[:first] = labels[first]
+
+        turns = []
+        for start, end in regions:
+            first_window = min(start // self.window_length, len(filled) - 1)
+            last_window = min((end - 1) // self.window_length, len(filled) - 1)
+            speakers = filled[first_window:last_window + 1]
+            changes = np.flatnonzero(np.diff(speakers)) + 1
+            cut = start
+            for change in changes:
+                boundary = (first_window + int(change)) * self.window_length
+                turns.append((cut, boundary, int(speakers[change - 1]) + 1))
+                cut = boundary
+            turns.append((cut, end, int(speakers[-1]) + 1))
+        return turns
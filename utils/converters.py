@@ -1,18 +1,60 @@
 
 import io
 import os
+import re
+import base64
+import shutil
+import sys
+import json
+import math
+import hashlib
 import tempfile
+import time
+import subprocess
+import threading
+import unicodedata
+import uuid
+import wave
+import queue
+import functools
+import contextvars
+import numpy as np
 import PyPDF2
-from gtts import gTTS
+from gtts import gTTS, gTTSError
 import speech_recognition as sr
 import nltk
 import pdfplumber
 from fpdf import FPDF
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize, sent_tokenize
-from collections import Counter
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pydub import AudioSegment
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from utils.metrics import (observe_conversion, observe_stream, backend_call, payload_size,
+                           start_exporters_from_env, CACHE_REQUESTS)
+from utils.probe import probe_audio, plan_audio
+from utils.engines import engine_client, EngineError
+from utils.models import model_pool, ModelError
+from utils.document import Document, HEADING
+from utils.audio_dsp import (SpeechPostProcessor, decode_to_pcm, pcm_to_mono, VoiceActivityDetector,
+                             SpeakerSegmenter)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# The pooled engines build gTTS and Google speech requests with these libraries'
+# undocumented helpers. If an upgrade moves them, the engines fall back to the
+# public gTTS.write_to_fp / recognize_google calls (no pooling or retries).
+try:
+    from speech_recognition.recognizers import google as google_speech
+    google_speech.create_request_builder, google_speech.OutputParser, google_speech.ENDPOINT
+except (ImportError, AttributeError):
+    google_speech = None
+GTTS_INTERNALS = hasattr(gTTS, "get_bodies") and hasattr(gTTS, "GOOGLE_TTS_HEADERS")
 
 # Download required NLTK data
 try:
@@ -21,29 +63,1222 @@ try:
 except:
     pass
 
+# Expose metrics if METRICS_PORT / METRICS_FILE are configured
+start_exporters_from_env()
+
+# Persistent caches live outside temp/, whose per-job directories are removed after every run
+CACHE_DIR = "cache"
+
+def file_fingerprint(file_path, chunk_size=1024 * 1024):
+    """Return a SHA-1 hex digest of a file, read in chunks"""
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Tracing: nested per-stage timings for one conversion. Stages call trace()
+# or use @traced; with no active Tracer both reduce to a context-variable lookup.
+_active_tracer = contextvars.ContextVar("active_tracer", default=None)
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+class _NullSpan:
+    """Shared do-nothing span used while tracing is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_bytes(self, bytes_in=0, bytes_out=0):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed stage: wall time, thread CPU time, bytes in/out and peak RSS"""
+
+    def __init__(self, tracer, name, bytes_in=0):
+        self.tracer = tracer
+        self.name = name
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+        self.depth = 0
+        self.parent = None
+        self.wall_ms = None
+        self.cpu_ms = None
+        self.peak_rss_mb = None
+        self.error = None
+
+    def add_bytes(self, bytes_in=0, bytes_out=0):
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+
+    def __enter__(self):
+        stack = self.tracer._stack
+        self.depth = len(stack)
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.tracer.spans.append(self)
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall_ms = (time.perf_counter() - self._wall) * 1000
+        self.cpu_ms = (time.thread_time() - self._cpu) * 1000
+        self.peak_rss_mb = _peak_rss_mb()
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        self.tracer._stack.pop()
+        return False
+
+    def to_dict(self):
+        return {
+            "stage": self.name,
+            "parent": self.parent,
+            "depth": self.depth,
+            "wall_ms": round(self.wall_ms or 0.0, 2),
+            "cpu_ms": round(self.cpu_ms or 0.0, 2),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "peak_rss_mb": round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+            "error": self.error,
+        }
+
+
+class Tracer:
+    """Collects the spans of one conversion and exports them as JSON lines"""
+
+    LOG_PATH = os.environ.get("TRACE_LOG", os.path.join("logs", "trace.jsonl"))
+
+    def __init__(self, name):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.spans = []
+        self._stack = []
+        self._root = None
+        self._token = None
+
+    def span(self, name, bytes_in=0):
+        return Span(self, name, bytes_in)
+
+    def start(self):
+        """Make this the active tracer for the current thread and open the root span"""
+        self._token = _active_tracer.set(self)
+        self._root = self.span(self.name).__enter__()
+        return self
+
+    def finish(self, export=True):
+        """Close the root span, deactivate the tracer and append it to the JSON-lines log"""
+        if self._root is not None:
+            # Spans left open by an exception inside the conversion
+            while self._stack and self._stack[-1] is not self._root:
+                self._stack[-1].__exit__(None, None, None)
+            self._root.__exit__(None, None, None)
+            self._root = None
+        if self._token is not None:
+            _active_tracer.reset(self._token)
+            self._token = None
+        if export:
+            try:
+                self.export_jsonl(self.LOG_PATH)
+            except OSError:
+                pass
+
+    def rows(self):
+        return [span.to_dict() for span in self.spans]
+
+    def export_jsonl(self, path):
+        """Append one JSON object per span to path"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            for row in self.rows():
+                row["trace_id"] = self.trace_id
+                row["trace"] = self.name
+                f.write(json.dumps(row) + "\n")
+
+
+def trace(name, bytes_in=0):
+    """Open a span under the active tracer; a shared no-op when tracing is off"""
+    tracer = _active_tracer.get()
+    if tracer is None:
+        return _NULL_SPAN
+    return Span(tracer, name, bytes_in)
+
+
+def traced(name):
+    """Decorator recording a function call as a span, sizing its first argument and result"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = _active_tracer.get()
+            if tracer is None:
+                return func(*args, **kwargs)
+            with Span(tracer, name, payload_size(args[0]) if args else 0) as span:
+                result = func(*args, **kwargs)
+                span.add_bytes(bytes_out=payload_size(result))
+                return result
+        return wrapper
+    return decorator
+
+
+# Progress: converters call report_progress() as work completes; with no
+# active Progress it is a context-variable lookup, like trace().
+_active_progress = contextvars.ContextVar("active_progress", default=None)
+
+
+class Progress:
+    """Combines per-stage progress into one fraction and ETA, and forwards it at a throttled rate
+
+    callback(fraction, message) is called at most every min_interval seconds,
+    so a UI update never runs once per sentence or page.
+    """
+
+    LABELS = {
+        "extract": "📝 Extracting text",
+        "synthesize": "🔊 Synthesizing speech",
+        "transcribe": "🎧 Transcribing audio",
+        "summarize": "📋 Summarizing",
+        "write": "💾 Writing file",
+    }
+
+    def __init__(self, callback, stages, min_interval=0.3):
+        self.callback = callback
+        total_weight = sum(stages.values())
+        self.weights = {stage: weight / total_weight for stage, weight in stages.items()}
+        self.min_interval = min_interval
+        self.done = {stage: 0.0 for stage in stages}
+        self._started = None
+        self._last_update = 0.0
+        self._token = None
+
+    def start(self):
+        """Make this the active progress for the current thread"""
+        self._started = time.monotonic()
+        self._token = _active_progress.set(self)
+        return self
+
+    def finish(self):
+        if self._token is not None:
+            _active_progress.reset(self._token)
+            self._token = None
+
+    def fraction(self):
+        return sum(self.weights[stage] * done for stage, done in self.done.items())
+
+    def eta(self, fraction):
+        """Seconds left, extrapolated from the time taken so far"""
+        elapsed = time.monotonic() - self._started
+        if fraction < 0.02 or elapsed < 1:
+            return None
+        return elapsed * (1 - fraction) / fraction
+
+    def update(self, stage, done, total=None, unit=""):
+        finished = False
+        if total:
+            # Never move backwards, e.g. when a second pass re-reads cached pages
+            previous = self.done.get(stage, 0.0)
+            self.done[stage] = max(previous, min(1.0, done / total))
+            finished = self.done[stage] >= 1.0 > previous
+        now = time.monotonic()
+        if now - self._last_update < self.min_interval and not finished:
+            return
+        self._last_update = now
+
+        fraction = self.fraction()
+        label = self.LABELS.get(stage, stage)
+        count = f"{done:,.0f}/{total:,.0f} {unit}" if total else f"{done:,.0f} {unit}"
+        message = f"{label}: {count.strip()}"
+        remaining = self.eta(fraction)
+        if remaining is not None:
+            message += f" · about {remaining / 60:.0f} min left" if remaining >= 90 else f" · about {remaining:.0f} s left"
+        self.callback(fraction, message)
+
+
+def report_progress(stage, done, total=None, unit=""):
+    """Report work done in a stage to the active Progress, if any"""
+    progress = _active_progress.get()
+    if progress is not None:
+        progress.update(stage, done, total, unit)
+
+
+_DONE = object()
+
+
+class PipelineCancelled(Exception):
+    """Raised inside a stage when another stage failed or the consumer stopped reading"""
+
+
+class Pipeline:
+    """Chains generator stages, each in its own thread, connected by bounded queues
+
+    A stage is func(items): it takes an iterator over the previous stage's
+    output (the source, for the first stage) and yields its own items. Every
+    stage starts at once and works on an item as soon as it arrives, so the
+    last stage produces output long before the first one finishes; a full
+    queue makes the stage feeding it wait, so memory stays bounded by
+    queue_size items per stage. An exception in any stage stops the others
+    and is raised from run().
+    """
+
+    QUEUE_SIZE = 16
+
+    def __init__(self, name, queue_size=None):
+        self.name = name
+        self.queue_size = queue_size or Pipeline.QUEUE_SIZE
+        self.stages = []
+        self.stats = {}
+
+    def stage(self, name, func):
+        """Append a stage; returns the pipeline so calls can be chained"""
+        self.stages.append((name, func))
+        return self
+
+    @staticmethod
+    def _items(q, stop, waited):
+        while True:
+            started = time.perf_counter()
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                waited[0] += time.perf_counter() - started
+                if stop.is_set():
+                    raise PipelineCancelled()
+                continue
+            waited[0] += time.perf_counter() - started
+            if item is _DONE:
+                return
+            yield item
+
+    @staticmethod
+    def _put(q, item, stop):
+        """Block until q has room; False once the pipeline is stopping"""
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run_stage(self, name, func, items, out, stop, errors, waited, started):
+        # Spans share one stack per tracer, so stage threads don't trace; progress still flows
+        _active_tracer.set(None)
+        stats = self.stats[name] = {"items": 0, "first_item_s": None, "finished_s": None,
+                                    "input_wait_s": 0.0, "output_wait_s": 0.0}
+        try:
+            outputs = func(items)
+            for item in outputs:
+                if stats["first_item_s"] is None:
+                    stats["first_item_s"] = time.perf_counter() - started
+                stats["items"] += 1
+                put_started = time.perf_counter()
+                delivered = self._put(out, item, stop)
+                stats["output_wait_s"] += time.perf_counter() - put_started
+                if not delivered:
+                    if hasattr(outputs, "close"):
+                        outputs.close()
+                    return
+            self._put(out, _DONE, stop)
+        except PipelineCancelled:
+            pass
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            stats["finished_s"] = time.perf_counter() - started
+            stats["input_wait_s"] = waited[0]
+
+    def run(self, source):
+        """Yield the last stage's items; closing the generator early stops every stage"""
+        stop = threading.Event()
+        errors = []
+        started = time.perf_counter()
+        script_context = get_script_run_ctx(suppress_warning=True)
+        threads = []
+        items = iter(source)
+        waited = [0.0]
+
+        for name, func in self.stages:
+            out = queue.Queue(self.queue_size)
+            # Each thread needs its own copy of the context (active Progress etc.)
+            context = contextvars.copy_context()
+            thread = threading.Thread(
+                target=context.run, args=(self._run_stage, name, func, items, out, stop, errors, waited, started),
+                name=f"{self.name}-{name}", daemon=True
+            )
+            # Lets stages update Streamlit elements, e.g. the progress bar
+            add_script_run_ctx(thread, script_context)
+            threads.append(thread)
+            waited = [0.0]
+            items = self._items(out, stop, waited)
+
+        for thread in threads:
+            thread.start()
+        try:
+            yield from items
+        except PipelineCancelled:
+            pass
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
+
+
+class SynthesisCache:
+    """Bounded on-disk cache of synthesized sentence audio with LRU eviction"""
+
+    def __init__(self, directory=os.path.join(CACHE_DIR, "tts"),
+                 max_bytes=int(os.environ.get("TTS_CACHE_MAX_MB", 256)) * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._entries = None
+        self._total_bytes = 0
+
+    @staticmethod
+    def normalize(sentence):
+        """Collapse whitespace so trivially different copies share one entry"""
+        return " ".join(unicodedata.normalize("NFC", sentence).split())
+
+    @staticmethod
+    def make_key(sentence, engine, voice, lang):
+        """Cache key for one sentence rendered by one engine/voice/language"""
+        raw = "\x1f".join([engine, voice, lang, SynthesisCache.normalize(sentence)])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _load_entries(self):
+        """Index existing cache files, least recently used first"""
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".mp3"):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name[:-4], stat.st_size))
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(files))
+        self._total_bytes = sum(self._entries.values())
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def get(self, key):
+        """Return cached audio bytes for key, or None on a miss"""
+        with self._lock:
+            if self._entries is None:
+                self._load_entries()
+            if key not in self._entries:
+                self.misses += 1
+                CACHE_REQUESTS.inc(cache="tts", result="miss")
+                return None
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+                os.utime(self._path(key))
+            except FileNotFoundError:
+                # Evicted by another process sharing the directory
+                self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                CACHE_REQUESTS.inc(cache="tts", result="miss")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache="tts", result="hit")
+            self.bytes_saved += len(data)
+            return data
+
+    def put(self, key, data):
+        """Store audio bytes for key and evict least recently used entries over the limit"""
+        with self._lock:
+            if self._entries is None:
+                self._load_entries()
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._total_bytes -= size
+                try:
+                    os.remove(self._path(old_key))
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        """Lifetime hit/miss counters for this process"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "cache_bytes": self._total_bytes,
+        }
+
+
+# Languages offered for speech: gTTS code -> (display name, NLTK corpus name)
+TTS_LANGUAGES = {
+    'en': ("English", 'english'),
+    'es': ("Spanish", 'spanish'),
+    'fr': ("French", 'french'),
+    'de': ("German", 'german'),
+    'it': ("Italian", 'italian'),
+    'pt': ("Portuguese", 'portuguese'),
+    'nl': ("Dutch", 'dutch'),
+    'sv': ("Swedish", 'swedish'),
+    'da': ("Danish", 'danish'),
+    'ru': ("Russian", 'russian'),
+}
+
+# gTTS voices are regional Google domains, which change the accent
+TTS_VOICES = {
+    "Default": 'com',
+    "British": 'co.uk',
+    "Australian": 'com.au',
+    "Indian": 'co.in',
+    "Canadian": 'ca',
+    "Irish": 'ie',
+    "South African": 'co.za',
+}
+
+
+_STOPWORD_SETS = {}
+
+def _stopword_sets(corpus_name):
+    if corpus_name not in _STOPWORD_SETS:
+        try:
+            _STOPWORD_SETS[corpus_name] = set(stopwords.words(corpus_name))
+        except Exception:
+            _STOPWORD_SETS[corpus_name] = set()
+    return _STOPWORD_SETS[corpus_name]
+
+
+def detect_language(text, default='en'):
+    """Guess the language of a paragraph from its stopword overlap"""
+    words = set(word.lower() for word in text.split() if word.isalpha())
+    best_lang, best_hits = default, 0
+    for lang, (_, corpus_name) in TTS_LANGUAGES.items():
+        hits = len(words & _stopword_sets(corpus_name))
+        if hits > best_hits:
+            best_lang, best_hits = lang, hits
+    # Too few stopwords to tell, e.g. a heading or a list of names
+    return best_lang if best_hits >= 2 else default
+
+
+class GTTSEngine:
+    """Google Text-to-Speech engine bound to one language and voice"""
+
+    name = "gtts"
+    # Overridable to go through a proxy or a local stub server; {tld} is the voice
+    URL = os.environ.get("GTTS_URL", "https://translate.google.{tld}/_/TranslateWebserverUi/data/batchexecute")
+
+    def __init__(self, lang, voice):
+        self.lang = lang
+        self.voice = voice
+        # Validate the language once so per-sentence calls can skip the check
+        gTTS(text="warm up", lang=lang, tld=voice, lang_check=True)
+
+    @staticmethod
+    def parse_audio(response):
+        """MP3 bytes from a batchexecute response"""
+        for line in response.decode("utf-8").splitlines():
+            if "jQ1olc" in line:
+                match = re.search(r'jQ1olc","\[\\"(.*)\\"]', line)
+                if match:
+                    return base64.b64decode(match.group(1))
+        raise EngineError("gtts response has no audio")
+
+    def synthesize(self, text):
+        """Return MP3 bytes for text"""
+        tts = gTTS(text=text, lang=self.lang, tld=self.voice, lang_check=False)
+        if not GTTS_INTERNALS:
+            buffer = io.BytesIO()
+            try:
+                with backend_call("gtts"):
+                    tts.write_to_fp(buffer)
+            except gTTSError as e:
+                raise EngineError(f"gtts failed: {e}")
+            return buffer.getvalue()
+        url = GTTSEngine.URL.format(tld=self.voice)
+        # gTTS splits long text into several requests; the MP3 parts simply concatenate
+        return b"".join(
+            GTTSEngine.parse_audio(engine_client.post("gtts", url, body.encode("utf-8"), gTTS.GOOGLE_TTS_HEADERS))
+            for body in tts.get_bodies()
+        )
+
+
+class FallbackAudio(bytes):
+    """Audio from the local fallback engine; not cached under the primary engine's key"""
+
+
+class EspeakEngine:
+    """Local eSpeak NG engine, used when the network engine is unavailable"""
+
+    name = "espeak"
+
+    def __init__(self, lang, voice):
+        self.lang = lang
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+        if self.binary is None:
+            raise RuntimeError("espeak is not installed")
+
+    def synthesize(self, text):
+        """Return MP3 bytes for text, encoded like gTTS output so fragments concatenate"""
+        with backend_call("espeak"):
+            wav = subprocess.run([self.binary, "-v", self.lang, "--stdout", text],
+                                 check=True, capture_output=True).stdout
+            return subprocess.run(
+                [AudioSegment.converter, "-hide_banner", "-loglevel", "error", "-f", "wav", "-i", "pipe:0",
+                 "-ac", "1", "-ar", "24000", "-b:a", "32k", "-f", "mp3", "pipe:1"],
+                input=wav, check=True, capture_output=True
+            ).stdout
+
+
+TTS_ENGINES = {"gtts": GTTSEngine, "espeak": EspeakEngine}
+# Used for a sentence when the primary engine fails after retries or its circuit is open
+TTS_FALLBACK_ENGINE = os.environ.get("TTS_FALLBACK_ENGINE", "")
+
+
+class SynthesisWorkers:
+    """Per-language thread pools whose threads keep engine handles warm"""
+
+    def __init__(self, workers_per_language=int(os.environ.get("TTS_WORKERS_PER_LANGUAGE", 4))):
+        self.workers_per_language = workers_per_language
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _pool(self, lang):
+        with self._lock:
+            if lang not in self._pools:
+                self._pools[lang] = ThreadPoolExecutor(
+                    max_workers=self.workers_per_language,
+                    thread_name_prefix=f"tts-{lang}"
+                )
+            return self._pools[lang]
+
+    def _engine(self, engine_name, lang, voice):
+        engines = getattr(self._local, "engines", None)
+        if engines is None:
+            engines = self._local.engines = {}
+        key = (engine_name, lang, voice)
+        if key not in engines:
+            engines[key] = TTS_ENGINES[engine_name](lang, voice)
+        return engines[key]
+
+    def _synthesize(self, engine_name, lang, voice, text):
+        try:
+            return self._engine(engine_name, lang, voice).synthesize(text)
+        except EngineError:
+            if not TTS_FALLBACK_ENGINE or TTS_FALLBACK_ENGINE == engine_name:
+                raise
+            engine_client.record_fallback(engine_name)
+            return FallbackAudio(self._engine(TTS_FALLBACK_ENGINE, lang, voice).synthesize(text))
+
+    def submit(self, engine_name, lang, voice, text):
+        """Queue text on its language's pool and return a future of the audio bytes"""
+        return self._pool(lang).submit(self._synthesize, engine_name, lang, voice, text)
+
+
+class SpeechSynthesizer:
+    """Sentence-granular speech synthesis assembled from cached and fresh fragments"""
+
+    ENGINE = "gtts"
+    MAX_IN_FLIGHT = 32
+    # Approximate speaking rate of the engine at normal speed
+    BASE_WPM = 150
+    cache = SynthesisCache()
+    workers = SynthesisWorkers()
+
+    @staticmethod
+    def split_sentences(text, lang='en'):
+        """Split text into sentences, skipping fragments with nothing to speak"""
+        corpus_name = TTS_LANGUAGES.get(lang, (None, 'english'))[1]
+        try:
+            sentences = sent_tokenize(text, language=corpus_name)
+        except LookupError:
+            sentences = sent_tokenize(text)
+        return [s for s in sentences if any(ch.isalnum() for ch in s)]
+
+    @staticmethod
+    def reuses_sentences(document, lang):
+        """Whether a Document's sentences were split for lang and can be spoken as they are"""
+        return (isinstance(document, Document) and lang != 'auto'
+                and TTS_LANGUAGES.get(lang, (None, 'english'))[1] == document.language)
+
+    @staticmethod
+    def plan(text, lang='en'):
+        """Yield (language, sentence) pairs; lang='auto' detects the language per paragraph
+
+        text may also be an iterable of chunks (e.g. PDF pages) so it is never held whole,
+        or a Document, whose sentences are used as split unless the language differs.
+        """
+        if SpeechSynthesizer.reuses_sentences(text, lang):
+            for sentence in text.sentences():
+                yield lang, sentence
+            return
+        chunks = [text] if isinstance(text, str) else text.pages() if isinstance(text, Document) else text
+        current = 'en'
+
+        for chunk in chunks:
+            if lang != 'auto':
+                for sentence in SpeechSynthesizer.split_sentences(chunk, lang):
+                    yield lang, sentence
+                continue
+
+            for paragraph in chunk.split("\n\n"):
+                if not paragraph.strip():
+                    continue
+                current = detect_language(paragraph, default=current)
+                for sentence in SpeechSynthesizer.split_sentences(paragraph, current):
+                    yield current, sentence
+
+    @staticmethod
+    def iter_audio(text, lang='en', voice='com', stats=None):
+        """Yield MP3 fragments for text in document order, reusing cached sentence audio"""
+        cache = SpeechSynthesizer.cache
+        workers = SpeechSynthesizer.workers
+        engine = SpeechSynthesizer.ENGINE
+        run = {"sentences": 0, "hits": 0, "bytes_saved": 0, "languages": Counter()}
+        pending = deque()
+
+        def release(limit):
+            # Release fragments in order as soon as the oldest one is done
+            while pending and (len(pending) > limit or pending[0][1].done()):
+                key, future, cached = pending.popleft()
+                data = future.result()
+                if not cached and not isinstance(data, FallbackAudio):
+                    cache.put(key, data)
+                yield data
+
+        planned = SpeechSynthesizer.plan(text, lang)
+        total = None
+        if SpeechSynthesizer.reuses_sentences(text, lang):
+            total = text.num_sentences
+        elif isinstance(text, (str, Document)) and _active_progress.get() is not None:
+            # Splitting is cheap next to synthesis and gives the progress bar a total
+            planned = list(planned)
+            total = len(planned)
+        produced = [0]
+
+        def ready(limit):
+            for data in release(limit):
+                produced[0] += 1
+                report_progress("synthesize", produced[0], total, "sentences")
+                yield data
+
+        for sentence_lang, sentence in planned:
+            sentence = SynthesisCache.normalize(sentence)
+            key = cache.make_key(sentence, engine, voice, sentence_lang)
+            run["sentences"] += 1
+            run["languages"][sentence_lang] += 1
+
+            data = cache.get(key)
+            if data is not None:
+                run["hits"] += 1
+                run["bytes_saved"] += len(data)
+                future = Future()
+                future.set_result(data)
+            else:
+                future = workers.submit(engine, sentence_lang, voice, sentence)
+            pending.append((key, future, data is not None))
+            yield from ready(SpeechSynthesizer.MAX_IN_FLIGHT)
+
+        yield from ready(0)
+
+        if stats is not None:
+            stats.update(run)
+            stats["hit_ratio"] = run["hits"] / run["sentences"] if run["sentences"] else 0.0
+
+    @staticmethod
+    def synthesize(text, output_path, lang='en', voice='com', encoding=None,
+                   tempo=1.0, max_silence_ms=None, stats=None):
+        """Write speech for text to output_path, optionally re-encoded with an AUDIO_FORMATS entry
+
+        tempo speeds speech up or down without changing pitch, and max_silence_ms
+        shortens longer pauses; both run as a streaming stage before encoding.
+        """
+        fragments = SpeechSynthesizer.iter_audio(text, lang=lang, voice=voice, stats=stats)
+        return SpeechSynthesizer.write_audio(fragments, output_path, encoding=encoding, tempo=tempo,
+                                             max_silence_ms=max_silence_ms, stats=stats)
+
+    @staticmethod
+    def write_audio(fragments, output_path, encoding=None, tempo=1.0, max_silence_ms=None, stats=None):
+        """Write MP3 fragments from iter_audio to output_path, post-processed and encoded as for synthesize"""
+        postprocessor = None
+        if abs(tempo - 1.0) > 0.01 or max_silence_ms is not None:
+            postprocessor = SpeechPostProcessor(tempo=tempo, max_silence_ms=max_silence_ms)
+
+        if encoding is None and postprocessor is None:
+            # MP3 frames are self-contained, so fragments can be appended back to back
+            with open(output_path, "wb") as out:
+                for data in fragments:
+                    out.write(data)
+            report_progress("write", 1, 1, "file")
+            return output_path
+
+        compressed_bytes = [0]
+
+        def counted(chunks):
+            for data in chunks:
+                compressed_bytes[0] += len(data)
+                yield data
+
+        if postprocessor is None:
+            encoder = AudioEncoder(output_path, encoding)
+            chunks = counted(fragments)
+        else:
+            sample_rate = SpeechPostProcessor.SAMPLE_RATE
+            encoder = AudioEncoder(
+                output_path, encoding or SPEECH_MP3,
+                input_args=("-f", "s16le", "-ar", str(sample_rate), "-ac", "1")
+            )
+            chunks = postprocessor.process(decode_to_pcm(counted(fragments), sample_rate))
+
+        try:
+            for data in chunks:
+                encoder.write(data)
+        finally:
+            with trace("tts.encode_finish"):
+                encode_stats = encoder.close()
+        report_progress("write", 1, 1, "file")
+
+        # Compare against what the engine produced, not the intermediate PCM
+        encode_stats["bytes_in"] = compressed_bytes[0]
+        if encode_stats["bytes_out"]:
+            encode_stats["compression_ratio"] = compressed_bytes[0] / encode_stats["bytes_out"]
+        if stats is not None:
+            stats["encoding"] = encode_stats
+            if postprocessor is not None:
+                stats["postprocess"] = postprocessor.stats()
+        return output_path
+
+
+# Output codecs for synthesized speech. None keeps the engine's MP3 untouched.
+AUDIO_FORMATS = {
+    "MP3 (original)": None,
+    "MP3 24 kbps mono (16 kHz)": {
+        "ext": "mp3", "mime": "audio/mpeg", "sample_rate": 16000,
+        "args": ["-c:a", "libmp3lame", "-b:a", "24k"],
+    },
+    "Opus 24 kbps mono": {
+        "ext": "ogg", "mime": "audio/ogg", "sample_rate": 24000,
+        "args": ["-c:a", "libopus", "-b:a", "24k", "-vbr", "constrained", "-application", "voip"],
+    },
+    "Opus 16 kbps mono (16 kHz)": {
+        "ext": "ogg", "mime": "audio/ogg", "sample_rate": 16000,
+        "args": ["-c:a", "libopus", "-b:a", "16k", "-vbr", "constrained", "-application", "voip"],
+    },
+    "AAC 24 kbps mono": {
+        "ext": "m4a", "mime": "audio/mp4", "sample_rate": 22050,
+        "args": ["-c:a", "aac", "-b:a", "24k"],
+    },
+}
+
+
+# Re-encoding target when speech is post-processed but no format was chosen
+SPEECH_MP3 = {
+    "ext": "mp3", "mime": "audio/mpeg", "sample_rate": 24000,
+    "args": ["-c:a", "libmp3lame", "-b:a", "32k"],
+}
+
+
+class AudioEncoder:
+    """Streams audio chunks through an ffmpeg process into a compact speech codec"""
+
+    def __init__(self, output_path, encoding, input_args=("-f", "mp3")):
+        self.output_path = output_path
+        self.bytes_in = 0
+        self._started = time.perf_counter()
+        self._stderr = tempfile.TemporaryFile()
+        progress_fd, self._progress_path = tempfile.mkstemp(suffix=".progress")
+        os.close(progress_fd)
+
+        command = [
+            AudioSegment.converter, "-hide_banner", "-loglevel", "error", "-y",
+            *input_args, "-i", "pipe:0",
+            "-ac", "1", "-ar", str(encoding["sample_rate"]), *encoding["args"],
+            "-progress", self._progress_path,
+            output_path,
+        ]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self._stderr)
+
+    def write(self, data):
+        """Feed one chunk to the encoder; blocks only while ffmpeg's pipe is full"""
+        self.process.stdin.write(data)
+        self.bytes_in += len(data)
+
+    def _wait(self):
+        # wait4 also reports the child's CPU time, which is the real encode cost
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(self.process.pid, 0)
+            self.process.returncode = os.waitstatus_to_exitcode(status)
+            return usage.ru_utime + usage.ru_stime
+        self.process.wait()
+        return None
+
+    def _audio_seconds(self):
+        seconds = 0.0
+        with open(self._progress_path, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("out_time_us="):
+                    try:
+                        seconds = int(line.split("=", 1)[1]) / 1e6
+                    except ValueError:
+                        pass
+        return seconds
+
+    def close(self):
+        """Finish encoding and return size, compression and speed statistics"""
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        cpu_seconds = self._wait()
+        wall_seconds = time.perf_counter() - self._started
+
+        try:
+            if self.process.returncode != 0:
+                self._stderr.seek(0)
+                raise RuntimeError(f"ffmpeg failed: {self._stderr.read().decode(errors='replace').strip()}")
+
+            audio_seconds = self._audio_seconds()
+            bytes_out = os.path.getsize(self.output_path)
+            encode_seconds = cpu_seconds if cpu_seconds else wall_seconds
+            return {
+                "bytes_in": self.bytes_in,
+                "bytes_out": bytes_out,
+                "compression_ratio": self.bytes_in / bytes_out if bytes_out else 0.0,
+                "audio_seconds": audio_seconds,
+                "encode_seconds": encode_seconds,
+                "realtime_factor": audio_seconds / encode_seconds if encode_seconds else 0.0,
+            }
+        finally:
+            self._stderr.close()
+            os.remove(self._progress_path)
+
+
+class PageTextCache:
+    """Extracted text stored per PDF page, so later page selections reuse earlier extraction"""
+
+    def __init__(self, directory=os.path.join(CACHE_DIR, "pages"),
+                 max_documents=int(os.environ.get("PAGE_CACHE_MAX_DOCUMENTS", 200))):
+        self.directory = directory
+        self.max_documents = max_documents
+
+    def _path(self, key, extractor, page):
+        return os.path.join(self.directory, key, f"{extractor}-{page}.txt")
+
+    def get(self, key, extractor, page):
+        """Return the cached text of one page, or None on a miss"""
+        try:
+            with open(self._path(key, extractor, page), "r", encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            CACHE_REQUESTS.inc(cache="page_text", result="miss")
+            return None
+        CACHE_REQUESTS.inc(cache="page_text", result="hit")
+        return text
+
+    def put(self, key, extractor, page, text):
+        document_dir = os.path.join(self.directory, key)
+        if not os.path.isdir(document_dir):
+            os.makedirs(document_dir, exist_ok=True)
+            self._evict()
+        path = self._path(key, extractor, page)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+        os.utime(document_dir)
+
+    def _evict(self):
+        """Drop the least recently written documents beyond max_documents"""
+        documents = sorted(
+            (entry.stat().st_mtime, entry.path) for entry in os.scandir(self.directory) if entry.is_dir()
+        )
+        for _, path in documents[:max(0, len(documents) - self.max_documents)]:
+            for name in os.listdir(path):
+                try:
+                    os.remove(os.path.join(path, name))
+                except FileNotFoundError:
+                    pass
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+
+
+page_cache = PageTextCache()
+
+
+def iter_page_texts(pdf_file, pages=None, extractor="pypdf2", key=None):
+    """Yield the text of the selected pages (0-based; all by default)
+
+    The document is only opened, and pages only parsed, for cache misses, so
+    the cost follows the pages selected rather than the size of the PDF.
+    """
+    key = key or file_fingerprint(pdf_file)
+    reader = None
+    plumber = None
+    try:
+        if pages is None:
+            reader = PyPDF2.PdfReader(pdf_file)
+            pages = range(len(reader.pages))
+
+        total = len(pages)
+        for done, index in enumerate(pages, 1):
+            text = page_cache.get(key, extractor, index)
+            if text is None:
+                with trace("pdf.extract_page") as span:
+                    if extractor == "pdfplumber":
+                        if plumber is None:
+                            plumber = pdfplumber.open(pdf_file)
+                        page = plumber.pages[index]
+                        text = page.extract_text() or ""
+                        # Drop the page's parsed layout; pdfplumber keeps it otherwise
+                        page.close()
+                    else:
+                        if reader is None:
+                            reader = PyPDF2.PdfReader(pdf_file)
+                        text = reader.pages[index].extract_text() or ""
+                    span.add_bytes(bytes_out=len(text))
+                page_cache.put(key, extractor, index, text)
+            report_progress("extract", done, total, "pages")
+            yield text
+    finally:
+        if plumber is not None:
+            plumber.close()
+
+
+class TextCleaner:
+    """Drops running headers, footers and page numbers, rejoins hyphenated words and normalizes whitespace
+
+    observe() every page first (the hash-counting pass), then clean() streams
+    the same pages again. Only hashes of the lines near each page edge are kept
+    between passes, never the text itself.
+    """
+
+    # Lines this close to the top or bottom of a page may be headers or footers
+    EDGE_LINES = 3
+    # A header/footer must repeat on at least this share of pages (and 3 pages);
+    # kept low because chapter running heads only repeat within their chapter
+    MIN_REPEAT_FRACTION = 0.15
+    # Longest text carried over a page break while waiting for a sentence to end
+    MAX_CARRY_CHARS = 5000
+
+    _DIGITS = re.compile(r"\d+")
+    _PAGE_NUMBER = re.compile(r"^[-–—(\[\s]*(page\s*)?#(\s*(of|/)\s*#)?[-–—)\]\s]*$")
+    _SENTENCE_END = re.compile(r"[.!?:;\"'”’)\]]$")
+
+    def __init__(self):
+        self.pages = 0
+        self._counts = Counter()
+        self._boilerplate = None
+        self.stats = {"pages": 0, "chars_in": 0, "chars_out": 0, "lines_removed": 0,
+                      "chars_removed": 0, "hyphens_joined": 0}
+
+    @staticmethod
+    def _normalize(line):
+        # Digits vary between pages ("Page 3", "Page 4"), so they all compare equal
+        return TextCleaner._DIGITS.sub("#", " ".join(line.lower().split()))
+
+    @staticmethod
+    def _edge_indices(lines):
+        filled = [i for i, line in enumerate(lines) if line.strip()]
+        return set(filled[:TextCleaner.EDGE_LINES] + filled[-TextCleaner.EDGE_LINES:])
+
+    def observe(self, page_text):
+        """Count the edge lines of one page"""
+        lines = page_text.splitlines()
+        self.pages += 1
+        # Once per page, however often the line appears on it
+        self._counts.update({hash(self._normalize(lines[i])) for i in self._edge_indices(lines)})
+
+    def _is_boilerplate(self, line):
+        if self._boilerplate is None:
+            needed = max(3, math.ceil(self.pages * self.MIN_REPEAT_FRACTION))
+            self._boilerplate = {key for key, count in self._counts.items() if count >= needed}
+        normalized = self._normalize(line)
+        return bool(self._PAGE_NUMBER.match(normalized)) or hash(normalized) in self._boilerplate
+
+    def _join(self, paragraph, line):
+        if not paragraph:
+            return line
+        if paragraph.endswith("-") and len(paragraph) > 1 and paragraph[-2].isalpha() and line[:1].islower():
+            self.stats["hyphens_joined"] += 1
+            return paragraph[:-1] + line
+        return paragraph + " " + line
+
+    def clean(self, page_texts):
+        """Yield cleaned text per page; paragraphs continuing over a page break are yielded whole"""
+        paragraph = ""
+        for page_text in page_texts:
+            self.stats["pages"] += 1
+            self.stats["chars_in"] += len(page_text)
+            lines = page_text.splitlines()
+            edges = self._edge_indices(lines)
+            paragraphs = []
+
+            for i, raw_line in enumerate(lines):
+                line = " ".join(raw_line.split())
+                if not line:
+                    if paragraph:
+                        paragraphs.append(paragraph)
+                        paragraph = ""
+                    continue
+                if i in edges and self._is_boilerplate(line):
+                    self.stats["lines_removed"] += 1
+                    self.stats["chars_removed"] += len(line)
+                    continue
+                paragraph = self._join(paragraph, line)
+
+            # Keep an unfinished sentence open for the next page, within reason
+            if paragraph and (self._SENTENCE_END.search(paragraph) or len(paragraph) > self.MAX_CARRY_CHARS):
+                paragraphs.append(paragraph)
+                paragraph = ""
+
+            chunk = "".join(p + "\n\n" for p in paragraphs)
+            self.stats["chars_out"] += len(chunk)
+            yield chunk
+
+        if paragraph:
+            self.stats["chars_out"] += len(paragraph) + 2
+            yield paragraph + "\n\n"
+
+    def stream(self, page_texts, lookahead=12):
+        """clean() in one pass: each page is cleaned once the next lookahead pages have been counted
+
+        For pipelines, where later stages should not wait for every page to be
+        extracted. Headers are only recognized once they have repeated, so a few
+        may survive on the first pages of a short document.
+        """
+        def counted():
+            pending = deque()
+            for page_text in page_texts:
+                self.observe(page_text)
+                # Recomputed from the counts so far on the next lookup
+                self._boilerplate = None
+                pending.append(page_text)
+                if len(pending) > lookahead:
+                    yield pending.popleft()
+            yield from pending
+
+        yield from self.clean(counted())
+
+
+def iter_clean_page_texts(pdf_file, pages=None, extractor="pypdf2", stats=None):
+    """Yield cleaned text of the selected pages; the counting pass is served from the page cache"""
+    key = file_fingerprint(pdf_file)
+    cleaner = TextCleaner()
+    with trace("pdf.clean_scan"):
+        for page_text in iter_page_texts(pdf_file, pages, extractor, key=key):
+            cleaner.observe(page_text)
+    for chunk in cleaner.clean(iter_page_texts(pdf_file, pages, extractor, key=key)):
+        yield chunk
+    if stats is not None:
+        stats["cleaning"] = cleaner.stats
+
+
+@traced("pdf.document")
+def extract_document(pdf_file, pages=None, extractor="pypdf2", clean=True, language="english", stats=None):
+    """Extract the selected pages into a Document, splitting sentences once for every consumer"""
+    if pages is None:
+        # Page numbers let the cleaner's trailing paragraph stay on the last page
+        pages = range(len(PyPDF2.PdfReader(pdf_file).pages))
+    if clean:
+        chunks = iter_clean_page_texts(pdf_file, pages, extractor, stats)
+    else:
+        chunks = iter_page_texts(pdf_file, pages, extractor)
+    return Document.build(chunks, pages, language)
+
+
+class TextStream:
+    """Iterable of text chunks that counts characters and keeps the first few for previews"""
+
+    def __init__(self, chunks, head_chars=1000):
+        self._chunks = chunks
+        self.head_chars = head_chars
+        self.head = ""
+        self.chars = 0
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            self.chars += len(chunk)
+            if len(self.head) < self.head_chars:
+                self.head += chunk[:self.head_chars - len(self.head)]
+            yield chunk
+
+
 class PDFToAudioConverter:
     """Handles PDF to Audio conversion"""
 
     @staticmethod
-    def extract_text_from_pdf(pdf_file):
-        """Extract text from PDF file"""
+    def iter_pdf_text(pdf_file, pages=None, clean=True, stats=None):
+        """Yield the text of each selected PDF page in turn, without keeping earlier pages
+
+        With clean=True running headers, page numbers and hyphenated line breaks
+        are removed first; stats["cleaning"] reports what was dropped.
+        """
+        if clean:
+            yield from iter_clean_page_texts(pdf_file, pages, stats=stats)
+            return
+        for page_text in iter_page_texts(pdf_file, pages):
+            yield page_text + "\n"
+
+    @staticmethod
+    def extract_document(pdf_file, pages=None, clean=True, lang='en', stats=None):
+        """Extract the given 0-based pages (all by default) into a Document, split into sentences for lang"""
         try:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text.strip()
+            return extract_document(pdf_file, pages, clean=clean,
+                                    language=TTS_LANGUAGES.get(lang, (None, 'english'))[1], stats=stats)
         except Exception as e:
             st.error(f"Error extracting text from PDF: {e}")
             return None
 
     @staticmethod
-    def text_to_audio(text, output_path="output_audio.mp3", rate=200, volume=0.8):
-        """Convert text to audio using gTTS"""
+    @traced("pdf.extract")
+    def extract_text_from_pdf(pdf_file, pages=None, clean=True, stats=None):
+        """Extract text from PDF file, optionally only the given 0-based pages"""
         try:
-            tts = gTTS(text=text, lang='en')
-            tts.save(output_path)
-            return output_path
+            return "".join(PDFToAudioConverter.iter_pdf_text(pdf_file, pages, clean, stats)).strip()
+        except Exception as e:
+            st.error(f"Error extracting text from PDF: {e}")
+            return None
+
+    @staticmethod
+    @traced("tts.convert")
+    @observe_conversion("pdf_to_audio")
+    def text_to_audio(text, output_path="output_audio.mp3", rate=150, volume=0.8,
+                      lang='en', voice='com', encoding=None, max_silence_ms=None, stats=None):
+        """Convert text to audio using gTTS, at rate words per minute"""
+        try:
+            return SpeechSynthesizer.synthesize(
+                text, output_path, lang=lang, voice=voice, encoding=encoding,
+                tempo=rate / SpeechSynthesizer.BASE_WPM, max_silence_ms=max_silence_ms, stats=stats
+            )
         except Exception as e:
             st.error(f"Error converting text to audio: {e}")
             return None
@@ -53,79 +1288,268 @@ class TextToAudioConverter:
 
 
     @staticmethod
-    def convert_text_to_audio(text, output_path="text_audio.mp3", **kwargs):
-        """Convert plain text to audio using gTTS"""
+    @traced("tts.convert")
+    @observe_conversion("text_to_audio")
+    def convert_text_to_audio(text, output_path="text_audio.mp3", lang='en', voice='com',
+                              encoding=None, rate=150, max_silence_ms=None, stats=None, **kwargs):
+        """Convert plain text to audio using gTTS, at rate words per minute"""
         try:
-            tts = gTTS(text=text, lang='en')
-            tts.save(output_path)
-            return output_path
+            return SpeechSynthesizer.synthesize(
+                text, output_path, lang=lang, voice=voice, encoding=encoding,
+                tempo=rate / SpeechSynthesizer.BASE_WPM, max_silence_ms=max_silence_ms, stats=stats
+            )
         except Exception as e:
             st.error(f"Error converting text to audio: {e}")
             return None
 
 
+class SentenceIndex:
+    """Inverted index (term -> sentence ids with positions) over a document's sentences"""
+
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, sentences, postings, lengths):
+        self.sentences = sentences
+        self.postings = postings
+        self.lengths = lengths
+        self.avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    @staticmethod
+    def tokenize(text, stop_words):
+        """Lowercase word tokens of one sentence with stopwords and punctuation removed"""
+        return [word for word in word_tokenize(text.lower(), preserve_line=True)
+                if word.isalnum() and word not in stop_words]
+
+    @classmethod
+    def build(cls, text):
+        """Tokenize the text (a str or a Document) once and build the index"""
+        stop_words = set(stopwords.words('english'))
+        sentences = list(text.sentences()) if isinstance(text, Document) else sent_tokenize(text)
+        postings = {}
+        lengths = []
+
+        for sentence_id, sentence in enumerate(sentences):
+            tokens = cls.tokenize(sentence, stop_words)
+            lengths.append(len(tokens))
+            for position, token in enumerate(tokens):
+                postings.setdefault(token, []).append((sentence_id, position))
+
+        return cls(sentences, postings, lengths)
+
+    def query(self, query, top_k=5):
+        """Return the ids of the top_k sentences most relevant to query, in document order"""
+        stop_words = set(stopwords.words('english'))
+        terms = list(dict.fromkeys(self.tokenize(query, stop_words)))
+        if not terms or not self.sentences:
+            return []
+
+        num_sentences = len(self.sentences)
+        scores = Counter()
+        positions = {}
+
+        # BM25 over the postings of each query term
+        for term in terms:
+            term_postings = self.postings.get(term)
+            if not term_postings:
+                continue
+
+            term_freq = Counter(sentence_id for sentence_id, _ in term_postings)
+            doc_freq = len(term_freq)
+            idf = math.log(1 + (num_sentences - doc_freq + 0.5) / (doc_freq + 0.5))
+
+            for sentence_id, tf in term_freq.items():
+                norm = self.K1 * (1 - self.B + self.B * self.lengths[sentence_id] / (self.avg_length or 1))
+                scores[sentence_id] += idf * tf * (self.K1 + 1) / (tf + norm)
+
+            for sentence_id, position in term_postings:
+                positions.setdefault(sentence_id, {}).setdefault(term, set()).add(position)
+
+        # Boost sentences where consecutive query terms appear next to each other
+        for sentence_id, term_positions in positions.items():
+            for first, second in zip(terms, terms[1:]):
+                if first in term_positions and second in term_positions:
+                    if any(position + 1 in term_positions[second] for position in term_positions[first]):
+                        scores[sentence_id] *= 1.5
+
+        top = [sentence_id for sentence_id, _ in scores.most_common(top_k)]
+        return sorted(top)
+
+    def to_dict(self):
+        """Serialize the index to JSON-compatible data"""
+        return {"sentences": self.sentences, "postings": self.postings, "lengths": self.lengths}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild an index produced by to_dict"""
+        postings = {term: [tuple(entry) for entry in entries] for term, entries in data["postings"].items()}
+        return cls(data["sentences"], postings, data["lengths"])
+
+
 class PDFSummarizer:
     """Handles PDF text summarization"""
 
+    INDEX_DIR = os.path.join(CACHE_DIR, "index")
+    MAX_INDEXES_IN_MEMORY = 16
+    _indexes = OrderedDict()
+
     @staticmethod
-    def extract_text_with_pdfplumber(pdf_file):
-        """Extract text using pdfplumber for better accuracy"""
+    def extract_document(pdf_file, pages=None, clean=True, stats=None):
+        """Extract the given 0-based pages (all by default) into a Document with pdfplumber"""
         try:
-            with pdfplumber.open(pdf_file) as pdf:
-                text = ""
-                for page in pdf.pages:
-                    text += page.extract_text() + "\n"
-            return text.strip()
+            return extract_document(pdf_file, pages, "pdfplumber", clean=clean, stats=stats)
+        except Exception as e:
+            st.error(f"Error extracting text: {e}")
+            return None
+
+    @staticmethod
+    @traced("pdf.extract")
+    def extract_text_with_pdfplumber(pdf_file, pages=None, clean=True, stats=None):
+        """Extract text using pdfplumber for better accuracy, optionally only the given 0-based pages"""
+        try:
+            if clean:
+                return "".join(iter_clean_page_texts(pdf_file, pages, "pdfplumber", stats)).strip()
+            return "\n".join(iter_page_texts(pdf_file, pages, extractor="pdfplumber")).strip()
         except Exception as e:
             st.error(f"Error extracting text: {e}")
             return None
 
     @staticmethod
+    @traced("summarize")
+    @observe_conversion("pdf_summarizer")
     def summarize_text(text, num_sentences=5):
-        """Summarize text using NLTK"""
+        """Summarize text (a str or a Document) using NLTK"""
         try:
-            # Tokenize sentences
-            sentences = sent_tokenize(text)
-            if len(sentences) <= num_sentences:
-                return text
+            with trace("summarize.tokenize"):
+                document = text if isinstance(text, Document) else Document.build(text)
+                if document.num_sentences <= num_sentences:
+                    return text if isinstance(text, str) else text.text.strip()
 
-            # Tokenize words and remove stopwords
-            stop_words = set(stopwords.words('english'))
-            words = word_tokenize(text.lower())
-            words = [word for word in words if word.isalnum() and word not in stop_words]
+                # Tokenize each sentence once; stopwords and punctuation never score
+                stop_words = set(stopwords.words('english'))
+                sentence_words = [SentenceIndex.tokenize(sentence, stop_words) for sentence in document.sentences()]
 
             # Calculate word frequency
-            word_freq = Counter(words)
+            word_freq = Counter(word for words in sentence_words for word in words)
+            top_sentences = PDFSummarizer.pick_sentences(sentence_words, word_freq, num_sentences)
+
+            # Create summary
+            summary = ' '.join(document.sentence(i) for i in top_sentences)
+            report_progress("summarize", 1, 1, "document")
+            return summary
 
-            # Score sentences
-            sentence_scores = {}
-            for i, sentence in enumerate(sentences):
-                words_in_sentence = word_tokenize(sentence.lower())
-                score = 0
-                word_count = 0
+        except Exception as e:
+            st.error(f"Error summarizing text: {e}")
+            return None
 
-                for word in words_in_sentence:
-                    if word in word_freq:
-                        score += word_freq[word]
-                        word_count += 1
+    @staticmethod
+    def pick_sentences(sentence_words, word_freq, num_sentences):
+        """Ids of the num_sentences sentences whose words are most frequent on average, in document order"""
+        sentence_scores = {}
+        for i, words_in_sentence in enumerate(sentence_words):
+            if words_in_sentence:
+                sentence_scores[i] = sum(word_freq[word] for word in words_in_sentence) / len(words_in_sentence)
 
-                if word_count > 0:
-                    sentence_scores[i] = score / word_count
+        top_sentences = sorted(sentence_scores.items(),
+                               key=lambda x: x[1], reverse=True)[:num_sentences]
+        return sorted([x[0] for x in top_sentences])
 
-            # Get top sentences
-            top_sentences = sorted(sentence_scores.items(), 
-                                 key=lambda x: x[1], reverse=True)[:num_sentences]
-            top_sentences = sorted([x[0] for x in top_sentences])
+    @staticmethod
+    def summarize_sections(chunks, num_sentences, total_chunks, section_chunks=10, language="english"):
+        """Yield summary sentences section by section as text chunks (pages, transcript segments) arrive
 
-            # Create summary
-            summary = ' '.join([sentences[i] for i in top_sentences])
-            return summary
+        Every section_chunks chunks form a section, which gets its share of
+        num_sentences (total_chunks is the expected number of chunks). Sentences
+        are scored against the word frequencies of all text seen so far, so the
+        first ones are out long before the last page is read.
+        """
+        stop_words = set(stopwords.words('english'))
+        word_freq = Counter()
+        sections = max(1, math.ceil(total_chunks / section_chunks))
+
+        def quota(section):
+            if section >= sections:
+                # More input than expected, e.g. a longer recording; one sentence each
+                return 1
+            return (section + 1) * num_sentences // sections - section * num_sentences // sections
+
+        def summarize(section, buffered):
+            document = Document.build(buffered, language=language)
+            sentence_words = [SentenceIndex.tokenize(sentence, stop_words) for sentence in document.sentences()]
+            word_freq.update(word for words in sentence_words for word in words)
+            for i in PDFSummarizer.pick_sentences(sentence_words, word_freq, quota(section)):
+                yield document.sentence(i)
+            report_progress("summarize", section + 1, max(sections, section + 1), "sections")
+
+        section = 0
+        buffered = []
+        for chunk in chunks:
+            buffered.append(chunk)
+            if len(buffered) == section_chunks:
+                yield from summarize(section, buffered)
+                section += 1
+                buffered = []
+        if buffered:
+            yield from summarize(section, buffered)
+
+    @staticmethod
+    @traced("summarize.index")
+    def get_document_index(pdf_file, pages=None):
+        """Load the sentence index for a PDF (or a page selection) from memory or disk, building it on first use"""
+        try:
+            # Indexes are built from cleaned text; the suffix keeps older uncleaned ones from loading
+            key = file_fingerprint(pdf_file) + "-clean"
+            if pages is not None:
+                selection = ",".join(str(page) for page in pages)
+                key += "-" + hashlib.sha1(selection.encode("ascii")).hexdigest()[:12]
+            indexes = PDFSummarizer._indexes
+
+            if key in indexes:
+                indexes.move_to_end(key)
+                CACHE_REQUESTS.inc(cache="summary_index", result="memory")
+                return indexes[key]
+
+            index_path = os.path.join(PDFSummarizer.INDEX_DIR, f"{key}.json")
+            if os.path.exists(index_path):
+                CACHE_REQUESTS.inc(cache="summary_index", result="disk")
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    index = SentenceIndex.from_dict(json.load(f))
+            else:
+                CACHE_REQUESTS.inc(cache="summary_index", result="miss")
+                document = extract_document(pdf_file, pages, "pdfplumber")
+                if not document:
+                    return None
+                index = SentenceIndex.build(document)
+
+                # Write to a temporary name first so readers never see a partial index
+                os.makedirs(PDFSummarizer.INDEX_DIR, exist_ok=True)
+                with open(index_path + ".tmp", 'w', encoding='utf-8') as f:
+                    json.dump(index.to_dict(), f)
+                os.replace(index_path + ".tmp", index_path)
 
+            indexes[key] = index
+            if len(indexes) > PDFSummarizer.MAX_INDEXES_IN_MEMORY:
+                indexes.popitem(last=False)
+            return index
+        except Exception as e:
+            st.error(f"Error indexing document: {e}")
+            return None
+
+    @staticmethod
+    @traced("summarize.query")
+    @observe_conversion("pdf_summary_query")
+    def query_summary(index, query, num_sentences=5):
+        """Summarize the sentences of an indexed document most relevant to a query"""
+        try:
+            sentence_ids = index.query(query, top_k=num_sentences)
+            report_progress("summarize", 1, 1, "document")
+            return ' '.join(index.sentences[i] for i in sentence_ids)
         except Exception as e:
             st.error(f"Error summarizing text: {e}")
             return None
 
     @staticmethod
+    @traced("file.write")
     def create_summary_pdf(summary_text, output_path="summary.txt"):
         """Save summary as text file (PDF libraries need additional setup)"""
         try:
@@ -138,38 +1562,325 @@ class PDFSummarizer:
             st.error(f"Error creating summary file: {e}")
             return None
 
+
+class TranscriptWriter:
+    """Appends transcript segments to a text file as they complete, so a stopped run keeps its partial text"""
+
+    def __init__(self, path, timestamps=False, tail_chars=3000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.timestamps = timestamps
+        self.tail_chars = tail_chars
+        self.segments = 0
+        self.words = 0
+        self._tail = ""
+        self._speaker = None
+        self._file = open(path, "w", encoding="utf-8")
+
+    @staticmethod
+    def format_timestamp(seconds):
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+    @staticmethod
+    def format_segments(segments, timestamps=False, speaker=None):
+        """Transcript text for segments, one line each, as the writer lays it out
+
+        Lines are prefixed with "Speaker N:" where the speaker changes; speaker
+        is the label of the line before the first segment, if any.
+        """
+        lines = []
+        for segment in segments:
+            if segment["text"]:
+                line = segment["text"]
+                if segment.get("speaker") and segment["speaker"] != speaker:
+                    line = f"Speaker {segment['speaker']}: {line}"
+                    speaker = segment["speaker"]
+                if timestamps:
+                    line = f"[{TranscriptWriter.format_timestamp(segment['start'])}] {line}"
+                lines.append(line)
+        return "\n".join(lines)
+
+    @staticmethod
+    def speaker_turns(segments):
+        """Consecutive segments of the same speaker joined into {"speaker", "start", "text"} turns"""
+        turns = []
+        for segment in segments:
+            if not segment["text"]:
+                continue
+            if turns and turns[-1]["speaker"] == segment.get("speaker"):
+                turns[-1]["text"] += " " + segment["text"]
+            else:
+                turns.append({"speaker": segment.get("speaker"), "start": segment["start"], "text": segment["text"]})
+        return turns
+
+    def add(self, segment):
+        if not segment["text"]:
+            return
+        line = self.format_segments([segment], self.timestamps, self._speaker)
+        self._speaker = segment.get("speaker") or self._speaker
+        self._file.write(line + "\n")
+        self._file.flush()
+        self.segments += 1
+        self.words += len(segment["text"].split())
+        self._tail = (self._tail + line + "\n")[-self.tail_chars:]
+
+    def tail(self):
+        """The most recent text, for a live view that stays the same size"""
+        return self._tail
+
+    def close(self):
+        self._file.close()
+
+    def read(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+
+
+class GoogleSpeechEngine:
+    """Google Speech Recognition (the free web API) through the pooled engine client"""
+
+    name = "google_speech"
+    # Overridable to go through a proxy or a local stub server
+    URL = os.environ.get("GOOGLE_SPEECH_URL", "http://www.google.com/speech-api/v2/recognize")
+
+    def __init__(self, language="en-US"):
+        self.language = language
+
+    def recognize(self, audio):
+        """Transcript of audio; raises sr.UnknownValueError for no speech, EngineError if the service fails"""
+        if google_speech is None:
+            try:
+                with backend_call("google_speech"):
+                    return sr.Recognizer().recognize_google(audio, language=self.language)
+            except sr.RequestError as e:
+                raise EngineError(f"google_speech failed: {e}")
+        request = google_speech.create_request_builder(
+            endpoint=GoogleSpeechEngine.URL, key=None, language=self.language, filter_level=0
+        ).build(audio)
+        response = engine_client.post("google_speech", request.full_url, request.data, dict(request.header_items()))
+        return google_speech.OutputParser(show_all=False, with_confidence=False).parse(response.decode("utf-8"))
+
+
+class SphinxSpeechEngine:
+    """Offline CMU Sphinx recognizer; needs pocketsphinx installed
+
+    With MODEL_POOL_WORKERS set, recognition runs on warm decoders in the
+    model pool (utils/models.py) instead of loading the model on every call.
+    """
+
+    name = "sphinx"
+
+    def __init__(self, language="en-US"):
+        self.language = language
+        self.recognizer = sr.Recognizer()
+
+    def recognize(self, audio):
+        pool = model_pool("sphinx", self.language)
+        with backend_call("sphinx"):
+            if pool is None:
+                return self.recognizer.recognize_sphinx(audio, language=self.language)
+            try:
+                # The bundled models expect 16 kHz 16-bit mono
+                text = pool.infer(audio.get_raw_data(convert_rate=16000, convert_width=2))
+            except ModelError as e:
+                raise sr.RequestError(str(e))
+            if text is None:
+                raise sr.UnknownValueError()
+            return text
+
+
+STT_ENGINES = {"google_speech": GoogleSpeechEngine, "sphinx": SphinxSpeechEngine}
+STT_FALLBACK_ENGINE = os.environ.get("STT_FALLBACK_ENGINE", "")
+
+
 class AudioToPDFConverter:
     """Handles Audio to PDF conversion"""
 
+    STT_ENGINE = "google_speech"
+    _stt_engines = {}
+
+    # Google's recognizer rejects long requests, so longer audio is sent in chunks
+    CHUNK_SECONDS = 30
+
+    @staticmethod
+    def _stt_engine(name):
+        if name not in AudioToPDFConverter._stt_engines:
+            AudioToPDFConverter._stt_engines[name] = STT_ENGINES[name]()
+        return AudioToPDFConverter._stt_engines[name]
+
+    @staticmethod
+    def _recognize(audio):
+        """Transcript of audio, failing over to STT_FALLBACK_ENGINE when the service is down
+
+        Raises sr.UnknownValueError for no speech and sr.RequestError if no engine answers.
+        """
+        engine = AudioToPDFConverter.STT_ENGINE
+        with trace("stt.recognize", bytes_in=len(audio.frame_data)) as span:
+            try:
+                text = AudioToPDFConverter._stt_engine(engine).recognize(audio)
+            except EngineError as e:
+                if not STT_FALLBACK_ENGINE or STT_FALLBACK_ENGINE == engine:
+                    raise sr.RequestError(str(e))
+                engine_client.record_fallback(engine)
+                text = AudioToPDFConverter._stt_engine(STT_FALLBACK_ENGINE).recognize(audio)
+            span.add_bytes(bytes_out=len(text))
+        return text
+
     @staticmethod
+    @traced("audio.to_wav")
     def convert_to_wav(input_path):
         """Convert any audio format to WAV"""
         try:
-            audio = AudioSegment.from_file(input_path)
             wav_path = input_path.rsplit('.', 1)[0] + "_converted.wav"
-            audio.export(wav_path, format="wav")
+            # ffmpeg streams file to file; pydub would decode the whole recording into memory
+            subprocess.run(
+                [AudioSegment.converter, "-hide_banner", "-loglevel", "error", "-y",
+                 "-i", input_path, "-ac", "1", "-c:a", "pcm_s16le", wav_path],
+                check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+            )
             return wav_path
         except Exception as e:
             st.error(f"Error converting audio to WAV: {e}")
             return None
 
     @staticmethod
-    def audio_to_text(audio_file_path):
-        """Convert audio to text using speech recognition"""
+    def _prepare_wav(audio_file_path):
+        """Probe the audio and convert it to PCM WAV if needed; returns (wav path or None, route)"""
+        # Headers decide the route: PCM WAV is read directly, anything else converted first
+        with trace("stt.probe"):
+            with open(audio_file_path, "rb") as f:
+                route = plan_audio(probe_audio(f, audio_file_path))
+        if route["needs_conversion"]:
+            audio_file_path = AudioToPDFConverter.convert_to_wav(audio_file_path)
+        return audio_file_path, route
+
+    @staticmethod
+    def _speech_chunks(wav_path, chunk_seconds=None, stats=None, speakers=False):
+        """Yield (start, end, speaker, sr.AudioData) for the speech in a PCM WAV file
+
+        A first pass finds speech with VoiceActivityDetector; only those regions
+        are read back and sent for recognition, grouped into chunks of at most
+        chunk_seconds of speech (no limit when None). start and end are times in
+        the original recording. With speakers=True the same pass feeds
+        SpeakerSegmenter, chunks end at speaker turns and speaker is a 1-based
+        label; otherwise it is None.
+        """
+        with wave.open(wav_path, "rb") as wav:
+            rate, width, channels = wav.getframerate(), wav.getsampwidth(), wav.getnchannels()
+            vad = VoiceActivityDetector(rate)
+            segmenter = SpeakerSegmenter(rate) if speakers else None
+            with trace("stt.vad", bytes_in=wav.getnframes() * width * channels):
+                for data in iter(lambda: wav.readframes(rate * 10), b""):
+                    samples = pcm_to_mono(data, width, channels)
+                    vad.observe(samples)
+                    if segmenter is not None:
+                        segmenter.observe(samples)
+                regions = vad.regions()
+            if segmenter is not None:
+                with trace("stt.speakers"):
+                    regions = segmenter.turns(regions)
+            else:
+                regions = [(start, end, None) for start, end in regions]
+
+            duration = vad.samples / rate if rate else 0.0
+            speech_seconds = sum(end - start for start, end, _ in regions) / rate if rate else 0.0
+            if stats is not None:
+                stats["vad"] = {
+                    "audio_seconds": duration,
+                    "speech_seconds": speech_seconds,
+                    "regions": len(regions),
+                    "noise_floor_db": vad.noise_floor_db,
+                }
+                if segmenter is not None:
+                    stats["speakers"] = segmenter.speakers
+
+            limit = int(chunk_seconds * rate) if chunk_seconds else None
+            if limit:
+                # Split regions longer than a chunk
+                regions = [(offset, min(offset + limit, end), speaker)
+                           for start, end, speaker in regions for offset in range(start, end, limit)]
+
+            # A short pause between joined regions keeps words from running together
+            pause = np.zeros(rate // 4, dtype=np.int16).tobytes()
+            pieces, samples, chunk_start, chunk_speaker = [], 0, None, None
+            for start, end, speaker in regions:
+                if pieces and (speaker != chunk_speaker or limit and samples + end - start > limit):
+                    yield chunk_start / rate, chunk_end / rate, chunk_speaker, sr.AudioData(pause.join(pieces), rate, 2)
+                    pieces, samples = [], 0
+                if not pieces:
+                    chunk_start, chunk_speaker = start, speaker
+                with trace("stt.record") as span:
+                    wav.setpos(start)
+                    pieces.append(pcm_to_mono(wav.readframes(end - start), width, channels).tobytes())
+                    span.add_bytes(bytes_out=len(pieces[-1]))
+                samples += end - start
+                chunk_end = end
+            if pieces:
+                yield chunk_start / rate, chunk_end / rate, chunk_speaker, sr.AudioData(pause.join(pieces), rate, 2)
+
+    @staticmethod
+    @observe_stream("audio_to_pdf")
+    def iter_transcript(audio_file_path, chunk_seconds=None, stats=None, speakers=False):
+        """Yield {"start", "end", "speaker", "text"} segments as each chunk of speech is recognized
+
+        Silence is dropped before recognition, so segments cover only the spoken
+        parts of the recording. With speakers=True each segment is one speaker's
+        turn (or part of one) and speaker is a 1-based label; otherwise None.
+        Only one chunk of audio is held at a time, so
+        memory does not grow with the recording's length. Chunks with no
+        intelligible speech yield empty text; sr.RequestError is raised if the
+        recognition service fails.
+        """
+        chunk_seconds = chunk_seconds or AudioToPDFConverter.CHUNK_SECONDS
+        wav_path, _ = AudioToPDFConverter._prepare_wav(audio_file_path)
+        if wav_path is None:
+            return
+
+        stats = stats if stats is not None else {}
+        for start, end, speaker, audio in AudioToPDFConverter._speech_chunks(wav_path, chunk_seconds, stats, speakers):
+            try:
+                text = AudioToPDFConverter._recognize(audio)
+            except sr.UnknownValueError:
+                # Noise the detector took for speech; keep going
+                text = ""
+            report_progress("transcribe", end, stats["vad"]["audio_seconds"], "s")
+            yield {"start": start, "end": end, "speaker": speaker, "text": text}
+
+    @staticmethod
+    @traced("stt.transcribe")
+    @observe_conversion("audio_to_pdf")
+    def audio_to_text(audio_file_path, low_memory=False, stats=None):
+        """Convert audio to text using speech recognition
+
+        Recordings over a minute, or any recording with low_memory=True, are
+        recognized CHUNK_SECONDS of speech at a time; shorter ones in one request.
+        Silence is dropped before recognition either way.
+        """
         try:
-            r = sr.Recognizer()
+            with open(audio_file_path, "rb") as f:
+                route = plan_audio(probe_audio(f, audio_file_path))
 
-            # Convert to WAV if necessary
-            if not audio_file_path.lower().endswith(".wav"):
-                audio_file_path = AudioToPDFConverter.convert_to_wav(audio_file_path)
-                if audio_file_path is None:
-                    return None
+            if low_memory or route["chunked"]:
+                parts = [segment["text"] for segment in AudioToPDFConverter.iter_transcript(audio_file_path, stats=stats)
+                         if segment["text"]]
+                if not parts:
+                    raise sr.UnknownValueError()
+                return " ".join(parts)
 
-            with sr.AudioFile(audio_file_path) as source:
-                r.adjust_for_ambient_noise(source, duration=1)
-                audio = r.record(source)
+            audio_file_path, _ = AudioToPDFConverter._prepare_wav(audio_file_path)
+            if audio_file_path is None:
+                return None
 
-            text = r.recognize_google(audio)
+            stats = stats if stats is not None else {}
+            chunks = list(AudioToPDFConverter._speech_chunks(audio_file_path, stats=stats))
+            if not chunks:
+                raise sr.UnknownValueError()
+            text = AudioToPDFConverter._recognize(chunks[0][3])
+            report_progress("transcribe", stats["vad"]["audio_seconds"], stats["vad"]["audio_seconds"], "s")
             return text
 
         except sr.UnknownValueError:
@@ -183,14 +1894,66 @@ class AudioToPDFConverter:
             return None
     
     @staticmethod
-    def text_to_file(text, output_path="audio_transcript.txt"):
-        """Save transcribed text as .txt, .md, .rtf or .pdf"""
+    @traced("file.write")
+    def text_to_file(text, output_path="audio_transcript.txt", segments=None, timestamps=False, title="Audio Transcript"):
+        """Save transcribed text (a str or a Document) as .txt, .md, .rtf or .pdf
+
+        With speaker-labelled segments, .md and .pdf are laid out as one
+        heading and paragraph per speaker turn instead of the plain text;
+        a Document's headings are kept as headings.
+        """
         try:
             ext = os.path.splitext(output_path)[1].lower()
+            document = text if isinstance(text, Document) else None
+            if document is not None:
+                text = document.text.strip()
+            turns = TranscriptWriter.speaker_turns(segments or [])
+            if not any(turn["speaker"] for turn in turns):
+                turns = None
+
+            def heading(turn):
+                when = f" ({TranscriptWriter.format_timestamp(turn['start'])})" if timestamps else ""
+                return f"Speaker {turn['speaker']}{when}"
+
+            if ext == '.md' and turns:
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    f.write(f"# {title}\n\n")
+                    for turn in turns:
+                        f.write(f"**{heading(turn)}**\n\n{turn['text']}\n\n")
+
+            elif ext == '.pdf' and turns:
+                pdf = FPDF()
+                pdf.add_page()
+                pdf.set_font("Arial", "B", 14)
+                pdf.cell(0, 10, title.upper(), ln=1)
+                for turn in turns:
+                    pdf.set_font("Arial", "B", 12)
+                    pdf.cell(0, 8, heading(turn), ln=1)
+                    pdf.set_font("Arial", size=12)
+                    pdf.multi_cell(0, 8, turn["text"])
+                    pdf.ln(2)
+                pdf.output(output_path)
 
-            if ext in ['.txt', '.md', '.rtf']:
+            elif ext == '.md' and document is not None:
                 with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write("AUDIO TRANSCRIPT\n")
+                    f.write(f"# {title}\n\n")
+                    for kind, block in document.blocks():
+                        f.write(f"## {block}\n\n" if kind == HEADING else f"{block}\n\n")
+
+            elif ext == '.pdf' and document is not None:
+                pdf = FPDF()
+                pdf.add_page()
+                pdf.set_font("Arial", "B", 14)
+                pdf.cell(0, 10, title.upper(), ln=1)
+                for kind, block in document.blocks():
+                    pdf.set_font("Arial", "B" if kind == HEADING else "", 12)
+                    pdf.multi_cell(0, 8, block)
+                    pdf.ln(2)
+                pdf.output(output_path)
+
+            elif ext in ['.txt', '.md', '.rtf']:
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    f.write(title.upper() + "\n")
                     f.write("=" * 50 + "\n\n")
                     f.write(text)
 
@@ -198,24 +1961,140 @@ class AudioToPDFConverter:
                 pdf = FPDF()
                 pdf.add_page()
                 pdf.set_font("Arial", size=12)
-                pdf.multi_cell(0, 10, "AUDIO TRANSCRIPT\n" + "=" * 50 + "\n\n" + text)
+                pdf.multi_cell(0, 10, title.upper() + "\n" + "=" * 50 + "\n\n" + text)
                 pdf.output(output_path)
 
             else:
                 raise ValueError("Unsupported file format")
 
+            report_progress("write", 1, 1, "file")
             return output_path
         except Exception as e:
             st.error(f"Error saving file: {e}")
             return None
 
 
+class ConverterPipelines:
+    """Converters chained into one streamed job with Pipeline
+
+    Each stage hands its output to the next as it goes, so speech for the
+    first section of the summary is synthesized while later pages are still
+    being extracted. The summary is built section by section
+    (PDFSummarizer.summarize_sections) for the same reason.
+    """
+
+    @staticmethod
+    @traced("pipeline.pdf_summary_audio")
+    @observe_conversion("pdf_summary_audio")
+    def pdf_to_spoken_summary(pdf_file, output_path, pages=None, num_sentences=10, section_pages=10,
+                              lang='en', voice='com', rate=150, encoding=None, stats=None):
+        """extract → clean → summarize → synthesize → write; returns output_path"""
+        try:
+            stats = stats if stats is not None else {}
+            if pages is None:
+                pages = range(len(PyPDF2.PdfReader(pdf_file).pages))
+            key = file_fingerprint(pdf_file)
+            cleaner = TextCleaner()
+            summary = stats["summary"] = []
+            synthesis = stats["synthesis"] = {}
+
+            def extract(page_numbers):
+                yield from iter_page_texts(pdf_file, list(page_numbers), key=key)
+
+            def summarize(chunks):
+                corpus = TTS_LANGUAGES.get(lang, (None, 'english'))[1]
+                yield from PDFSummarizer.summarize_sections(chunks, num_sentences, len(pages), section_pages, corpus)
+
+            def synthesize(sentences):
+                def spoken():
+                    for sentence in sentences:
+                        summary.append(sentence)
+                        yield sentence
+                yield from SpeechSynthesizer.iter_audio(spoken(), lang=lang, voice=voice, stats=synthesis)
+
+            def write(fragments):
+                yield SpeechSynthesizer.write_audio(fragments, output_path, encoding=encoding,
+                                                    tempo=rate / SpeechSynthesizer.BASE_WPM, stats=synthesis)
+
+            pipeline = (Pipeline("pdf_summary_audio")
+                        .stage("extract", extract)
+                        .stage("clean", cleaner.stream)
+                        .stage("summarize", summarize)
+                        .stage("synthesize", synthesize)
+                        .stage("write", write))
+            stats["pipeline"] = pipeline.stats
+            stats["cleaning"] = cleaner.stats
+            result = None
+            for result in pipeline.run(pages):
+                pass
+            return result if summary else None
+        except Exception as e:
+            st.error(f"Error creating spoken summary: {e}")
+            return None
+
+    @staticmethod
+    @traced("pipeline.audio_summary_file")
+    @observe_conversion("audio_summary_file")
+    def audio_to_summary_file(audio_file_path, output_path, num_sentences=10, section_seconds=300, stats=None):
+        """transcribe → summarize → write (.pdf, .txt, .md or .rtf); returns output_path"""
+        try:
+            stats = stats if stats is not None else {}
+            with open(audio_file_path, "rb") as f:
+                duration = probe_audio(f, audio_file_path).get("duration") or 0
+            chunk_seconds = AudioToPDFConverter.CHUNK_SECONDS
+            transcript = stats["transcript"] = {}
+            summary = stats["summary"] = []
+
+            def transcribe(paths):
+                for path in paths:
+                    for segment in AudioToPDFConverter.iter_transcript(path, stats=transcript):
+                        if segment["text"]:
+                            yield segment["text"]
+
+            def summarize(texts):
+                yield from PDFSummarizer.summarize_sections(
+                    texts, num_sentences, max(1, math.ceil(duration / chunk_seconds)),
+                    max(1, section_seconds // chunk_seconds)
+                )
+
+            def write(sentences):
+                summary.extend(sentences)
+                if summary:
+                    yield AudioToPDFConverter.text_to_file(" ".join(summary), output_path, title="Audio Summary")
+
+            pipeline = (Pipeline("audio_summary_file")
+                        .stage("transcribe", transcribe)
+                        .stage("summarize", summarize)
+                        .stage("write", write))
+            stats["pipeline"] = pipeline.stats
+            result = None
+            for result in pipeline.run([audio_file_path]):
+                pass
+            return result
+        except sr.RequestError as e:
+            st.error(f"❌ Error with the speech recognition service: {e}")
+            return None
+        except Exception as e:
+            st.error(f"Error creating audio summary: {e}")
+            return None
+
+
 # Utility functions
-def save_uploaded_file(uploaded_file, directory="temp"):
-    """Save uploaded file to temporary directory"""
+def make_job_dir(root="temp"):
+    """Private temporary directory for one conversion job, under root
+
+    Concurrent jobs each get their own, so one job's cleanup never removes
+    another session's input or output.
+    """
+    os.makedirs(root, exist_ok=True)
+    return tempfile.mkdtemp(prefix="job-", dir=root)
+
+@traced("upload.save")
+def save_uploaded_file(uploaded_file, directory):
+    """Save uploaded file to a job's temporary directory"""
     try:
         os.makedirs(directory, exist_ok=True)
-        file_path = os.path.join(directory, uploaded_file.name)
+        file_path = os.path.join(directory, os.path.basename(uploaded_file.name))
         with open(file_path, "wb") as f:
             f.write(uploaded_file.getbuffer())
         return file_path
@@ -223,11 +2102,6 @@ def save_uploaded_file(uploaded_file, directory="temp"):
         st.error(f"Error saving file: {e}")
         return None
 
-def clean_temp_files(directory="temp"):
-    """Clean temporary files"""
-    try:
-        if os.path.exists(directory):
-            for file in os.listdir(directory):
-                os.remove(os.path.join(directory, file))
-    except:
-        pass
+def clean_temp_files(directory):
+    """Remove a job's temporary directory and everything in it"""
+    shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,157 @@
+
+import re
+import sys
+from array import array
+
+import numpy as np
+from nltk.tokenize.punkt import PunktTokenizer
+
+# Intermediate form of an extracted document, shared by the summarizer, speech
+# synthesis and the writers. The text lives in one string; pages, blocks
+# (paragraphs and headings) and sentences are offsets into it kept in NumPy
+# arrays, so a 1,000-page book is one buffer plus a few integer arrays rather
+# than lists of small strings. Sentences are split once, when the document is
+# built; consumers slice them out of the buffer as they go.
+
+PARAGRAPH = 0
+HEADING = 1
+
+# A run of non-blank lines
+_BLOCK = re.compile(r"\S[^\n]*(?:\n[ \t]*\S[^\n]*)*")
+_HEADING_END = re.compile(r"[.!?,;:\"'”’)\]]$")
+_ALNUM = re.compile(r"\w")
+
+_tokenizers = {}
+
+
+def sentence_tokenizer(language="english"):
+    """Punkt tokenizer for an NLTK language name, loaded once; English when the language has no model"""
+    if language not in _tokenizers:
+        try:
+            _tokenizers[language] = PunktTokenizer(language)
+        except LookupError:
+            if language == "english":
+                raise
+            _tokenizers[language] = sentence_tokenizer("english")
+    return _tokenizers[language]
+
+
+def is_heading(block):
+    """Short title-like block: a few words on one line, no closing punctuation"""
+    return (len(block) <= 80 and "\n" not in block and len(block.split()) <= 10
+            and not block[0].islower() and not _HEADING_END.search(block))
+
+
+def _offsets(values):
+    # array('i') is 4 bytes per offset, so the text is limited to 2 GB
+    return np.frombuffer(values, dtype=np.int32) if len(values) else np.zeros(0, dtype=np.int32)
+
+
+class Document:
+    """Text of a document in one buffer with page, block and sentence offsets"""
+
+    def __init__(self, text, page_starts, page_numbers, block_starts, block_ends, block_kinds,
+                 sentence_starts, sentence_ends, language="english"):
+        self.text = text
+        self.page_starts = page_starts
+        self.page_numbers = page_numbers
+        self.block_starts = block_starts
+        self.block_ends = block_ends
+        self.block_kinds = block_kinds
+        self.sentence_starts = sentence_starts
+        self.sentence_ends = sentence_ends
+        self.language = language
+
+    @classmethod
+    def build(cls, chunks, page_numbers=None, language="english"):
+        """Build from page texts, one chunk per page (0-based page_numbers; 0, 1, ... by default)
+
+        Blocks are separated by blank lines and stored with a blank line
+        between them, the layout TextCleaner produces. Chunks beyond
+        page_numbers, such as a paragraph TextCleaner carried past the last
+        page, belong to the last page.
+        """
+        chunks = [chunks] if isinstance(chunks, str) else chunks
+        page_numbers = list(page_numbers) if page_numbers is not None else None
+        tokenizer = sentence_tokenizer(language)
+        parts = []
+        offset = 0
+        pages = array("i")
+        numbers = array("i")
+        block_starts, block_ends, kinds = array("i"), array("i"), array("B")
+        sentence_starts, sentence_ends = array("i"), array("i")
+
+        for index, chunk in enumerate(chunks):
+            if page_numbers is None or index < len(page_numbers) or not numbers:
+                pages.append(offset)
+                numbers.append(page_numbers[index] if page_numbers is not None and index < len(page_numbers) else index)
+            for match in _BLOCK.finditer(chunk):
+                block = match.group().rstrip()
+                block_starts.append(offset)
+                block_ends.append(offset + len(block))
+                kinds.append(HEADING if is_heading(block) else PARAGRAPH)
+                for start, end in tokenizer.span_tokenize(block):
+                    # Fragments with nothing to read or score ("...", "—") are dropped here, once
+                    if _ALNUM.search(block, start, end):
+                        sentence_starts.append(offset + start)
+                        sentence_ends.append(offset + end)
+                parts.append(block)
+                parts.append("\n\n")
+                offset += len(block) + 2
+
+        return cls("".join(parts), _offsets(pages), _offsets(numbers), _offsets(block_starts),
+                   _offsets(block_ends), np.frombuffer(kinds, dtype=np.uint8) if kinds else np.zeros(0, dtype=np.uint8),
+                   _offsets(sentence_starts), _offsets(sentence_ends), language)
+
+    def __len__(self):
+        return len(self.text)
+
+    @property
+    def num_pages(self):
+        return len(self.page_starts)
+
+    @property
+    def num_blocks(self):
+        return len(self.block_starts)
+
+    @property
+    def num_sentences(self):
+        return len(self.sentence_starts)
+
+    @property
+    def nbytes(self):
+        """Memory held by the buffer and the offset arrays"""
+        arrays = (self.page_starts, self.page_numbers, self.block_starts, self.block_ends,
+                  self.block_kinds, self.sentence_starts, self.sentence_ends)
+        return sys.getsizeof(self.text) + sum(a.nbytes for a in arrays)
+
+    def sentence(self, i):
+        return self.text[self.sentence_starts[i]:self.sentence_ends[i]]
+
+    def sentences(self, first=0, last=None):
+        """Yield sentences first..last-1 in document order"""
+        text = self.text
+        for start, end in zip(self.sentence_starts[first:last].tolist(), self.sentence_ends[first:last].tolist()):
+            yield text[start:end]
+
+    def blocks(self):
+        """Yield (kind, text) for each block, kind being PARAGRAPH or HEADING"""
+        text = self.text
+        for start, end, kind in zip(self.block_starts.tolist(), self.block_ends.tolist(), self.block_kinds.tolist()):
+            yield kind, text[start:end]
+
+    def page(self, i):
+        """Text of the i-th extracted page (not the PDF page number; see page_numbers)"""
+        end = self.page_starts[i + 1] if i + 1 < len(self.page_starts) else len(self.text)
+        return self.text[self.page_starts[i]:end]
+
+    def pages(self):
+        for i in range(self.num_pages):
+            yield self.page(i)
+
+    def page_of(self, offset):
+        """PDF page number (0-based) of the text at offset"""
+        return int(self.page_numbers[max(0, np.searchsorted(self.page_starts, offset, side="right") - 1)])
+
+    def sentence_page(self, i):
+        return self.page_of(self.sentence_starts[i])
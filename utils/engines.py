@@ -0,0 +1,445 @@
+
+import os
+import ssl
+import time
+import random
+import base64
+import asyncio
+import threading
+from collections import deque
+from urllib.parse import urlsplit, urljoin, unquote
+from urllib.request import getproxies, proxy_bypass
+
+from utils.metrics import REGISTRY, Counter, Gauge, backend_call
+
+# Client for the network speech engines (gTTS, Google speech recognition).
+# Requests run on one asyncio loop in a background thread, so the converters'
+# worker threads share keep-alive connections instead of opening one per call.
+# Each backend gets bounded concurrency, a timeout per attempt, retries with
+# jittered exponential backoff and a circuit breaker; callers catch
+# EngineError to fail over to a local engine. Redirects are followed, and
+# HTTP_PROXY/HTTPS_PROXY/NO_PROXY are honoured like urllib does (http://
+# proxies; HTTPS goes through a CONNECT tunnel).
+
+RETRIES = REGISTRY.register(Counter(
+    "backend_retries_total", "Backend requests retried after a transient failure", ("backend",)))
+CIRCUIT_OPEN = REGISTRY.register(Gauge(
+    "backend_circuit_open", "1 while a backend's circuit breaker is open", ("backend",)))
+
+# Worth another attempt: the server is overloaded or briefly broken
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+# 307/308 repeat the request as is; 301/302/303 continue with a GET, as browsers and urllib do
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+# Responses that never carry a body, whatever their headers say (RFC 7230 3.3.3)
+NO_BODY_STATUSES = (204, 304)
+
+
+class EngineError(Exception):
+    """A backend request failed for good (after retries) or was not attempted"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class CircuitOpenError(EngineError):
+    """The backend failed repeatedly and is being skipped for a while"""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failed calls; after reset_seconds lets one trial call through"""
+
+    def __init__(self, backend, failure_threshold=5, reset_seconds=30.0):
+        self.backend = backend
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+            CIRCUIT_OPEN.set(0, backend=self.backend)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                # A failed trial reopens the breaker for another full period
+                self.opened_at = time.monotonic()
+                CIRCUIT_OPEN.set(1, backend=self.backend)
+            self._trial = False
+
+
+class _Connection:
+    def __init__(self, reader, writer, proxy_headers=None):
+        self.reader = reader
+        self.writer = writer
+        self.idle_since = time.monotonic()
+        # Set for plain HTTP through a proxy: requests name the absolute URL and carry these headers
+        self.proxy_headers = proxy_headers
+
+    def close(self):
+        self.writer.close()
+
+
+class _LatencyWindow:
+    """Recent request latencies and totals for one backend"""
+
+    def __init__(self, size=2048):
+        self.samples = deque(maxlen=size)
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.fallbacks = 0
+
+    def summary(self, window_seconds=60.0):
+        now = time.monotonic()
+        recent = [latency for finished, latency in self.samples if now - finished <= window_seconds]
+        latencies = sorted(latency for _, latency in self.samples)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "fallbacks": self.fallbacks,
+            "requests_per_second": len(recent) / window_seconds,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+        }
+
+
+class EngineClient:
+    """Pooled keep-alive HTTP/1.1 client on a background asyncio loop"""
+
+    def __init__(self, max_connections=None, timeout=None, retries=None, backoff=0.25,
+                 max_backoff=4.0, keepalive_seconds=30.0, failure_threshold=5, reset_seconds=30.0):
+        env = os.environ.get
+        # Concurrent requests (and open connections) per host
+        self.max_connections = max_connections or int(env("ENGINE_MAX_CONNECTIONS", 8))
+        self.timeout = timeout or float(env("ENGINE_TIMEOUT", 15))
+        self.retries = retries if retries is not None else int(env("ENGINE_RETRIES", 3))
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.keepalive_seconds = keepalive_seconds
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        self._idle = {}
+        self._limits = {}
+        self._breakers = {}
+        self._stats = {}
+        self._ssl = None
+        self._proxies = {}
+
+    def _ensure_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="engine-client", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def breaker(self, backend):
+        if backend not in self._breakers:
+            self._breakers[backend] = CircuitBreaker(backend, self.failure_threshold, self.reset_seconds)
+        return self._breakers[backend]
+
+    def _window(self, backend):
+        if backend not in self._stats:
+            self._stats[backend] = _LatencyWindow()
+        return self._stats[backend]
+
+    def record_fallback(self, backend):
+        self._window(backend).fallbacks += 1
+
+    def stats(self):
+        """Per-backend totals, requests/sec over the last minute and latency percentiles"""
+        result = {}
+        for backend, window in list(self._stats.items()):
+            result[backend] = window.summary()
+            result[backend]["circuit"] = self.breaker(backend).state
+        return result
+
+    # Connections
+
+    def _proxy(self, origin):
+        """(host, port, headers) of the proxy for origin from the environment, or None"""
+        if origin not in self._proxies:
+            scheme, host, port = origin
+            proxy = getproxies().get(scheme)
+            if not proxy or proxy_bypass(host):
+                self._proxies[origin] = None
+            else:
+                parts = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+                headers = {}
+                if parts.username:
+                    credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+                    headers["Proxy-Authorization"] = "Basic " + base64.b64encode(credentials.encode()).decode()
+                self._proxies[origin] = (parts.hostname, parts.port or 80, headers)
+        return self._proxies[origin]
+
+    def _context(self):
+        if self._ssl is None:
+            self._ssl = ssl.create_default_context()
+        return self._ssl
+
+    async def _connect(self, origin):
+        scheme, host, port = origin
+        proxy = self._proxy(origin)
+        if proxy is None:
+            reader, writer = await asyncio.open_connection(
+                host, port, ssl=self._context() if scheme == "https" else None)
+            return _Connection(reader, writer)
+
+        proxy_host, proxy_port, proxy_headers = proxy
+        reader, writer = await asyncio.open_connection(proxy_host, proxy_port)
+        if scheme != "https":
+            return _Connection(reader, writer, proxy_headers)
+        try:
+            lines = [f"CONNECT {host}:{port} HTTP/1.1", f"Host: {host}:{port}"]
+            lines += [f"{name}: {value}" for name, value in proxy_headers.items()]
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+            await writer.drain()
+            status_line, status, _ = await self._read_head(reader)
+            if status // 100 != 2:
+                raise ConnectionRefusedError(f"proxy refused the tunnel: {status_line.decode('latin-1').strip()}")
+            await writer.start_tls(self._context(), server_hostname=host)
+        except BaseException:
+            writer.close()
+            raise
+        return _Connection(reader, writer)
+
+    def _checkout(self, origin):
+        """An idle pooled connection for origin, or None"""
+        idle = self._idle.setdefault(origin, [])
+        while idle:
+            connection = idle.pop()
+            if (time.monotonic() - connection.idle_since < self.keepalive_seconds
+                    and not connection.reader.at_eof()):
+                return connection
+            connection.close()
+        return None
+
+    def _checkin(self, origin, connection):
+        connection.idle_since = time.monotonic()
+        self._idle.setdefault(origin, []).append(connection)
+
+    @staticmethod
+    async def _read_head(reader):
+        """Read a status line and headers; returns (status_line, status, headers)"""
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed before the response")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status_line, status, headers
+
+    @staticmethod
+    async def _exchange(connection, method, target, host, body, headers):
+        """Send one request and read the response; returns (status, body, headers, keep_alive)"""
+        if connection.proxy_headers is not None:
+            target = f"http://{host}{target}"
+            headers = {**headers, **connection.proxy_headers}
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {host}", "Connection: keep-alive",
+                 f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()
+                  if name.lower() not in ("host", "connection", "content-length")]
+        connection.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await connection.writer.drain()
+
+        reader = connection.reader
+        status_line, status, response_headers = await EngineClient._read_head(reader)
+        while 100 <= status < 200:
+            # Interim responses (100 Continue, 103 Early Hints) precede the real one
+            status_line, status, response_headers = await EngineClient._read_head(reader)
+
+        connection_header = response_headers.get("connection", "").lower()
+        if status_line.startswith(b"HTTP/1.0"):
+            keep_alive = connection_header == "keep-alive"
+        else:
+            keep_alive = connection_header != "close"
+        if method == "HEAD" or status in NO_BODY_STATUSES:
+            data = b""
+        elif response_headers.get("transfer-encoding", "").lower().endswith("chunked"):
+            parts = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # Trailers end with an empty line
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                parts.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            data = b"".join(parts)
+        elif "content-length" in response_headers:
+            data = await reader.readexactly(int(response_headers["content-length"]))
+        else:
+            data = await reader.read()
+            keep_alive = False
+        return status, data, response_headers, keep_alive
+
+    async def _attempt(self, origin, method, target, body, headers):
+        connection = self._checkout(origin)
+        reused = connection is not None
+        if connection is None:
+            connection = await self._connect(origin)
+        # Host header with the port when it is not the scheme's default
+        host = origin[1] if origin[2] == (443 if origin[0] == "https" else 80) else f"{origin[1]}:{origin[2]}"
+        try:
+            status, data, response_headers, keep_alive = await self._exchange(
+                connection, method, target, host, body, headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            connection.close()
+            if not reused:
+                raise
+            # The server dropped an idle keep-alive connection; that is not a failed attempt
+            connection = await self._connect(origin)
+            try:
+                status, data, response_headers, keep_alive = await self._exchange(
+                    connection, method, target, host, body, headers)
+            except BaseException:
+                connection.close()
+                raise
+        except BaseException:
+            connection.close()
+            raise
+        if keep_alive:
+            self._checkin(origin, connection)
+        else:
+            connection.close()
+        return status, data, response_headers
+
+    @staticmethod
+    def _route(url):
+        parts = urlsplit(url)
+        origin = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        return origin, target
+
+    async def _fetch(self, backend, method, url, body, headers, timeout):
+        """One attempt, following redirects; returns the final response's (status, body)"""
+        for _ in range(MAX_REDIRECTS + 1):
+            origin, target = self._route(url)
+            if origin not in self._limits:
+                self._limits[origin] = asyncio.Semaphore(self.max_connections)
+            async with self._limits[origin]:
+                status, data, response_headers = await asyncio.wait_for(
+                    self._attempt(origin, method, target, body, headers), timeout)
+            location = response_headers.get("location")
+            if status not in REDIRECT_STATUSES or not location:
+                return status, data
+            url = urljoin(url, location)
+            if status in (301, 302, 303) and method not in ("GET", "HEAD"):
+                method, body = "GET", b""
+                headers = {name: value for name, value in headers.items()
+                           if name.lower() not in ("content-type", "content-length")}
+        raise EngineError(f"{backend} redirected more than {MAX_REDIRECTS} times", status)
+
+    async def request_async(self, backend, method, url, body=b"", headers=None, timeout=None):
+        """Send a request with retries; returns the response body or raises EngineError
+
+        Only connection errors, timeouts and RETRY_STATUSES count against the
+        circuit breaker. Any other error status is the request's fault, not
+        the service's: it fails the call without retries and without pushing
+        other sessions onto the fallback engine.
+        """
+        breaker = self.breaker(backend)
+        window = self._window(backend)
+        if not breaker.allow():
+            raise CircuitOpenError(f"{backend} is unavailable (circuit open)")
+
+        error = None
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    window.retries += 1
+                    RETRIES.inc(backend=backend)
+                    # Full jitter keeps retrying clients from hitting the server in lockstep
+                    await asyncio.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+                started = time.monotonic()
+                try:
+                    with backend_call(backend):
+                        status, data = await self._fetch(backend, method, url, body, headers or {},
+                                                         timeout or self.timeout)
+                        if status >= 300:
+                            raise EngineError(f"{backend} returned HTTP {status}", status)
+                except EngineError as e:
+                    error = e
+                    if e.status not in RETRY_STATUSES:
+                        # The service answered; it is up
+                        window.errors += 1
+                        breaker.record_success()
+                        raise
+                    continue
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                    error = EngineError(f"{backend} request failed: {e!r}")
+                    continue
+                finally:
+                    window.requests += 1
+                window.samples.append((time.monotonic(), time.monotonic() - started))
+                breaker.record_success()
+                return data
+        except EngineError:
+            raise
+        except BaseException:
+            # Cancelled or broken in an unexpected way; count it so a half-open trial is not left hanging
+            window.errors += 1
+            breaker.record_failure()
+            raise
+
+        window.errors += 1
+        breaker.record_failure()
+        raise error
+
+    def request(self, backend, method, url, body=b"", headers=None, timeout=None):
+        """Blocking request_async for worker threads"""
+        future = asyncio.run_coroutine_threadsafe(
+            self.request_async(backend, method, url, body, headers, timeout), self._ensure_loop())
+        return future.result()
+
+    def post(self, backend, url, body, headers=None, timeout=None):
+        return self.request(backend, "POST", url, body, headers, timeout)
+
+    def close(self):
+        """Close pooled connections"""
+        for connections in self._idle.values():
+            for connection in connections:
+                connection.close()
+        self._idle.clear()
+
+
+engine_client = EngineClient()
@@ -0,0 +1,344 @@
+
+import os
+import time
+import bisect
+import functools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Process-wide metrics in the Prometheus text exposition format.
+# Each replica exposes its own registry, either over HTTP (METRICS_PORT)
+# or as a file refreshed for a sidecar/textfile collector (METRICS_FILE).
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base for labelled metrics; one child value per label combination"""
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_child(key, value))
+        return lines
+
+    def _render_child(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, e.g. jobs in flight"""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Bucketed latency distribution, from which percentiles are computed at query time"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._values.get(key)
+            if child is None:
+                child = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            child["counts"][index] += 1
+            child["sum"] += value
+            child["count"] += 1
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+    def _render_child(self, key, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, child["counts"]):
+            cumulative += count
+            le = _format_labels(self.label_names + ("le",), key + (_format_value(float(bound)),))
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child['sum'])}")
+        lines.append(f"{self.name}_count{labels} {child['count']}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                return self._metrics[metric.name]
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self):
+        """Text exposition of every registered metric"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONVERSIONS = REGISTRY.register(Counter(
+    "converter_conversions_total", "Conversions finished, by converter and status", ("converter", "status")))
+CONVERSION_SECONDS = REGISTRY.register(Histogram(
+    "converter_conversion_seconds", "Conversion latency in seconds", ("converter",),
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)))
+IN_PROGRESS = REGISTRY.register(Gauge(
+    "converter_jobs_in_progress", "Conversions currently running", ("converter",)))
+BYTES_PROCESSED = REGISTRY.register(Counter(
+    "converter_bytes_total", "Bytes read and written by converters", ("converter", "direction")))
+BACKEND_REQUESTS = REGISTRY.register(Counter(
+    "backend_requests_total", "Calls to speech and media backends", ("backend", "status")))
+BACKEND_SECONDS = REGISTRY.register(Histogram(
+    "backend_request_seconds", "Backend call latency in seconds", ("backend",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "cache_requests_total", "Cache lookups by cache and result", ("cache", "result")))
+
+
+def payload_size(value):
+    """Bytes represented by an argument or result: data length or file size"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        if len(value) < 4096 and os.path.isfile(value):
+            return os.path.getsize(value)
+        return len(value.encode("utf-8", errors="ignore"))
+    size = getattr(value, "size", None)
+    return size if isinstance(size, int) else 0
+
+
+def observe_conversion(converter):
+    """Decorator counting calls, latency, in-flight jobs and bytes for one converter
+
+    Converters report failures by returning None, so that is counted as an error.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            IN_PROGRESS.inc(converter=converter)
+            started = time.perf_counter()
+            status = "error"
+            try:
+                result = func(*args, **kwargs)
+                if result is not None:
+                    status = "ok"
+                    BYTES_PROCESSED.inc(payload_size(args[0]) if args else 0, converter=converter, direction="in")
+                    BYTES_PROCESSED.inc(payload_size(result), converter=converter, direction="out")
+                return result
+            finally:
+                IN_PROGRESS.dec(converter=converter)
+                CONVERSION_SECONDS.observe(time.perf_counter() - started, converter=converter)
+                CONVERSIONS.inc(converter=converter, status=status)
+        return wrapper
+    return decorator
+
+
+def observe_stream(converter):
+    """observe_conversion for generator functions, timing the whole iteration
+
+    A generator closed early (e.g. the user stopped the page) counts as cancelled.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            IN_PROGRESS.inc(converter=converter)
+            started = time.perf_counter()
+            status = "error"
+            items = 0
+            try:
+                for item in func(*args, **kwargs):
+                    items += 1
+                    yield item
+                if items:
+                    status = "ok"
+                    BYTES_PROCESSED.inc(payload_size(args[0]) if args else 0, converter=converter, direction="in")
+            except GeneratorExit:
+                status = "cancelled"
+                raise
+            finally:
+                IN_PROGRESS.dec(converter=converter)
+                CONVERSION_SECONDS.observe(time.perf_counter() - started, converter=converter)
+                CONVERSIONS.inc(converter=converter, status=status)
+        return wrapper
+    return decorator
+
+
+class backend_call:
+    """Context manager recording one backend request's latency and outcome"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        BACKEND_SECONDS.observe(time.perf_counter() - self.started, backend=self.backend)
+        BACKEND_REQUESTS.inc(backend=self.backend, status="error" if exc_type else "ok")
+        return False
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_exporter_lock = threading.Lock()
+_exporters = {}
+
+
+def start_http_exporter(port, host="0.0.0.0"):
+    """Serve /metrics on a daemon thread; safe to call on every script rerun"""
+    with _exporter_lock:
+        if ("http", port) not in _exporters:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            _exporters[("http", port)] = server
+        return _exporters[("http", port)]
+
+
+def write_textfile(path):
+    """Atomically write the current exposition to path"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp_path, path)
+
+
+def start_file_exporter(path, interval=15):
+    """Refresh path every interval seconds for a sidecar to scrape"""
+    with _exporter_lock:
+        if ("file", path) in _exporters:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        def loop():
+            while True:
+                try:
+                    write_textfile(path)
+                except OSError:
+                    pass
+                time.sleep(interval)
+
+        threading.Thread(target=loop, name="metrics-file", daemon=True).start()
+        _exporters[("file", path)] = True
+
+
+def start_exporters_from_env():
+    """Start whichever exporters METRICS_PORT / METRICS_FILE ask for"""
+    port = os.environ.get("METRICS_PORT")
+    if port:
+        try:
+            start_http_exporter(int(port))
+        except OSError:
+            # Another process on this host already owns the port
+            pass
+    path = os.environ.get("METRICS_FILE")
+    if path:
+        start_file_exporter(path, float(os.environ.get("METRICS_INTERVAL", 15)))
@@ -0,0 +1,490 @@
+
+import os
+import gc
+import sys
+import time
+import queue
+import atexit
+import select
+import signal
+import socket
+import shutil
+import tempfile
+import importlib
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from multiprocessing.connection import Client, Connection
+
+import numpy as np
+
+from utils.metrics import REGISTRY, Counter, Gauge, Histogram
+
+# Warm worker processes for heavy local models (offline speech recognition,
+# embedding or transformer models). Loading such a model inside the Streamlit
+# script process costs seconds on every cache invalidation and a private copy
+# of the weights in every process. Instead one "zygote" process per model is
+# started as a fresh interpreter (not a fork of the threaded server, and
+# without re-running its main script), loads the model once and forks
+# MODEL_POOL_WORKERS workers from it: the workers share the loaded weights
+# copy-on-write, and weights mapped with load_weights are shared through the
+# page cache as well. Workers accept batches on a Unix socket in a private
+# directory, exit after MODEL_POOL_MAX_REQUESTS batches (the zygote forks a
+# fresh one from the warm image, so recycling costs a fork, not a reload) and
+# exit if the zygote dies. A worker that has not answered a batch within
+# MODEL_POOL_TIMEOUT seconds is killed and replaced. Callers' single inputs
+# are coalesced into batches of up to MODEL_POOL_BATCH, waiting at most
+# MODEL_POOL_BATCH_WAIT_MS for company. MODEL_POOL_WORKERS=0 (the default)
+# keeps every model in-process, as before.
+
+MODEL_POOL_WORKERS = int(os.environ.get("MODEL_POOL_WORKERS", 0))
+
+POOL_REQUESTS = REGISTRY.register(Counter(
+    "model_pool_requests_total", "Batches sent to model worker processes", ("model", "status")))
+POOL_SECONDS = REGISTRY.register(Histogram(
+    "model_pool_seconds", "Round trip of one batch to a model worker", ("model",),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)))
+POOL_BATCH = REGISTRY.register(Histogram(
+    "model_pool_batch_size", "Inputs per batch sent to a model worker", ("model",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)))
+POOL_WORKERS = REGISTRY.register(Gauge(
+    "model_pool_workers", "Live worker processes per model", ("model",)))
+POOL_RECYCLED = REGISTRY.register(Gauge(
+    "model_pool_recycled_workers", "Workers replaced since the pool started (recycled or crashed)", ("model",)))
+
+# name -> "module:function"; the function takes the pool's args and returns a
+# predict(batch) callable mapping a list of inputs to a list of outputs. Only
+# the zygote calls it, so heavy imports belong inside the loader.
+MODELS = {
+    "sphinx": "utils.models:load_sphinx",
+}
+
+
+class ModelError(Exception):
+    """A model could not be loaded, or failed on a batch"""
+
+
+def register_model(name, loader):
+    """Make a loader ("module:function") available to model_pool under name"""
+    MODELS[name] = loader
+
+
+def load_weights(path):
+    """Weights from an .npy file, memory-mapped read-only
+
+    Mapped pages come from the page cache, so every worker process (and every
+    replica on the host) shares one copy, and only the pages used are read.
+    """
+    return np.load(path, mmap_mode="r")
+
+
+def load_sphinx(language="en-US"):
+    """Warm CMU Sphinx decoder: transcripts (None for no speech) of 16 kHz 16-bit mono PCM
+
+    Same model files and settings as Recognizer.recognize_sphinx, which builds
+    a new decoder on every call.
+    """
+    import speech_recognition as sr
+    from pocketsphinx import pocketsphinx
+
+    directory = os.path.join(os.path.dirname(os.path.realpath(sr.__file__)), "pocketsphinx-data", language)
+    if not os.path.isdir(directory):
+        raise ModelError(f"missing PocketSphinx language data directory: {directory}")
+    config = pocketsphinx.Config()
+    config.set_string("-hmm", os.path.join(directory, "acoustic-model"))
+    config.set_string("-lm", os.path.join(directory, "language-model.lm.bin"))
+    config.set_string("-dict", os.path.join(directory, "pronounciation-dictionary.dict"))
+    config.set_string("-logfn", os.devnull)
+    decoder = pocketsphinx.Decoder(config)
+
+    def predict(batch):
+        transcripts = []
+        for raw in batch:
+            decoder.start_utt()
+            decoder.process_raw(raw, False, True)
+            decoder.end_utt()
+            hypothesis = decoder.hyp()
+            transcripts.append(hypothesis.hypstr if hypothesis is not None else None)
+        return transcripts
+
+    return predict
+
+
+def process_memory(pid="self"):
+    """Resident, proportional (shared pages split between processes) and private MB; {} if unknown"""
+    fields = {"Rss": "rss_mb", "Pss": "pss_mb", "Private_Clean": "private_mb", "Private_Dirty": "private_mb"}
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in fields:
+                    key = fields[name]
+                    memory[key] = memory.get(key, 0.0) + int(value.split()[0]) / 1024
+    except (OSError, ValueError):
+        return {}
+    return memory
+
+
+# Worker and zygote processes
+
+def _handle(predict, request, served, started):
+    if request[0] == "ping":
+        return "ok", {"pid": os.getpid(), "served": served, "uptime": time.time() - started, **process_memory()}
+    try:
+        return "ok", list(predict(request[1]))
+    except Exception as e:
+        return "error", f"{type(e).__name__}: {e}"
+
+
+def _worker_main(predict, server, max_requests, zygote):
+    """Serve batches from the shared listening socket until max_requests or the zygote is gone"""
+    gc.enable()
+    served = 0
+    started = time.time()
+    while served < max_requests:
+        if os.getppid() != zygote:
+            return
+        readable, _, _ = select.select([server], [], [], 1.0)
+        if not readable:
+            continue
+        try:
+            client, _ = server.accept()
+        except BlockingIOError:
+            # Another worker took this connection
+            continue
+        client.setblocking(True)
+        try:
+            with Connection(client.detach()) as connection:
+                # Tells the caller whom to kill if this batch hangs
+                connection.send(os.getpid())
+                request = connection.recv()
+                connection.send(_handle(predict, request, served, started))
+        except (EOFError, OSError):
+            continue
+        if request[0] == "infer":
+            served += 1
+
+
+def _fork_worker(predict, server, max_requests, control):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            control.close()
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            _worker_main(predict, server, max_requests, os.getppid())
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def _zygote_main(fd):
+    """Load the model once, fork the workers and replace them as they exit"""
+    control = Connection(fd)
+    path, loader, args, address, workers, max_requests = control.recv()
+    # The app's import path, so loaders outside utils/ resolve too
+    sys.path[:0] = [entry for entry in path if entry not in sys.path]
+    try:
+        started = time.perf_counter()
+        module, function = loader.split(":")
+        predict = getattr(importlib.import_module(module), function)(*args)
+        load_seconds = time.perf_counter() - started
+    except Exception as e:
+        control.send(("error", f"{type(e).__name__}: {e}"))
+        return
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(address)
+    server.listen(64)
+    server.setblocking(False)
+    # Leave what is loaded so far out of garbage collection, so workers scanning
+    # their heap do not write to (and so copy) the model's pages
+    gc.disable()
+    gc.freeze()
+
+    children = {_fork_worker(predict, server, max_requests, control) for _ in range(workers)}
+    recycled = crashed = 0
+    control.send(("ok", {"pid": os.getpid(), "load_seconds": load_seconds}))
+    try:
+        while True:
+            if control.poll(0.5):
+                try:
+                    message = control.recv()
+                except EOFError:
+                    # The app process is gone
+                    break
+                if message == "stop":
+                    break
+                control.send(("ok", {"workers": len(children), "pids": sorted(children), "recycled": recycled,
+                                     "crashed": crashed, "load_seconds": load_seconds}))
+            while True:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+                if pid == 0:
+                    break
+                children.discard(pid)
+                recycled += 1
+                if os.waitstatus_to_exitcode(status) != 0:
+                    crashed += 1
+                    # Do not spin if the model kills every worker it is given to
+                    time.sleep(0.5)
+                children.add(_fork_worker(predict, server, max_requests, control))
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        server.close()
+
+
+class ModelPool:
+    """Warm worker processes for one registered model, fed batches over a Unix socket"""
+
+    def __init__(self, name, args=(), workers=None, max_requests=None, batch_size=None, batch_wait=None,
+                 timeout=None, start_timeout=300.0):
+        if name not in MODELS:
+            raise ModelError(f"unknown model {name!r}; add it with register_model")
+        env = os.environ.get
+        self.name = name
+        self.args = tuple(args)
+        self.workers = workers or max(1, MODEL_POOL_WORKERS)
+        self.max_requests = max_requests or int(env("MODEL_POOL_MAX_REQUESTS", 500))
+        self.batch_size = batch_size or int(env("MODEL_POOL_BATCH", 16))
+        self.batch_wait = batch_wait if batch_wait is not None else float(env("MODEL_POOL_BATCH_WAIT_MS", 5)) / 1000
+        # Seconds one batch may take before its worker is considered hung
+        self.timeout = timeout or float(env("MODEL_POOL_TIMEOUT", 60))
+        self.start_timeout = start_timeout
+        self.address = None
+        self.load_seconds = None
+        self.starts = 0
+        self._zygote = None
+        self._control = None
+        self._directory = None
+        # Guards start/stop and the control pipe
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._batcher = None
+        self._executor = None
+        self._slots = None
+
+    @property
+    def alive(self):
+        return self._zygote is not None and self._zygote.poll() is None
+
+    def start(self):
+        """Start the zygote and wait for the model to load; no-op while the pool is alive"""
+        with self._lock:
+            if self.alive:
+                return self
+            self._stop()
+            # mkdtemp is private to this user, so nobody else can send requests
+            self._directory = tempfile.mkdtemp(prefix=f"model-pool-{self.name}-")
+            self.address = os.path.join(self._directory, "socket")
+            ours, theirs = socket.socketpair()
+            root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            self._zygote = subprocess.Popen(
+                [sys.executable, "-c", f"import sys; sys.path.insert(0, {root!r}); "
+                 f"from utils.models import _zygote_main; _zygote_main({theirs.fileno()})"],
+                pass_fds=(theirs.fileno(),), stdin=subprocess.DEVNULL)
+            theirs.close()
+            self._control = Connection(ours.detach())
+            try:
+                self._control.send((sys.path, MODELS[self.name], self.args, self.address,
+                                    self.workers, self.max_requests))
+                if not self._control.poll(self.start_timeout):
+                    raise ModelError(f"{self.name} did not load within {self.start_timeout:.0f}s")
+                status, value = self._control.recv()
+            except (OSError, EOFError):
+                status, value = "error", f"exit code {self._zygote.poll()}"
+            except ModelError:
+                self._stop()
+                raise
+            if status != "ok":
+                self._stop()
+                raise ModelError(f"{self.name} could not be loaded: {value}")
+            self.load_seconds = value["load_seconds"]
+            self.starts += 1
+            POOL_WORKERS.set(self.workers, model=self.name)
+        return self
+
+    def _stop(self):
+        if self._control is not None:
+            try:
+                self._control.send("stop")
+            except OSError:
+                pass
+            self._control.close()
+            self._control = None
+        if self._zygote is not None:
+            try:
+                self._zygote.wait(5)
+            except subprocess.TimeoutExpired:
+                self._zygote.kill()
+                self._zygote.wait()
+            self._zygote = None
+            POOL_WORKERS.set(0, model=self.name)
+        if self._directory:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+    def close(self):
+        """Stop the zygote and its workers"""
+        with self._lock:
+            if self._batcher is not None:
+                self._queue.put(None)
+                self._batcher = None
+                self._executor.shutdown(wait=False)
+            self._stop()
+
+    def _request(self, request, timeout):
+        """Send one request and wait up to timeout seconds for its answer
+
+        A worker that took the request but did not answer is killed; the zygote
+        forks a replacement.
+        """
+        deadline = time.monotonic() + timeout
+        with Client(self.address, family="AF_UNIX") as connection:
+            connection.send(request)
+            if not connection.poll(max(0.0, deadline - time.monotonic())):
+                raise ModelError(f"{self.name}: no worker took the request within {timeout:.0f}s")
+            pid = connection.recv()
+            if not connection.poll(max(0.0, deadline - time.monotonic())):
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                raise ModelError(f"{self.name} worker {pid} did not answer within {timeout:.0f}s; replaced")
+            return connection.recv()
+
+    def infer_batch(self, inputs):
+        """Outputs for a list of inputs, computed by one worker in one request"""
+        inputs = list(inputs)
+        self.start()
+        started = time.perf_counter()
+        for attempt in range(2):
+            try:
+                status, value = self._request(("infer", inputs), self.timeout)
+                break
+            except ModelError:
+                POOL_REQUESTS.inc(model=self.name, status="timeout")
+                raise
+            except (OSError, EOFError) as e:
+                # The worker crashed mid-batch or the whole pool died; one retry on a restarted pool
+                if attempt:
+                    POOL_REQUESTS.inc(model=self.name, status="error")
+                    raise ModelError(f"{self.name} worker failed: {str(e) or type(e).__name__}")
+                self.start()
+        POOL_SECONDS.observe(time.perf_counter() - started, model=self.name)
+        POOL_BATCH.observe(len(inputs), model=self.name)
+        POOL_REQUESTS.inc(model=self.name, status=status)
+        if status != "ok":
+            raise ModelError(value)
+        return value
+
+    # Coalescing single inputs into batches
+
+    def _start_batcher(self):
+        with self._lock:
+            if self._batcher is None:
+                # One batch in flight per worker; while all are busy, inputs queue up into bigger batches
+                self._slots = threading.Semaphore(self.workers)
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"model-{self.name}")
+                self._batcher = threading.Thread(target=self._batch_loop, name=f"model-batcher-{self.name}",
+                                                 daemon=True)
+                self._batcher.start()
+
+    def _batch_loop(self):
+        while True:
+            self._slots.acquire()
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        try:
+            outputs = self.infer_batch([item for item, _ in batch])
+            for (_, future), output in zip(batch, outputs):
+                future.set_result(output)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def infer(self, item, timeout=None):
+        """Output for one input, batched with other callers' inputs
+
+        Raises ModelError when the batch fails, or when timeout (seconds,
+        including time queued behind other batches) passes first.
+        """
+        self._start_batcher()
+        future = Future()
+        self._queue.put((item, future))
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            raise ModelError(f"{self.name} gave no result within {timeout:g}s")
+
+    def health(self, timeout=5.0):
+        """The zygote's worker counts and one worker's ping; {"alive": False} when the pool is down"""
+        with self._lock:
+            if not self.alive:
+                POOL_WORKERS.set(0, model=self.name)
+                return {"alive": False, "starts": self.starts}
+            try:
+                self._control.send("stats")
+                if not self._control.poll(timeout):
+                    return {"alive": False, "starts": self.starts, "error": "zygote did not answer"}
+                _, info = self._control.recv()
+            except (OSError, EOFError) as e:
+                return {"alive": False, "starts": self.starts, "error": str(e)}
+        started = time.perf_counter()
+        try:
+            _, worker = self._request(("ping",), timeout)
+        except (OSError, EOFError, ModelError) as e:
+            return {"alive": False, "starts": self.starts, "error": str(e), **info}
+        POOL_WORKERS.set(info["workers"], model=self.name)
+        POOL_RECYCLED.set(info["recycled"], model=self.name)
+        return {"alive": True, "starts": self.starts, "ping_ms": (time.perf_counter() - started) * 1000,
+                "worker": worker, **info}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def model_pool(name, *args):
+    """The shared warm pool for a registered model, or None when pools are off or unsupported here
+
+    Pools need fork and Unix sockets, so on Windows models stay in-process.
+    The pool starts (and the model loads) on the first request.
+    """
+    if MODEL_POOL_WORKERS <= 0 or not hasattr(os, "fork") or not hasattr(socket, "AF_UNIX"):
+        return None
+    with _pools_lock:
+        key = (name,) + args
+        if key not in _pools:
+            _pools[key] = ModelPool(name, args)
+        return _pools[key]
+
+
+@atexit.register
+def _close_pools():
+    for pool in list(_pools.values()):
+        pool.close()
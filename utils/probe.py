@@ -0,0 +1,377 @@
+
+import os
+import struct
+import shutil
+import subprocess
+
+import PyPDF2
+
+# Upload-time probes. They read the PDF trailer, xref and page tree, or the
+# audio container headers, never the full content, so they are cheap enough to
+# run on every rerun and give estimates before the user starts a conversion.
+
+# Spoken words per minute at normal rate, matching SpeechSynthesizer.BASE_WPM
+WORDS_PER_MINUTE = 150
+# Bitrate of raw gTTS output, for "MP3 (original)"
+GTTS_KBPS = 32
+# Above this many pages, PDFs are streamed page by page into synthesis
+STREAM_PAGES = 200
+# Speech recognition handles at most about a minute per request
+LONG_AUDIO_SECONDS = 60
+
+
+def probe_pdf(fileobj, sample_pages=2):
+    """Page count, text-layer presence and words per page, from the xref and a few sampled pages
+
+    Returns None when the file cannot be parsed as a PDF.
+    """
+    position = fileobj.tell()
+    try:
+        reader = PyPDF2.PdfReader(fileobj)
+        info = {
+            "pages": 0,
+            "encrypted": reader.is_encrypted,
+            "text_layer": False,
+            "scanned_pages": 0,
+            "words_per_page": 0,
+            "title": None,
+        }
+        if reader.is_encrypted:
+            return info
+
+        info["pages"] = len(reader.pages)
+        metadata = reader.metadata
+        if metadata and metadata.title:
+            info["title"] = str(metadata.title)
+
+        # Spread the samples over the document; covers are often image-only
+        step = max(1, info["pages"] // (sample_pages + 1))
+        sampled = sorted({min(info["pages"] - 1, step * (i + 1)) for i in range(sample_pages)}) if info["pages"] else []
+        words = 0
+        for index in sampled:
+            page = reader.pages[index]
+            resources = page.get("/Resources") or {}
+            if hasattr(resources, "get_object"):
+                resources = resources.get_object()
+            if resources.get("/Font"):
+                info["text_layer"] = True
+                words += len((page.extract_text() or "").split())
+            elif resources.get("/XObject"):
+                info["scanned_pages"] += 1
+        if sampled:
+            info["words_per_page"] = words / len(sampled)
+        return info
+    except Exception:
+        return None
+    finally:
+        fileobj.seek(position)
+
+
+def plan_pdf(info, pages=None):
+    """Routing decisions for a probed PDF, or for the selected 0-based pages of it"""
+    if not info:
+        return {"needs_ocr": False, "stream_pages": False}
+    return {
+        "needs_ocr": not info["encrypted"] and info["pages"] > 0 and not info["text_layer"],
+        "stream_pages": (len(pages) if pages is not None else info["pages"]) >= STREAM_PAGES,
+    }
+
+
+def pdf_outline(fileobj):
+    """Bookmarked sections as dicts with title, level and 0-based first/last page"""
+    position = fileobj.tell()
+    try:
+        reader = PyPDF2.PdfReader(fileobj)
+        page_count = len(reader.pages)
+        entries = []
+
+        def walk(items, level):
+            for item in items:
+                if isinstance(item, list):
+                    walk(item, level + 1)
+                    continue
+                page = reader.get_destination_page_number(item)
+                if page is not None and 0 <= page < page_count:
+                    entries.append({"title": str(item.title), "level": level, "first": page})
+
+        walk(reader.outline, 0)
+    except Exception:
+        return []
+    finally:
+        fileobj.seek(position)
+
+    # A section runs until the next entry at the same or a higher level
+    for i, entry in enumerate(entries):
+        entry["last"] = page_count - 1
+        for later in entries[i + 1:]:
+            if later["level"] <= entry["level"]:
+                entry["last"] = max(entry["first"], later["first"] - 1)
+                break
+    return entries
+
+
+def parse_page_ranges(spec, page_count):
+    """Turn "1-5, 8, 12-" into sorted 0-based page indices; raises ValueError on bad input"""
+    pages = set()
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        first, dash, last = part.partition("-")
+        try:
+            start = int(first) if first else 1
+            end = (int(last) if last else page_count) if dash else start
+        except ValueError:
+            raise ValueError(f"'{part}' is not a page number or range")
+        if start < 1 or end > page_count or start > end:
+            raise ValueError(f"'{part}' is outside pages 1-{page_count}")
+        pages.update(range(start - 1, end))
+    if not pages:
+        raise ValueError("no pages selected")
+    return sorted(pages)
+
+
+def _bitrate_kbps(encoding):
+    if not encoding:
+        return GTTS_KBPS
+    args = encoding["args"]
+    if "-b:a" in args:
+        return int(args[args.index("-b:a") + 1].rstrip("k"))
+    return GTTS_KBPS
+
+
+def estimate_speech(words, rate=WORDS_PER_MINUTE, encoding=None):
+    """Expected audio minutes and output megabytes for speaking words at rate wpm"""
+    minutes = words / max(rate, 1)
+    size_mb = minutes * 60 * _bitrate_kbps(encoding) * 1000 / 8 / 1024 / 1024
+    return {"minutes": minutes, "size_mb": size_mb}
+
+
+def _probe_wav(f, size):
+    header = f.read(12)
+    if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    info = {"format": "wav"}
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        chunk_id, chunk_size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunk_id == b"fmt ":
+            fmt = f.read(chunk_size)
+            codec, channels, sample_rate, byte_rate, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+            info.update(codec="pcm" if codec in (1, 0xFFFE) else f"wav-{codec}",
+                        channels=channels, sample_rate=sample_rate, bits=bits, bitrate=byte_rate * 8)
+        elif chunk_id == b"data":
+            if chunk_size == 0xFFFFFFFF or chunk_size == 0:
+                # Streamed WAV without a final size
+                chunk_size = size - f.tell()
+            if info.get("bitrate"):
+                info["duration"] = chunk_size * 8 / info["bitrate"]
+            break
+        else:
+            f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+    return info
+
+
+_MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_RATES = [44100, 48000, 32000]
+
+
+def _probe_mp3(f, size):
+    head = f.read(10)
+    offset = 0
+    if head[:3] == b"ID3":
+        offset = 10 + ((head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9])
+    f.seek(offset)
+    window = f.read(64 * 1024)
+
+    for i in range(len(window) - 4):
+        if window[i] != 0xFF or (window[i + 1] & 0xE0) != 0xE0:
+            continue
+        b1, b2, b3 = window[i + 1], window[i + 2], window[i + 3]
+        version_bits, layer_bits = (b1 >> 3) & 3, (b1 >> 1) & 3
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+        # Only Layer III, valid bitrate and sample rate
+        if version_bits == 1 or layer_bits != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            continue
+        mpeg1 = version_bits == 3
+        sample_rate = _MP3_RATES[rate_index] // (1 if mpeg1 else 2 if version_bits == 2 else 4)
+        bitrate = _MP3_BITRATES[1 if mpeg1 else 2][bitrate_index] * 1000
+        channels = 1 if (b3 >> 6) == 3 else 2
+        samples_per_frame = 1152 if mpeg1 else 576
+
+        # A Xing/Info header in the first frame carries the frame count of VBR files
+        side_info = (32 if channels == 2 else 17) if mpeg1 else (17 if channels == 2 else 9)
+        tag = window[i + 4 + side_info:i + 4 + side_info + 12]
+        if tag[:4] in (b"Xing", b"Info") and struct.unpack(">I", tag[4:8])[0] & 1:
+            frames = struct.unpack(">I", tag[8:12])[0]
+            duration = frames * samples_per_frame / sample_rate
+        else:
+            duration = (size - offset - i) * 8 / bitrate
+        return {"format": "mp3", "codec": "mp3", "channels": channels, "sample_rate": sample_rate,
+                "duration": duration, "bitrate": (size - offset - i) * 8 / duration if duration else bitrate}
+    return None
+
+
+def _probe_flac(f, size):
+    if f.read(4) != b"fLaC":
+        return None
+    block = f.read(4)
+    if block[0] & 0x7F != 0:
+        return None
+    streaminfo = f.read(34)
+    bits = int.from_bytes(streaminfo[10:18], "big")
+    sample_rate = bits >> 44
+    total_samples = bits & ((1 << 36) - 1)
+    duration = total_samples / sample_rate if sample_rate else None
+    return {"format": "flac", "codec": "flac", "sample_rate": sample_rate,
+            "channels": ((bits >> 41) & 7) + 1, "bits": ((bits >> 36) & 31) + 1,
+            "duration": duration, "bitrate": size * 8 / duration if duration else None}
+
+
+def _probe_ogg(f, size):
+    page = f.read(27)
+    if page[:4] != b"OggS":
+        return None
+    segments = f.read(page[26])
+    packet = f.read(sum(segments))
+    if packet[:8] == b"OpusHead":
+        info = {"format": "ogg", "codec": "opus", "channels": packet[9],
+                "sample_rate": struct.unpack("<I", packet[12:16])[0]}
+        pre_skip, granule_rate = struct.unpack("<H", packet[10:12])[0], 48000
+    elif packet[:7] == b"\x01vorbis":
+        info = {"format": "ogg", "codec": "vorbis", "channels": packet[11],
+                "sample_rate": struct.unpack("<I", packet[12:16])[0]}
+        pre_skip, granule_rate = 0, info["sample_rate"]
+    else:
+        return None
+
+    # Duration is the granule position of the last page
+    f.seek(max(0, size - 64 * 1024))
+    tail = f.read()
+    last = tail.rfind(b"OggS")
+    if last != -1 and granule_rate:
+        granule = struct.unpack("<q", tail[last + 6:last + 14])[0]
+        info["duration"] = max(0, granule - pre_skip) / granule_rate
+        info["bitrate"] = size * 8 / info["duration"] if info["duration"] else None
+    return info
+
+
+def _mp4_boxes(f, end):
+    """Yield (type, payload start, payload end) for the boxes between f.tell() and end"""
+    while f.tell() + 8 <= end:
+        start = f.tell()
+        box_size, box_type = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if box_size == 1:
+            box_size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif box_size == 0:
+            box_size = end - start
+        if box_size < header:
+            return
+        yield box_type, start + header, start + box_size
+        f.seek(start + box_size)
+
+
+def _probe_mp4(f, size):
+    head = f.read(8)
+    if head[4:8] != b"ftyp":
+        return None
+    f.seek(0)
+    info = {"format": "mp4", "codec": None}
+    # Only moov and the boxes inside it are read, wherever moov sits in the file
+    containers = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+    def walk(end):
+        for box_type, start, box_end in _mp4_boxes(f, end):
+            if box_type in containers:
+                walk(box_end)
+            elif box_type == b"mvhd":
+                version = f.read(1)[0]
+                f.read(3)
+                if version == 1:
+                    f.read(16)
+                    timescale, duration = struct.unpack(">IQ", f.read(12))
+                else:
+                    f.read(8)
+                    timescale, duration = struct.unpack(">II", f.read(8))
+                info["duration"] = duration / timescale if timescale else None
+            elif box_type == b"stsd" and info["codec"] is None:
+                f.read(8)
+                entry = f.read(36)
+                info["codec"] = entry[4:8].decode("latin-1").strip()
+                info["channels"] = struct.unpack(">H", entry[24:26])[0]
+                info["sample_rate"] = struct.unpack(">I", entry[32:36])[0] >> 16
+            f.seek(box_end)
+
+    walk(size)
+    if info.get("duration"):
+        info["bitrate"] = size * 8 / info["duration"]
+    return info
+
+
+def _probe_ffprobe(path):
+    """Last resort for formats the header parsers do not know"""
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe or not path:
+        return None
+    result = subprocess.run(
+        [ffprobe, "-v", "error", "-select_streams", "a:0",
+         "-show_entries", "stream=codec_name,sample_rate,channels:format=duration,bit_rate,format_name",
+         "-of", "default=noprint_wrappers=1", path],
+        capture_output=True, text=True, timeout=10
+    )
+    fields = dict(line.split("=", 1) for line in result.stdout.splitlines() if "=" in line)
+    if "duration" not in fields:
+        return None
+
+    def number(key, kind=float):
+        try:
+            return kind(float(fields[key]))
+        except (KeyError, ValueError):
+            return None
+
+    return {"format": fields.get("format_name"), "codec": fields.get("codec_name"),
+            "sample_rate": number("sample_rate", int), "channels": number("channels", int),
+            "duration": number("duration"), "bitrate": number("bit_rate")}
+
+
+def probe_audio(fileobj, path=None):
+    """Container, codec, duration, sample rate and channels from the audio headers
+
+    Returns None when the format is not recognised.
+    """
+    position = fileobj.tell()
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    try:
+        for parser in (_probe_wav, _probe_flac, _probe_ogg, _probe_mp4, _probe_mp3):
+            fileobj.seek(0)
+            try:
+                info = parser(fileobj, size)
+            except (struct.error, IndexError, ZeroDivisionError):
+                info = None
+            if info and info.get("duration"):
+                info["size"] = size
+                return info
+        info = _probe_ffprobe(path)
+        if info:
+            info["size"] = size
+        return info
+    finally:
+        fileobj.seek(position)
+
+
+def plan_audio(info):
+    """Routing decisions for probed audio"""
+    if not info:
+        return {"needs_conversion": True, "chunked": False}
+    pcm_wav = info["format"] == "wav" and info.get("codec") == "pcm" and info.get("bits") in (8, 16, 24, 32)
+    return {
+        "needs_conversion": not pcm_wav,
+        "chunked": (info.get("duration") or 0) > LONG_AUDIO_SECONDS,
+    }
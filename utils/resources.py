@@ -0,0 +1,144 @@
+
+import os
+import sys
+import time
+import threading
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from utils.metrics import REGISTRY, Gauge
+
+# Memory budget for the whole process. With MEMORY_BUDGET_MB unset (0) nothing
+# changes; otherwise big inputs are processed in chunks and new jobs wait for
+# memory instead of pushing the process into the OOM killer.
+
+MEMORY_RESERVED = REGISTRY.register(Gauge(
+    "memory_budget_reserved_mb", "Memory reserved by admitted jobs", ()))
+MEMORY_WAITING = REGISTRY.register(Gauge(
+    "memory_budget_waiting_jobs", "Jobs waiting for memory admission", ()))
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB, or None if it cannot be read"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    except Exception:
+        pass
+    if resource is not None:
+        # Peak rather than current, but still a safe upper bound
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    return None
+
+
+class MemoryBudget:
+    """Admission control and low-memory switching against a process-wide RSS budget"""
+
+    def __init__(self, budget_mb=None, stream_fraction=0.1, soft_limit=0.75):
+        if budget_mb is None:
+            budget_mb = float(os.environ.get("MEMORY_BUDGET_MB", 0))
+        self.budget_mb = budget_mb
+        # Inputs above this share of the budget are always processed in chunks
+        self.stream_fraction = stream_fraction
+        # Above this share of the budget in live RSS, everything is processed in chunks
+        self.soft_limit = soft_limit
+        self.reserved_mb = 0.0
+        self.active = 0
+        self._condition = threading.Condition()
+
+    @property
+    def enabled(self):
+        return self.budget_mb > 0
+
+    def low_memory(self, input_bytes=0):
+        """True when a job of input_bytes should use the chunked, spill-to-disk path"""
+        if not self.enabled:
+            return False
+        if input_bytes / 1024 / 1024 > self.budget_mb * self.stream_fraction:
+            return True
+        rss = current_rss_mb()
+        return rss is not None and rss > self.budget_mb * self.soft_limit
+
+    def _fits(self, estimate_mb):
+        if self.active == 0:
+            # Never block the only job, however large; it will run chunked
+            return True
+        if self.reserved_mb + estimate_mb > self.budget_mb:
+            return False
+        rss = current_rss_mb()
+        return rss is None or rss + estimate_mb <= self.budget_mb
+
+    def _reserve(self, estimate_mb):
+        self.reserved_mb += estimate_mb
+        self.active += 1
+        MEMORY_RESERVED.set(self.reserved_mb)
+        return estimate_mb
+
+    def acquire(self, estimate_mb, on_wait=None, poll_seconds=1.0):
+        """Block until estimate_mb fits in the budget; returns a ticket for release()
+
+        on_wait(waited_seconds) is called while the job is queued, e.g. to update
+        the UI, outside the lock; an exception from it abandons the wait.
+        """
+        if not self.enabled:
+            return 0.0
+        estimate_mb = min(estimate_mb, self.budget_mb)
+        started = time.monotonic()
+
+        with self._condition:
+            if self._fits(estimate_mb):
+                return self._reserve(estimate_mb)
+        MEMORY_WAITING.inc()
+        try:
+            while True:
+                with self._condition:
+                    if self._fits(estimate_mb):
+                        return self._reserve(estimate_mb)
+                if on_wait is not None:
+                    on_wait(time.monotonic() - started)
+                with self._condition:
+                    if not self._fits(estimate_mb):
+                        # Live RSS changes without notifications, so poll as well
+                        self._condition.wait(timeout=poll_seconds)
+        finally:
+            MEMORY_WAITING.dec()
+
+    def release(self, ticket):
+        """Return a ticket's reservation and wake waiting jobs"""
+        if not self.enabled:
+            return
+        with self._condition:
+            self.reserved_mb = max(0.0, self.reserved_mb - ticket)
+            self.active = max(0, self.active - 1)
+            MEMORY_RESERVED.set(self.reserved_mb)
+            self._condition.notify_all()
+
+
+# Rough peak memory per input byte for each job type, in full and chunked mode
+MEMORY_FACTORS = {
+    "pdf_to_audio": (6.0, 2.0),
+    "text_to_audio": (4.0, 2.0),
+    "pdf_summarizer": (6.0, 6.0),
+    "audio_to_pdf": (12.0, 0.5),
+    "workflow": (12.0, 2.0),
+}
+
+
+def estimate_job_mb(job_type, input_bytes, low_memory=False):
+    """Estimated peak memory for a job, used for admission"""
+    full, chunked = MEMORY_FACTORS.get(job_type, (4.0, 2.0))
+    factor = chunked if low_memory else full
+    return 16 + input_bytes * factor / 1024 / 1024
+
+
+memory_budget = MemoryBudget()
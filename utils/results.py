@@ -0,0 +1,66 @@
+
+import hashlib
+from collections import OrderedDict
+
+import streamlit as st
+
+# Per-session store for the output of heavy stages (extracted text, summaries,
+# transcripts). Any widget change reruns the whole page script, so results
+# computed inside a button branch used to vanish on the next click. Entries are
+# keyed by the upload's content hash plus the parameters that produced them:
+# changing an option that only affects presentation (output format, preview,
+# timestamps) re-renders from the stored result instead of redoing the work.
+
+
+def upload_hash(uploaded_file):
+    """SHA-1 of an upload's bytes, computed once per upload and session"""
+    hashes = st.session_state.setdefault("upload_hashes", {})
+    upload_key = getattr(uploaded_file, "file_id", None) or (uploaded_file.name, uploaded_file.size)
+    if upload_key not in hashes:
+        hashes[upload_key] = hashlib.sha1(uploaded_file.getbuffer()).hexdigest()
+    return hashes[upload_key]
+
+
+class ResultStore:
+    """Small LRU of results kept in st.session_state"""
+
+    def __init__(self, state_key="converter_results", max_entries=4):
+        self.state_key = state_key
+        # Transcripts and extracted text can be large, so each session keeps only a few
+        self.max_entries = max_entries
+
+    def _entries(self):
+        if self.state_key not in st.session_state:
+            st.session_state[self.state_key] = OrderedDict()
+        return st.session_state[self.state_key]
+
+    @staticmethod
+    def key(stage, uploaded_file, **params):
+        """Key for a stage's result on this upload (or input text) with these parameters"""
+        settings = repr(sorted(params.items()))
+        if isinstance(uploaded_file, str):
+            source = hashlib.sha1(uploaded_file.encode("utf-8")).hexdigest()
+        else:
+            source = upload_hash(uploaded_file)
+        return f"{stage}:{source}:{hashlib.sha1(settings.encode('utf-8')).hexdigest()[:12]}"
+
+    def get(self, key):
+        entries = self._entries()
+        if key not in entries:
+            return None
+        entries.move_to_end(key)
+        return entries[key]
+
+    def put(self, key, value):
+        entries = self._entries()
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        return value
+
+    def discard(self, key):
+        self._entries().pop(key, None)
+
+
+results = ResultStore()
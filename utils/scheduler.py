@@ -0,0 +1,211 @@
+
+import os
+import time
+import uuid
+import itertools
+import threading
+
+import streamlit as st
+
+from utils.metrics import REGISTRY, Gauge, Histogram
+
+# Process-wide job scheduler. Each converter type runs at most a fixed number
+# of jobs at once; waiting jobs are ordered by virtual finish time (weighted
+# fair queuing), so sessions take turns and small jobs overtake large ones
+# without starving them. Each session also has a token bucket, so rapid
+# repeated clicks are spread out instead of flooding the queue.
+
+QUEUE_LENGTH = REGISTRY.register(Gauge(
+    "scheduler_queued_jobs", "Jobs waiting for a slot", ("converter",)))
+RUNNING = REGISTRY.register(Gauge(
+    "scheduler_running_jobs", "Jobs holding a slot", ("converter",)))
+QUEUE_SECONDS = REGISTRY.register(Histogram(
+    "scheduler_queue_seconds", "Time jobs spent waiting for a slot", ("converter",),
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)))
+
+# Concurrent jobs per converter; override with SCHEDULER_LIMITS="pdf_to_audio=2,audio_to_pdf=1"
+DEFAULT_LIMITS = {
+    "pdf_to_audio": 2,
+    "text_to_audio": 2,
+    "pdf_summarizer": 2,
+    "audio_to_pdf": 1,
+    "workflow": 1,
+}
+
+
+def _limits_from_env():
+    limits = dict(DEFAULT_LIMITS)
+    for item in os.environ.get("SCHEDULER_LIMITS", "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip().isdigit():
+            limits[name.strip()] = max(1, int(value))
+    return limits
+
+
+class _Job:
+    def __init__(self, converter, session, cost, finish_tag, seq):
+        self.converter = converter
+        self.session = session
+        self.cost = cost
+        self.finish_tag = finish_tag
+        self.seq = seq
+        self.queued_at = time.monotonic()
+
+    def order(self):
+        return (self.finish_tag, self.cost, self.seq)
+
+
+class JobScheduler:
+    """Caps concurrent jobs per converter and queues the rest fairly across sessions"""
+
+    def __init__(self, limits=None, per_session=1, rate_per_minute=None, burst=None):
+        self.limits = limits if limits is not None else _limits_from_env()
+        # Running jobs allowed per session, so one user's repeated clicks cannot fill every slot
+        self.per_session = per_session
+        if rate_per_minute is None:
+            rate_per_minute = float(os.environ.get("SCHEDULER_RATE_PER_MINUTE", 10))
+        self.rate_per_second = rate_per_minute / 60
+        self.burst = burst if burst is not None else int(os.environ.get("SCHEDULER_BURST", 3))
+        self._buckets = {}
+        self._condition = threading.Condition()
+        self._waiting = {}
+        self._running = {}
+        self._session_running = {}
+        self._virtual_time = {}
+        self._session_finish = {}
+        self._seq = itertools.count()
+
+    def _tokens(self, session):
+        """Refill and return the session's token count"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(session, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate_per_second)
+        self._buckets[session] = (tokens, now)
+        return tokens
+
+    def _eligible(self, converter):
+        """Waiting jobs that could start now, best first"""
+        if self._running.get(converter, 0) >= self.limits.get(converter, 1):
+            return []
+        jobs = [job for job in self._waiting.get(converter, [])
+                if self._session_running.get(job.session, 0) < self.per_session
+                and self._tokens(job.session) >= 1]
+        return sorted(jobs, key=_Job.order)
+
+    def position(self, job):
+        """1-based place of a waiting job in its converter's queue"""
+        queue = sorted(self._waiting.get(job.converter, []), key=_Job.order)
+        return queue.index(job) + 1
+
+    def _start(self, job, start):
+        """Move a waiting job to running; called with the lock held"""
+        self._waiting[job.converter].remove(job)
+        QUEUE_LENGTH.dec(converter=job.converter)
+        tokens, updated = self._buckets[job.session]
+        self._buckets[job.session] = (tokens - 1, updated)
+        self._virtual_time[job.converter] = max(self._virtual_time.get(job.converter, 0.0), start)
+        self._running[job.converter] = self._running.get(job.converter, 0) + 1
+        self._session_running[job.session] = self._session_running.get(job.session, 0) + 1
+        RUNNING.inc(converter=job.converter)
+        QUEUE_SECONDS.observe(time.monotonic() - job.queued_at, converter=job.converter)
+        # Other converters' queues may be waiting on this session's slot
+        self._condition.notify_all()
+
+    def _is_next(self, job):
+        eligible = self._eligible(job.converter)
+        return bool(eligible) and eligible[0] is job
+
+    def acquire(self, converter, session, cost=1.0, on_wait=None, poll_seconds=1.0):
+        """Block until the job may run; returns a ticket for release()
+
+        on_wait(position, waited_seconds) is called while the job is queued,
+        outside the scheduler's lock. If it raises (a Streamlit rerun, say),
+        the job leaves the queue and the exception propagates.
+        """
+        cost = max(float(cost), 0.1)
+        with self._condition:
+            # Virtual finish time: after this session's previous job, and never in the past
+            start = max(self._virtual_time.get(converter, 0.0),
+                        self._session_finish.get((converter, session), 0.0))
+            job = _Job(converter, session, cost, start + cost, next(self._seq))
+            self._session_finish[(converter, session)] = job.finish_tag
+            self._waiting.setdefault(converter, []).append(job)
+            QUEUE_LENGTH.inc(converter=converter)
+
+        try:
+            while True:
+                with self._condition:
+                    if self._is_next(job):
+                        self._start(job, start)
+                        return job
+                    if on_wait is None:
+                        self._condition.wait(timeout=poll_seconds)
+                        continue
+                    position, waited = self.position(job), time.monotonic() - job.queued_at
+                on_wait(position, waited)
+                with self._condition:
+                    # A release during on_wait has already notified; only sleep if still not our turn
+                    if not self._is_next(job):
+                        self._condition.wait(timeout=poll_seconds)
+        except BaseException:
+            with self._condition:
+                if job in self._waiting[converter]:
+                    self._waiting[converter].remove(job)
+                    QUEUE_LENGTH.dec(converter=converter)
+                    # The abandoned job no longer pushes back this session's next one
+                    if self._session_finish.get((converter, session)) == job.finish_tag:
+                        self._session_finish[(converter, session)] = start
+                    self._condition.notify_all()
+            raise
+
+    def release(self, job):
+        """Free the job's slot and wake the queue"""
+        with self._condition:
+            self._running[job.converter] -= 1
+            self._session_running[job.session] -= 1
+            if not self._session_running[job.session]:
+                del self._session_running[job.session]
+            RUNNING.dec(converter=job.converter)
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                converter: {
+                    "running": self._running.get(converter, 0),
+                    "waiting": len(self._waiting.get(converter, [])),
+                    "limit": limit,
+                }
+                for converter, limit in self.limits.items()
+            }
+
+
+def session_id():
+    """Stable id for the current browser session"""
+    if "scheduler_session" not in st.session_state:
+        st.session_state.scheduler_session = uuid.uuid4().hex
+    return st.session_state.scheduler_session
+
+
+def estimate_cost(converter, uploaded=None, text=None, info=None, pages=None):
+    """Job size in rough work units: one PDF page, one minute of audio or ~500 words
+
+    info is the upload's probe result (utils.probe, or utils.textfile's scan), when the page has one;
+    pages is the selected page list when only part of a PDF is processed.
+    """
+    if text is not None:
+        return len(text.split()) / 500
+    if pages is not None:
+        return len(pages)
+    if info and info.get("pages"):
+        return info["pages"]
+    if info and info.get("duration"):
+        return info["duration"] / 60
+    if info and info.get("words"):
+        return info["words"] / 500
+    # Unprobed or unreadable input; fall back to size, about 100 KB per unit
+    size = getattr(uploaded, "size", 0) or 0
+    return size / 100000
+
+
+scheduler = JobScheduler()
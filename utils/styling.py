@@ -1,6 +1,11 @@
 
+import os
+import html
+import time
 import streamlit as st
 import base64
+from utils.assets import assets, minify_css, static_serving_enabled
+from utils.probe import pdf_outline, parse_page_ranges
 
 def get_base64_of_bin_file(bin_file):
     """Convert binary file to base64 string"""
@@ -8,105 +13,142 @@ def get_base64_of_bin_file(bin_file):
         data = f.read()
     return base64.b64encode(data).decode()
 
+# Theme rules shared by every page; {background} is the image URL
+THEME_CSS = """
+.stApp {
+    background-image: url("{background}");
+    background-size: cover;
+    background-position: center;
+    background-repeat: no-repeat;
+    background-attachment: fixed;
+}
+
+.stApp > div:first-child {
+    background: rgba(0, 0, 0, 0.7);
+    backdrop-filter: blur(10px);
+}
+
+/* Custom styling for containers */
+.main-container {
+    background: rgba(0, 0, 0, 0.7);
+    padding: 2rem;
+    border-radius: 15px;
+    margin: 1rem 0;
+    box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+}
+
+/* Header styling */
+.header-style {
+    background: linear-gradient(90deg, #4CAF50 0%, #2196F3 100%);
+    -webkit-background-clip: text;
+    -webkit-text-fill-color: transparent;
+    background-clip: text;
+    font-size: 3rem;
+    font-weight: bold;
+    text-align: center;
+    margin-bottom: 2rem;
+}
+
+/* Card styling */
+.feature-card {
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    padding: 1.5rem;
+    border-radius: 10px;
+    margin: 1rem 0;
+    color: white;
+    text-align: center;
+    transition: transform 0.2s ease;
+}
+
+.feature-card:hover {
+    transform: translateY(-5px);
+}
+
+/* Success/Error message styling */
+.success-msg {
+    background: linear-gradient(90deg, #4CAF50, #45a049);
+    color: white;
+    padding: 1rem;
+    border-radius: 5px;
+    margin: 1rem 0;
+}
+
+.error-msg {
+    background: linear-gradient(90deg, #f44336, #da190b);
+    color: white;
+    padding: 1rem;
+    border-radius: 5px;
+    margin: 1rem 0;
+}
+
+/* Button styling */
+.stButton > button {
+    background: linear-gradient(90deg, #4CAF50 0%, #2196F3 100%);
+    color: white;
+    border: none;
+    border-radius: 25px;
+    padding: 0.5rem 2rem;
+    font-weight: bold;
+    transition: all 0.3s ease;
+}
+
+.stButton > button:hover {
+    transform: translateY(-2px);
+    box-shadow: 0 4px 8px rgba(0, 0, 0, 0.2);
+}
+
+/* Download links to stored artifacts, styled like the buttons */
+a.artifact-link {
+    display: block;
+    text-align: center;
+    background: linear-gradient(90deg, #4CAF50 0%, #2196F3 100%);
+    color: white !important;
+    text-decoration: none;
+    border-radius: 25px;
+    padding: 0.5rem 2rem;
+    font-weight: bold;
+}
+
+/* File uploader styling */
+.uploadedFile {
+    background: rgba(255, 255, 255, 0.9);
+    border-radius: 10px;
+    padding: 1rem;
+    margin: 1rem 0;
+}
+"""
+
+# Markup per (image, mtime, size, serving mode), built once per process
+_theme_markup = {}
+
+
+def theme_markup(image_path, static=None):
+    """The <style> block set_background_image injects on each run
+
+    With static serving on, the image and stylesheet are published once under
+    hashed names and each run only carries a tiny @import; otherwise the
+    inline base64 block is built once and reused.
+    """
+    if static is None:
+        static = static_serving_enabled()
+    stat = os.stat(image_path)
+    key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, static)
+    if key not in _theme_markup:
+        if static:
+            # Relative to the stylesheet, which is published next to the image
+            css = minify_css(THEME_CSS.replace("{background}", assets.publish_file(image_path)))
+            stylesheet = assets.url(assets.publish_text("theme", ".css", css))
+            _theme_markup[key] = f'<style>@import url("{stylesheet}");</style>'
+        else:
+            css = minify_css(THEME_CSS.replace(
+                "{background}", f"data:image/png;base64,{get_base64_of_bin_file(image_path)}"))
+            _theme_markup[key] = f"<style>{css}</style>"
+    return _theme_markup[key]
+
 def set_background_image(image_path):
     """Set background image for the app"""
     try:
-        bin_str = get_base64_of_bin_file(image_path)
-        page_bg_img = f"""
-        <style>
-        .stApp {{
-            background-image: url("data:image/png;base64,{bin_str}");
-            background-size: cover;
-            background-position: center;
-            background-repeat: no-repeat;
-            background-attachment: fixed;
-        }}
-
-        .stApp > div:first-child {{
-            background: rgba(0, 0, 0, 0.7);
-            backdrop-filter: blur(10px);
-        }}
-
-        /* Custom styling for containers */
-        .main-container {{
-            background: rgba(0, 0, 0, 0.7);
-            padding: 2rem;
-            border-radius: 15px;
-            margin: 1rem 0;
-            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        }}
-
-        /* Header styling */
-        .header-style {{
-            background: linear-gradient(90deg, #4CAF50 0%, #2196F3 100%);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-            font-size: 3rem;
-            font-weight: bold;
-            text-align: center;
-            margin-bottom: 2rem;
-        }}
-
-        /* Card styling */
-        .feature-card {{
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            padding: 1.5rem;
-            border-radius: 10px;
-            margin: 1rem 0;
-            color: white;
-            text-align: center;
-            transition: transform 0.2s ease;
-        }}
-
-        .feature-card:hover {{
-            transform: translateY(-5px);
-        }}
-
-        /* Success/Error message styling */
-        .success-msg {{
-            background: linear-gradient(90deg, #4CAF50, #45a049);
-            color: white;
-            padding: 1rem;
-            border-radius: 5px;
-            margin: 1rem 0;
-        }}
-
-        .error-msg {{
-            background: linear-gradient(90deg, #f44336, #da190b);
-            color: white;
-            padding: 1rem;
-            border-radius: 5px;
-            margin: 1rem 0;
-        }}
-
-        /* Button styling */
-        .stButton > button {{
-            background: linear-gradient(90deg, #4CAF50 0%, #2196F3 100%);
-            color: white;
-            border: none;
-            border-radius: 25px;
-            padding: 0.5rem 2rem;
-            font-weight: bold;
-            transition: all 0.3s ease;
-        }}
-
-        .stButton > button:hover {{
-            transform: translateY(-2px);
-            box-shadow: 0 4px 8px rgba(0, 0, 0, 0.2);
-        }}
-
-        /* File uploader styling */
-        .uploadedFile {{
-            background: rgba(255, 255, 255, 0.9);
-            border-radius: 10px;
-            padding: 1rem;
-            margin: 1rem 0;
-        }}
-
-        </style>
-        """
-        st.markdown(page_bg_img, unsafe_allow_html=True)
+        st.markdown(theme_markup(image_path), unsafe_allow_html=True)
     except Exception as e:
         st.error(f"Could not load background image: {e}")
 
@@ -127,3 +169,82 @@ def show_feature_card(title, description, icon="🔄"):
         <p>{description}</p>
     </div>
     """, unsafe_allow_html=True)
+
+def show_trace(tracer):
+    """Show the per-stage timings of a traced conversion"""
+    with st.expander("🔬 Performance Trace", expanded=False):
+        rows = tracer.rows()
+        for row in rows:
+            row["stage"] = " " * row["depth"] + row["stage"]
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        st.caption(f"Trace {tracer.trace_id} · also appended to {tracer.LOG_PATH}")
+
+def progress_bar(text="⏳ Starting..."):
+    """Progress bar whose update function can be passed to converters.Progress"""
+    bar = st.progress(0.0, text=text)
+
+    def update(fraction, message):
+        bar.progress(min(1.0, fraction), text=message)
+    return update
+
+def show_artifact(artifact, label="📥 Download", player=False):
+    """Player and download for a stored artifact; the download streams from its URL when it has one"""
+    if player and artifact.mime.startswith("audio/"):
+        st.audio(artifact.path or artifact.url, format=artifact.mime)
+    if artifact.path is None or static_serving_enabled():
+        st.markdown(
+            f'<a class="artifact-link" href="{html.escape(artifact.url)}" '
+            f'download="{html.escape(artifact.filename)}">{label}</a>',
+            unsafe_allow_html=True
+        )
+    else:
+        with open(artifact.path, "rb") as f:
+            st.download_button(label=label, data=f.read(), file_name=artifact.filename,
+                               mime=artifact.mime, use_container_width=True)
+    st.caption(f"🔗 Saved until {time.strftime('%Y-%m-%d %H:%M', time.localtime(artifact.expires))}; "
+               "the link keeps working after a refresh")
+
+def show_saved_files(store, owner):
+    """Sidebar list of the owner's stored outputs"""
+    saved = store.owned(owner)
+    if not saved or (saved[0].path and not static_serving_enabled()):
+        # Local files without static serving have no URL to link to
+        return
+    st.sidebar.markdown("### 📦 Your Files")
+    for artifact in saved[:10]:
+        st.sidebar.markdown(
+            f'<a href="{html.escape(artifact.url)}" download="{html.escape(artifact.filename)}">'
+            f'{html.escape(artifact.filename)}</a> · {artifact.size / 1024:.0f} KB',
+            unsafe_allow_html=True
+        )
+
+def select_pages(uploaded_file, pdf_info, key):
+    """Page range or outline section picker; returns 0-based page indices, or None for all pages"""
+    if not pdf_info or pdf_info["pages"] < 2:
+        return None
+    outline = pdf_outline(uploaded_file)
+    modes = ["All pages", "Page range"] + (["Section"] if outline else [])
+    mode = st.radio("📑 Pages to process", modes, horizontal=True, key=f"{key}_mode")
+
+    if mode == "Page range":
+        spec = st.text_input(
+            "Pages",
+            value=f"1-{pdf_info['pages']}",
+            key=f"{key}_range",
+            help="Page numbers and ranges, e.g. 1-5, 8, 12-"
+        )
+        try:
+            return parse_page_ranges(spec, pdf_info["pages"])
+        except ValueError as e:
+            st.warning(f"⚠️ Invalid page range: {e}. Using all pages.")
+            return None
+
+    if mode == "Section":
+        labels = [
+            f"{'  ' * entry['level']}{entry['title']} (pp. {entry['first'] + 1}-{entry['last'] + 1})"
+            for entry in outline
+        ]
+        choice = st.selectbox("Section", range(len(outline)), format_func=labels.__getitem__, key=f"{key}_section")
+        return list(range(outline[choice]["first"], outline[choice]["last"] + 1))
+
+    return None
@@ -0,0 +1,288 @@
+
+import re
+import csv
+import codecs
+import itertools
+
+try:
+    from charset_normalizer import from_bytes
+except ImportError:
+    from_bytes = None
+
+from utils.probe import WORDS_PER_MINUTE
+
+# Streaming reader for uploaded .txt, .md and .csv files. Bytes are decoded
+# 64 KB at a time: from a byte-order mark if there is one, otherwise as UTF-8
+# until the first byte that is not valid UTF-8, from where the detected
+# charset takes over. Lines are then reduced to the text worth speaking
+# (Markdown syntax and code, CSV quoting) and regrouped into paragraphs,
+# which SpeechSynthesizer.plan accepts as chunks, so a multi-megabyte file is
+# never held as one string or split into one list of words.
+
+CHUNK_BYTES = 1 << 16
+# Lines longer than this (files without newlines) are cut at a space
+MAX_LINE_CHARS = 1 << 16
+# Paragraph chunks are closed at a sentence end past this size
+PARAGRAPH_CHARS = 4000
+
+# UTF-32 first: its little-endian mark starts with UTF-16's
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+_FENCE = re.compile(r"^\s{0,3}(`{3,}|~{3,})")
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+(.*?)(?:\s+#+)?\s*$")
+_UNDERLINE = re.compile(r"^\s{0,3}(=+|-+)\s*$")
+_RULE = re.compile(r"^\s{0,3}([-*_])(?:\s*\1){2,}\s*$")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d{1,9}[.)])\s+(?:\[[ xX]\]\s+)?")
+_QUOTE = re.compile(r"^\s*(?:>\s?)+")
+_TABLE_DIVIDER = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(?:\|\s*:?-{3,}:?\s*)*\|?\s*$")
+_LINK_DEFINITION = re.compile(r"^\s{0,3}\[[^\]]+\]:\s+\S+")
+_CODE_SPAN = re.compile(r"(`+)(.+?)\1")
+_IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]+)\](?:\([^)]*\)|\[[^\]]*\])")
+_HTML_TAG = re.compile(r"<[^>\n]+>")
+_EMPHASIS = re.compile(r"(\*{1,3}|_{1,3}|~~)(?=\S)(.+?)(?<=\S)\1")
+_ESCAPE = re.compile(r"\\([\\`*_{}\[\]()#+\-.!|>~])")
+_SENTENCE_END = re.compile(r"[.!?:;][\"')\]]*$")
+_CP1252_PUNCTUATION = set("–—‘’‚“”„…•€«»°·×£¢¥§©®±¡¿")
+
+
+def text_format(filename):
+    """'markdown', 'csv' or 'text', from the file extension"""
+    name = (filename or "").lower()
+    if name.endswith((".md", ".markdown")):
+        return "markdown"
+    if name.endswith((".csv", ".tsv")):
+        return "csv"
+    return "text"
+
+
+def _reads_as_cp1252(sample):
+    try:
+        text = sample.decode("cp1252")
+    except UnicodeDecodeError:
+        return False
+    letters = accented = 0
+    for ch in text:
+        if ch.isalpha():
+            letters += 1
+            accented += ord(ch) > 127
+        elif ord(ch) > 127 and ch not in _CP1252_PUNCTUATION and not ch.isspace():
+            return False
+    # Accented letters are a minority in Western European text; Cyrillic or Greek read as cp1252 is nearly all accents
+    return letters > 0 and accented / letters < 0.3
+
+
+def detect_encoding(sample):
+    """Best guess for bytes that are not UTF-8
+
+    Text that reads as Western European in cp1252, the usual legacy Windows
+    charset, is taken as such: statistical detectors often misplace it on
+    short samples. Otherwise charset-normalizer decides, when installed.
+    """
+    if _reads_as_cp1252(sample):
+        return "cp1252"
+    if from_bytes is not None:
+        match = from_bytes(sample).best()
+        if match is not None:
+            return match.encoding
+    return "cp1252"
+
+
+def iter_decoded(stream, chunk_bytes=CHUNK_BYTES, stats=None):
+    """Yield the text of a binary stream chunk by chunk, detecting the encoding on the way
+
+    stats["decoding"] gets the encoding used and, when UTF-8 had to be
+    abandoned, the byte offset of the chunk where it happened.
+    """
+    chunk = stream.read(chunk_bytes)
+    encoding = next((name for bom, name in _BOMS if chunk.startswith(bom)), "utf-8")
+    # Strict only while UTF-8 is still a guess; a detected or marked charset replaces bad bytes
+    decoder = codecs.getincrementaldecoder(encoding)("strict" if encoding == "utf-8" else "replace")
+    info = {"encoding": encoding, "bytes": 0, "switched_at": None}
+    while chunk:
+        try:
+            text = decoder.decode(chunk)
+        except UnicodeDecodeError:
+            # Bytes before this chunk were valid UTF-8 (in practice ASCII), so only the rest is re-decoded
+            pending = decoder.getstate()[0] + chunk
+            encoding = detect_encoding(pending)
+            info.update(encoding=encoding, switched_at=info["bytes"])
+            decoder = codecs.getincrementaldecoder(encoding)("replace")
+            text = decoder.decode(pending)
+        info["bytes"] += len(chunk)
+        if text:
+            yield text
+        chunk = stream.read(chunk_bytes)
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+    if stats is not None:
+        stats["decoding"] = info
+
+
+def iter_lines(chunks, max_chars=MAX_LINE_CHARS):
+    """Regroup text chunks into lines without their line endings"""
+    pending = ""
+    for chunk in chunks:
+        lines = (pending + chunk).splitlines(keepends=True)
+        # A last line without its ending (or a CR whose LF is in the next chunk) is not complete yet
+        pending = lines.pop() if lines and not lines[-1].endswith("\n") else ""
+        for line in lines:
+            yield line.rstrip("\r\n")
+        while len(pending) > max_chars:
+            cut = pending.rfind(" ", 0, max_chars) + 1 or max_chars
+            yield pending[:cut]
+            pending = pending[cut:]
+    if pending:
+        yield pending.rstrip("\r\n")
+
+
+def markdown_inline(text):
+    """Markdown inline syntax reduced to the words a reader would say"""
+    text = _CODE_SPAN.sub(r"\2", text)
+    text = _IMAGE.sub(r"\1", text)
+    text = _LINK.sub(r"\1", text)
+    text = _HTML_TAG.sub("", text)
+    text = _EMPHASIS.sub(r"\2", text)
+    return _ESCAPE.sub(r"\1", text)
+
+
+def markdown_lines(lines):
+    """Yield the spoken text of Markdown lines; blank lines separate blocks
+
+    Headings become blocks of their own, table rows become comma-separated
+    cells, and code blocks, front matter, rules and link definitions are
+    skipped.
+    """
+    fence = None
+    front_matter = False
+    for number, line in enumerate(lines):
+        if number == 0 and line.strip() == "---":
+            front_matter = True
+            continue
+        if front_matter:
+            front_matter = line.strip() not in ("---", "...")
+            continue
+        match = _FENCE.match(line)
+        if fence:
+            if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence):
+                fence = None
+            continue
+        if match:
+            fence = match.group(1)
+            continue
+
+        if _TABLE_DIVIDER.match(line) and not _UNDERLINE.match(line):
+            continue
+        if _RULE.match(line) or _UNDERLINE.match(line) or _LINK_DEFINITION.match(line):
+            # A setext underline follows its heading, which was already read as a line
+            yield ""
+            continue
+        match = _HEADING.match(line)
+        if match:
+            yield ""
+            yield markdown_inline(match.group(1))
+            yield ""
+            continue
+        stripped = line.strip()
+        if stripped.startswith("|") and stripped.endswith("|") and len(stripped) > 1:
+            cells = [markdown_inline(cell.strip()) for cell in stripped[1:-1].split("|")]
+            yield ", ".join(cell for cell in cells if cell) + "."
+            continue
+        yield markdown_inline(_LIST_ITEM.sub("", _QUOTE.sub("", line)))
+
+
+def csv_lines(lines, sample_rows=20):
+    """Yield one sentence per CSV row, "column: value" when the file has a header row"""
+    lines = iter(lines)
+    head = list(itertools.islice(lines, sample_rows))
+    sample = "\n".join(head)
+    sniffer = csv.Sniffer()
+    try:
+        dialect = sniffer.sniff(sample, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    try:
+        has_header = sniffer.has_header(sample)
+    except csv.Error:
+        has_header = False
+
+    rows = csv.reader((line + "\n" for line in itertools.chain(head, lines)), dialect)
+    header = next(rows, None) if has_header else None
+    for row in rows:
+        cells = [cell.strip() for cell in row]
+        if header:
+            spoken = "; ".join(f"{name}: {cell}" for name, cell in zip(header, cells) if cell)
+        else:
+            spoken = ", ".join(cell for cell in cells if cell)
+        if spoken:
+            yield spoken if _SENTENCE_END.search(spoken) else spoken + "."
+
+
+def iter_paragraphs(lines, max_chars=PARAGRAPH_CHARS):
+    """Join lines into paragraph chunks ending in a blank line
+
+    Long paragraphs are closed at the first line ending a sentence past
+    max_chars (or at 4 x max_chars regardless), so chunks stay small.
+    """
+    parts = []
+    size = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            if parts:
+                yield "\n".join(parts) + "\n\n"
+                parts, size = [], 0
+            continue
+        parts.append(line)
+        size += len(line) + 1
+        if size >= 4 * max_chars or (size >= max_chars and _SENTENCE_END.search(line)):
+            yield "\n".join(parts) + "\n\n"
+            parts, size = [], 0
+    if parts:
+        yield "\n".join(parts) + "\n\n"
+
+
+def read_text_file(fileobj, kind=None, stats=None):
+    """Yield the spoken text of an uploaded text file as paragraph chunks, from the start
+
+    kind is 'text', 'markdown' or 'csv' (from the file name by default).
+    """
+    kind = kind or text_format(getattr(fileobj, "name", ""))
+    fileobj.seek(0)
+    lines = iter_lines(iter_decoded(fileobj, stats=stats))
+    if kind == "markdown":
+        lines = markdown_lines(lines)
+    elif kind == "csv":
+        lines = csv_lines(lines)
+    yield from iter_paragraphs(lines)
+
+
+def text_stats(chunks, head_chars=500):
+    """Words, characters, paragraphs and spoken minutes of text chunks, in one pass"""
+    stats = {"words": 0, "chars": 0, "paragraphs": 0, "head": ""}
+    for chunk in chunks:
+        stats["words"] += len(chunk.split())
+        stats["chars"] += len(chunk.rstrip("\n"))
+        stats["paragraphs"] += 1
+        if len(stats["head"]) < head_chars:
+            stats["head"] += chunk[:head_chars - len(stats["head"])]
+    stats["minutes"] = stats["words"] / WORDS_PER_MINUTE
+    return stats
+
+
+def scan_text_file(fileobj, kind=None, head_chars=500):
+    """text_stats of an uploaded file plus its format and detected encoding"""
+    kind = kind or text_format(getattr(fileobj, "name", ""))
+    decoding = {}
+    stats = text_stats(read_text_file(fileobj, kind, stats=decoding), head_chars)
+    stats["format"] = kind
+    stats["encoding"] = decoding["decoding"]["encoding"]
+    fileobj.seek(0)
+    return stats